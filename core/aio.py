@@ -0,0 +1,83 @@
+'''asyncio entry points for lexing and parsing
+
+Input is read from an asyncio.StreamReader or an async iterator of str or
+utf-8 bytes chunks, and control goes back to the event loop every
+yield_every tokens while lexing and parsing, so many documents can be
+processed concurrently on one loop. Cancelling the task stops the work at the
+next yield.
+
+Lexing starts once all of the input has been read, since where a token ends
+can depend on text in a later chunk, so the whole input is held in memory.
+
+Parsing yields between the items of grammars whose root reaches a repetition
+of an item rule, such as root => line! (see parser.Parser.apply_steps). Other
+grammars are parsed in one step once lexing is done.
+'''
+
+import asyncio
+import codecs
+from typing import AsyncIterable, MutableSequence, Optional, Union
+from core import lexer, parser, processor
+
+YIELD_EVERY = 1024
+'''the default number of tokens to process between yields to the event loop'''
+
+_READ_SIZE = 1 << 16
+
+Source = Union[asyncio.StreamReader, AsyncIterable[Union[str, bytes]]]
+'''where input is read from'''
+
+
+async def read(source: Source) -> str:
+    '''all of source's input, with bytes decoded as utf-8'''
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks: MutableSequence[str] = []
+
+    def add(chunk: Union[str, bytes]) -> None:
+        chunks.append(chunk if isinstance(chunk, str) else decoder.decode(chunk))
+
+    if isinstance(source, asyncio.StreamReader):
+        while chunk := await source.read(_READ_SIZE):
+            add(chunk)
+    else:
+        async for chunk in source:
+            add(chunk)
+    chunks.append(decoder.decode(b'', final=True))
+    return ''.join(chunks)
+
+
+async def lex(
+    lexer_: lexer.Lexer,
+    source: Source,
+    yield_every: int = YIELD_EVERY,
+) -> lexer.TokenStream:
+    '''split source's input into tokens, yielding every yield_every tokens
+
+    All of source's input is read before lexing starts.
+    '''
+    tokens: MutableSequence[lexer.Token] = []
+    for token in lexer_.iter_tokens(await read(source)):
+        tokens.append(token)
+        if len(tokens) % yield_every == 0:
+            await asyncio.sleep(0)
+    return lexer.TokenStream(tokens)
+
+
+async def parse(
+    parser_: parser.Parser,
+    source: Source,
+    yield_every: int = YIELD_EVERY,
+    budget: Optional[processor.Budget] = None,
+) -> parser.Result:
+    '''apply parser_ to source's input, yielding about every yield_every tokens'''
+    tokens = await lex(parser_.lexer, source, yield_every)
+    steps = parser_.apply_steps(tokens, budget)
+    last_yield = 0
+    while True:
+        try:
+            consumed = next(steps)
+        except StopIteration as stop:
+            return stop.value
+        if consumed - last_yield >= yield_every:
+            last_yield = consumed
+            await asyncio.sleep(0)
@@ -0,0 +1,115 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+import asyncio
+from typing import AsyncIterator, Sequence, Union
+import unittest
+from core import aio, lexer_test, loader, parser
+
+
+async def _chunks(chunks: Sequence[Union[str, bytes]]) -> AsyncIterator[Union[str, bytes]]:
+    for chunk in chunks:
+        yield chunk
+
+
+def _reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+class AioTest(unittest.IsolatedAsyncioTestCase):
+
+    @property
+    def lines_parser(self):
+        return loader.load_parser(r'''
+            id = "[a-zé]+";
+            _ws = "\w+";
+            root => line!;
+            line => id+ ";";
+        ''')
+
+    async def test_read(self):
+        data = 'abc é;'.encode()
+        for source in [
+            _reader(data),
+            _chunks([data[:5], data[5:]]),
+            _chunks(['abc ', 'é;']),
+        ]:
+            with self.subTest(source=source):
+                self.assertEqual(await aio.read(source), 'abc é;')
+
+    async def test_lex(self):
+        lexer_ = self.lines_parser.lexer
+        self.assertEqual(
+            await aio.lex(lexer_, _chunks(['a b', 'c é;\nd;']), yield_every=1),
+            lexer_.apply('a bc é;\nd;'))
+
+    async def test_lex_uncompiled_rule(self):
+        lexer_ = lexer_test.ApplyRulesTest().lexer
+        self.assertEqual(await aio.lex(lexer_, _chunks(['a 1', '2\n b'])), lexer_.apply('a 12\n b'))
+
+    async def test_parse(self):
+        for grammar, input_str in [
+            (
+                r'''
+                    id = "[a-z]+";
+                    _ws = "\w+";
+                    root => line!;
+                    line => id+ ";";
+                ''',
+                'a b; c;\nd e f;',
+            ),
+            (
+                r'''
+                    id = "[a-z]+";
+                    _ws = "\w+";
+                    root => line*;
+                    line => id+ ";";
+                ''',
+                'a b; c;\nd e f',
+            ),
+            (
+                r'''
+                    id = "[a-z]+";
+                    _ws = "\w+";
+                    root => "(" id* ")";
+                ''',
+                '(a b c)',
+            ),
+        ]:
+            with self.subTest(input_str=input_str):
+                parser_ = loader.load_parser(grammar)
+                self.assertEqual(
+                    await aio.parse(parser_, _reader(input_str.encode()), yield_every=1),
+                    parser_.apply(input_str))
+
+    async def test_parse_error(self):
+        with self.assertRaises(parser.Error):
+            await aio.parse(self.lines_parser, _chunks(['a; ;']))
+
+    async def test_yields(self):
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        await aio.parse(self.lines_parser, _chunks(['a;'] * 100), yield_every=10)
+        ticker.cancel()
+        self.assertGreaterEqual(ticks, 10)
+
+    async def test_cancel(self):
+        task = asyncio.create_task(
+            aio.parse(self.lines_parser, _chunks(['a b c;'] * 10000), yield_every=10))
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+'''static grammar analysis
+
+Finds grammar shapes that make a processor loop forever or do useless work, so
+they're reported when a grammar is loaded rather than when an input first hits
+them.
+'''
+
+from dataclasses import dataclass
+from typing import Mapping, MutableSequence, Optional, Sequence, Set, Tuple
+import warnings
+from core import lexer, optimizer, parser, processor, stream
+
+
+class Error(processor.Error):
+    '''grammar analysis error'''
+
+
+class GrammarWarning(UserWarning):
+    '''a grammar shape that is valid but likely unintended or slow'''
+
+
+@dataclass(frozen=True)
+class Issue:
+    '''a problem found in a grammar'''
+
+    path: Sequence[str]
+    '''the rule name and the nested rules leading to the problem'''
+
+    msg: str
+
+    def __str__(self) -> str:
+        return f'{" > ".join(self.path)}: {self.msg}'
+
+
+@dataclass(frozen=True)
+class Analysis:
+    '''the problems found in a grammar'''
+
+    errors: Sequence[Issue]
+    '''shapes that loop forever'''
+
+    warnings: Sequence[Issue]
+    '''shapes that are valid but do useless work'''
+
+    left_recursion: Sequence[Issue] = ()
+    '''left recursive cycles, which are supported except in events mode, so check
+    doesn't warn about them'''
+
+
+_Rules = Mapping[str, processor.Rule]
+
+
+def _ref_name(rule: processor.Rule, rules: _Rules) -> Optional[str]:
+    '''the name of the rule in rules that rule refers to, if any'''
+    if isinstance(rule, processor.Ref):
+        name = rule.value
+    elif isinstance(rule, parser.Ref):
+        name = rule.rule_name
+    else:
+        return None
+    return name if name in rules else None
+
+
+def _is_nullable(rule: processor.Rule, rules: _Rules, nullable: Set[str]) -> bool:
+    '''whether rule can match without consuming input, given the nullable rule names'''
+    name = _ref_name(rule, rules)
+    if name is not None:
+        return name in nullable
+    if isinstance(rule, processor.And):
+        return all(_is_nullable(child, rules, nullable) for child in rule.children)
+    if isinstance(rule, processor.Or):
+        return any(_is_nullable(child, rules, nullable) for child in rule.children)
+    if isinstance(rule, processor.OneOrMore):
+        return _is_nullable(rule.child, rules, nullable)
+    if isinstance(rule, processor.Precedence):
+        return _is_nullable(rule.operand, rules, nullable)
+    return isinstance(rule, (processor.ZeroOrMore, processor.ZeroOrOne,
+                             processor.While, stream.UntilEmpty))
+
+
+def nullable_rules(rules: _Rules) -> Set[str]:
+    '''the names of the rules that can match without consuming input'''
+    nullable: Set[str] = set()
+    changed = True
+    while changed:
+        changed = False
+        for name, rule in rules.items():
+            if name not in nullable and _is_nullable(rule, rules, nullable):
+                nullable.add(name)
+                changed = True
+    return nullable
+
+
+def _left_refs(rule: processor.Rule, rules: _Rules, nullable: Set[str]) -> Set[str]:
+    '''the names of the rules that rule can apply without consuming input first'''
+    name = _ref_name(rule, rules)
+    if name is not None:
+        return {name}
+    refs: Set[str] = set()
+    if isinstance(rule, processor.And):
+        for child in rule.children:
+            refs |= _left_refs(child, rules, nullable)
+            if not _is_nullable(child, rules, nullable):
+                break
+    elif isinstance(rule, processor.NaryRule):
+        for child in rule.children:
+            refs |= _left_refs(child, rules, nullable)
+    elif isinstance(rule, processor.UnaryRule):
+        refs |= _left_refs(rule.child, rules, nullable)
+    elif isinstance(rule, processor.Precedence):
+        refs |= _left_refs(rule.operand, rules, nullable)
+    return refs
+
+
+def left_recursion(rules: _Rules) -> Sequence[Sequence[str]]:
+    '''the cycles of rules that apply themselves without consuming input'''
+    nullable = nullable_rules(rules)
+    graph = {name: _left_refs(rule, rules, nullable) for name, rule in rules.items()}
+    cycles: MutableSequence[Sequence[str]] = []
+
+    def visit(path: Tuple[str, ...]) -> None:
+        for ref in sorted(graph[path[-1]]):
+            if ref == path[0]:
+                cycles.append(path + (ref,))
+            elif ref > path[0] and ref not in path:
+                visit(path + (ref,))
+
+    for name in sorted(graph):
+        visit((name,))
+    return cycles
+
+
+def _sequence(rule: processor.Rule, rules: _Rules) -> Sequence[processor.Rule]:
+    name = _ref_name(rule, rules)
+    if name is not None:
+        rule = rules[name]
+    if isinstance(rule, processor.And):
+        return rule.children
+    return [rule]
+
+
+def _shadowed(or_: processor.Or, rules: _Rules, nullable: Set[str]) -> Sequence[str]:
+    '''why each alternative of or_ that can never be reached is shadowed'''
+    msgs: MutableSequence[str] = []
+    for j, later in enumerate(or_.children):
+        later_sequence = _sequence(later, rules)
+        for i, earlier in enumerate(or_.children[:j]):
+            if _is_nullable(earlier, rules, nullable):
+                msgs.append(f'alternative {j} {later} is unreachable: '
+                            f'alternative {i} {earlier} matches empty input')
+                break
+            earlier_sequence = _sequence(earlier, rules)
+            if list(later_sequence[:len(earlier_sequence)]) == list(earlier_sequence):
+                msgs.append(f'alternative {j} {later} is unreachable: '
+                            f'alternative {i} {earlier} matches its prefix')
+                break
+    return msgs
+
+
+def _is_repetition(rule: processor.Rule) -> bool:
+    return isinstance(rule, (processor.ZeroOrMore, processor.OneOrMore, stream.UntilEmpty))
+
+
+def _analyze_rules(rules: _Rules) -> Tuple[Sequence[Issue], Sequence[Issue]]:
+    errors: MutableSequence[Issue] = []
+    warnings_: MutableSequence[Issue] = []
+    nullable = nullable_rules(rules)
+
+    def visit(rule: processor.Rule, path: Tuple[str, ...]) -> None:
+        if _is_repetition(rule):
+            assert isinstance(rule, processor.UnaryRule)
+            if _is_nullable(rule.child, rules, nullable):
+                errors.append(Issue(path, f'repetition {rule} of {rule.child} '
+                                    'which matches empty input loops forever'))
+            elif _is_repetition(rule.child):
+                warnings_.append(Issue(path, f'nested repetition {rule}'))
+        if isinstance(rule, processor.Or):
+            warnings_.extend(Issue(path, msg) for msg in _shadowed(rule, rules, nullable))
+        if isinstance(rule, processor.NaryRule):
+            for child in rule.children:
+                visit(child, path + (str(child),))
+        elif isinstance(rule, processor.UnaryRule):
+            visit(rule.child, path + (str(rule.child),))
+        elif isinstance(rule, processor.Precedence):
+            visit(rule.operand, path + (str(rule.operand),))
+
+    for name, rule in rules.items():
+        visit(rule, (name,))
+    return errors, warnings_
+
+
+def _left_recursion(rules: _Rules) -> Sequence[Issue]:
+    return [Issue(cycle, 'left recursion, which events mode does not support')
+            for cycle in left_recursion(rules)]
+
+
+def analyze_lexer(lexer_: lexer.Lexer) -> Analysis:
+    '''find the problems in lexer_'''
+    errors, warnings_ = _analyze_rules(lexer_.rules)
+    return Analysis(errors, warnings_, _left_recursion(lexer_.rules))
+
+
+def analyze_parser(parser_: parser.Parser) -> Analysis:
+    '''find the problems in parser_ and its lexer'''
+    errors, warnings_ = _analyze_rules(parser_.rules)
+    lexer_analysis = analyze_lexer(parser_.lexer)
+    report = optimizer.report(parser_)
+    return Analysis(
+        [*errors, *lexer_analysis.errors],
+        [
+            *warnings_,
+            *lexer_analysis.warnings,
+            *[Issue([name], 'unreachable rule') for name in report.unreachable_rules],
+        ],
+        [*_left_recursion(parser_.rules), *lexer_analysis.left_recursion],
+    )
+
+
+def check(parser_: parser.Parser) -> None:
+    '''raise an Error for any errors in parser_ and warn about any warnings'''
+    analysis = analyze_parser(parser_)
+    for issue in analysis.warnings:
+        warnings.warn(str(issue), GrammarWarning, stacklevel=2)
+    if analysis.errors:
+        raise Error(msg='invalid grammar', children=[
+            Error(msg=str(issue)) for issue in analysis.errors])
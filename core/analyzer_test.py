@@ -0,0 +1,138 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+from collections import OrderedDict
+from typing import Mapping, Sequence, Tuple
+import unittest
+import warnings
+from core import analyzer, lexer, loader, parser
+
+
+def _parser(rules: Mapping[str, parser.Rule]) -> parser.Parser:
+    return parser.Parser(
+        next(iter(rules)),
+        rules,
+        lexer.Lexer(OrderedDict({
+            'a': lexer.Literal('a'),
+            'b': lexer.Literal('b'),
+        })),
+    )
+
+
+class AnalyzerTest(unittest.TestCase):
+
+    def test_nullable_rules(self):
+        self.assertEqual(
+            analyzer.nullable_rules({
+                'a': parser.Ref('b'),
+                'b': parser.ZeroOrOne(parser.Ref('x')),
+                'c': parser.And([parser.Ref('a'), parser.Ref('x')]),
+                'd': parser.Or([parser.Ref('x'), parser.Ref('a')]),
+                'e': parser.OneOrMore(parser.Ref('x')),
+            }),
+            {'a', 'b', 'd'},
+        )
+
+    def test_left_recursion(self):
+        for rules, expected in list[Tuple[Mapping[str, parser.Rule], Sequence[Sequence[str]]]]([
+            (
+                {'a': parser.And([parser.Ref('a'), parser.Ref('x')])},
+                [('a', 'a')],
+            ),
+            (
+                {
+                    'a': parser.Or([parser.Ref('x'), parser.Ref('b')]),
+                    'b': parser.And([parser.ZeroOrOne(parser.Ref('x')), parser.Ref('a')]),
+                },
+                [('a', 'b', 'a')],
+            ),
+            (
+                {'a': parser.And([parser.Ref('x'), parser.Ref('a')])},
+                [],
+            ),
+        ]):
+            with self.subTest(rules=rules, expected=expected):
+                self.assertEqual(analyzer.left_recursion(rules), expected)
+
+    def test_analyze_parser(self):
+        for rules, expected_errors, expected_warnings in list[Tuple[
+                Mapping[str, parser.Rule], Sequence[str], Sequence[str]]]([
+            (
+                {'r': parser.OneOrMore(parser.Ref('a'))},
+                [],
+                [],
+            ),
+            (
+                {'r': parser.ZeroOrMore(parser.ZeroOrOne(parser.Ref('a')))},
+                ['r: repetition a?* of a? which matches empty input loops forever'],
+                [],
+            ),
+            (
+                {'r': parser.ZeroOrMore(parser.OneOrMore(parser.Ref('a')))},
+                [],
+                ['r: nested repetition a+*'],
+            ),
+            (
+                {'r': parser.Or([parser.And([parser.Ref('r'), parser.Ref('a')]), parser.Ref('a')])},
+                [],
+                [],
+            ),
+            (
+                {
+                    'r': parser.Or([
+                        parser.Ref('a'),
+                        parser.And([parser.Ref('a'), parser.Ref('b')]),
+                    ]),
+                },
+                [],
+                ['r: alternative 1 (a b) is unreachable: alternative 0 a matches its prefix'],
+            ),
+            (
+                {
+                    'r': parser.Or([
+                        parser.ZeroOrOne(parser.Ref('a')),
+                        parser.Ref('b'),
+                    ]),
+                },
+                [],
+                ['r: alternative 1 b is unreachable: alternative 0 a? matches empty input'],
+            ),
+            (
+                {'r': parser.Ref('a'), 's': parser.Ref('b')},
+                [],
+                ['s: unreachable rule'],
+            ),
+        ]):
+            with self.subTest(rules=rules):
+                analysis = analyzer.analyze_parser(_parser(rules))
+                self.assertEqual([str(issue) for issue in analysis.errors], expected_errors)
+                self.assertEqual([str(issue) for issue in analysis.warnings], expected_warnings)
+
+    def test_analyze_left_recursion(self):
+        analysis = analyzer.analyze_parser(_parser({
+            'r': parser.Or([parser.And([parser.Ref('r'), parser.Ref('a')]), parser.Ref('a')]),
+        }))
+        self.assertEqual([str(issue) for issue in analysis.left_recursion],
+                         ['r > r: left recursion, which events mode does not support'])
+
+    def test_analyze_lexer(self):
+        analysis = analyzer.analyze_lexer(lexer.Lexer(OrderedDict({
+            'a': lexer.ZeroOrMore(lexer.Literal('a')),
+        })))
+        self.assertEqual(
+            [str(issue) for issue in analysis.errors],
+            ['_lexer_root: repetition _lexer_token! of _lexer_token '
+             'which matches empty input loops forever'],
+        )
+
+    def test_load(self):
+        with self.assertRaises(analyzer.Error):
+            loader.load_parser('a = "a"; r => (a?)*;')
+        with self.assertWarns(analyzer.GrammarWarning):
+            loader.load_parser('a = "a"; b = "b"; r => a | (a b);')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', analyzer.GrammarWarning)
+            loader.load_parser('a = "a"; _ws = "\\w+"; r => (r a) | a;')
+
+
+if __name__ == '__main__':
+    unittest.main()
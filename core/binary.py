@@ -0,0 +1,350 @@
+'''compact binary format for token streams and parse results
+
+A file is a header followed by records, each a tag byte and a body:
+
+    TOKENS  tokens, each a TOKEN tag and a token, then END
+    RESULT  a parser.Result tree as pre-order node records
+
+Strings are stored once per file: each string is written as a varint, 0
+followed by its length and utf-8 bytes the first time and its index in the
+file's string table plus one after that. Token lines are stored as the
+difference from the previous token's line. Ints are varints, zigzag encoded
+if they can be negative.
+
+Result nodes are a flags byte for whether they have a rule name, a value
+and children, followed by those. Trees are written and read with explicit
+stacks so any depth round-trips, and files are written and read in chunks
+so records can be streamed between processes.
+'''
+
+import io
+from typing import BinaryIO, Iterator, MutableMapping, MutableSequence, Optional, Tuple, Union
+from core import lexer, parser, processor
+
+
+class Error(processor.Error):
+    '''binary format error'''
+
+
+MAGIC = b'PYSHB'
+VERSION = 1
+
+Value = Union[lexer.TokenStream, parser.Result]
+'''what can be written'''
+
+_END = 0
+_TOKEN = 1
+_TOKENS = 2
+_RESULT = 3
+
+_RULE_NAME = 1
+_VALUE = 2
+_CHILDREN = 4
+
+_CHUNK_SIZE = 1 << 16
+
+
+class Writer:
+    '''writes records to a binary file'''
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._buffer = bytearray(MAGIC)
+        self._buffer.append(VERSION)
+        self._strings: MutableMapping[str, int] = {}
+        self._line = 0
+
+    def __enter__(self) -> 'Writer':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.flush()
+
+    def flush(self) -> None:
+        '''write buffered records to the file'''
+        self._file.write(self._buffer)
+        self._buffer.clear()
+        self._file.flush()
+
+    def _maybe_flush(self) -> None:
+        if len(self._buffer) >= _CHUNK_SIZE:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+
+    def _int(self, value: int) -> None:
+        self._uint(value << 1 if value >= 0 else (~value << 1) | 1)
+
+    def _uint(self, value: int) -> None:
+        buffer = self._buffer
+        while value > 0x7f:
+            buffer.append((value & 0x7f) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def _str(self, value: str) -> None:
+        index = self._strings.get(value)
+        if index is not None:
+            self._uint(index + 1)
+            return
+        self._strings[value] = len(self._strings)
+        data = value.encode()
+        self._uint(0)
+        self._uint(len(data))
+        self._buffer += data
+
+    def _token(self, token: lexer.Token) -> None:
+        self._str(token.rule_name)
+        self._str(token.value)
+        line = token.position.line
+        self._int(line - self._line)
+        self._line = line
+        self._int(token.position.column)
+
+    def write_tokens(self, tokens: lexer.TokenStream) -> None:
+        '''write a token stream record'''
+        self._buffer.append(_TOKENS)
+        for token in tokens:
+            self._buffer.append(_TOKEN)
+            self._token(token)
+            self._maybe_flush()
+        self._buffer.append(_END)
+
+    def write_result(self, result: parser.Result) -> None:
+        '''write a result record'''
+        self._buffer.append(_RESULT)
+        pending = [result]
+        while pending:
+            node = pending.pop()
+            flags = 0
+            if node.rule_name is not None:
+                flags |= _RULE_NAME
+            if node.value is not None:
+                if not isinstance(node.value, lexer.Token):
+                    raise Error(msg=f'unsupported result value {node.value!r}')
+                flags |= _VALUE
+            if node.children:
+                flags |= _CHILDREN
+            self._buffer.append(flags)
+            if node.rule_name is not None:
+                self._str(node.rule_name)
+            if node.value is not None:
+                self._token(node.value)
+            if node.children:
+                self._uint(len(node.children))
+                pending.extend(reversed(node.children))
+            self._maybe_flush()
+
+    def write(self, value: Value) -> None:
+        '''write a token stream or result record'''
+        if isinstance(value, lexer.TokenStream):
+            self.write_tokens(value)
+        elif isinstance(value, processor.Result):
+            self.write_result(value)
+        else:
+            raise Error(msg=f'unsupported value {value!r}')
+
+
+def _uint(buffer: bytes, offset: int) -> Tuple[int, int]:
+    '''the varint at offset in buffer and the offset after it
+
+    Raises IndexError if buffer ends first.
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _int(buffer: bytes, offset: int) -> Tuple[int, int]:
+    '''the zigzag varint at offset in buffer and the offset after it'''
+    value, offset = _uint(buffer, offset)
+    return (value >> 1 if not value & 1 else ~(value >> 1)), offset
+
+
+class Reader:
+    '''reads records from a binary file
+
+    Records are decoded straight from the buffered chunk, and a record that
+    runs past the end of the chunk is decoded again once more is read.
+    '''
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._buffer = b''
+        self._offset = 0
+        self._strings: MutableSequence[str] = []
+        self._line = 0
+        while len(self._buffer) < len(MAGIC) + 1:
+            if not self._fill():
+                raise Error(msg='not a binary file')
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            raise Error(msg='not a binary file')
+        if self._buffer[len(MAGIC)] != VERSION:
+            raise Error(msg=f'unsupported binary format version {self._buffer[len(MAGIC)]}')
+        self._offset = len(MAGIC) + 1
+
+    def _fill(self) -> bool:
+        '''read another chunk into the buffer, returning whether there was one'''
+        chunk = self._file.read(_CHUNK_SIZE)
+        if not chunk:
+            return False
+        self._buffer = self._buffer[self._offset:] + chunk
+        self._offset = 0
+        return True
+
+    def _refill(self, strings: int) -> None:
+        '''undo a partly decoded record and read more of it'''
+        del self._strings[strings:]
+        if not self._fill():
+            raise Error(msg='unexpected end of binary file')
+
+    def _str(self, buffer: bytes, offset: int) -> Tuple[str, int]:
+        index = buffer[offset]
+        if index < 0x80:
+            offset += 1
+        else:
+            index, offset = _uint(buffer, offset)
+        strings = self._strings
+        if index:
+            if index > len(strings):
+                raise Error(msg=f'invalid string index {index}')
+            return strings[index - 1], offset
+        length, offset = _uint(buffer, offset)
+        end = offset + length
+        if end > len(buffer):
+            raise IndexError(end)
+        try:
+            value = buffer[offset:end].decode()
+        except UnicodeDecodeError as error:
+            raise Error(msg=f'invalid string: {error}') from error
+        strings.append(value)
+        return value, end
+
+    def _token(self, buffer: bytes, offset: int) -> Tuple[lexer.Token, int]:
+        rule_name, offset = self._str(buffer, offset)
+        value, offset = self._str(buffer, offset)
+        line, offset = _int(buffer, offset)
+        column, offset = _int(buffer, offset)
+        self._line += line
+        return lexer.Token(rule_name, value, lexer.Position(self._line, column)), offset
+
+    def _tokens(self) -> Iterator[lexer.Token]:
+        while True:
+            tokens: MutableSequence[lexer.Token] = []
+            buffer = self._buffer
+            offset = self._offset
+            strings = len(self._strings)
+            try:
+                while (tag := buffer[offset]) == _TOKEN:
+                    token, offset = self._token(buffer, offset + 1)
+                    tokens.append(token)
+                    self._offset = offset
+                    strings = len(self._strings)
+                if tag != _END:
+                    raise Error(msg=f'unexpected tag {tag} in token stream')
+                self._offset = offset + 1
+                yield from tokens
+                return
+            except IndexError:
+                pass
+            yield from tokens
+            self._refill(strings)
+
+    def iter_tokens(self) -> Iterator[lexer.Token]:
+        '''the tokens of the next record, which must be a token stream, as they're read'''
+        tag = self._tag()
+        if tag != _TOKENS:
+            raise Error(msg=f'expected token stream, got tag {tag}')
+        return self._tokens()
+
+    def _result(self) -> parser.Result:
+        # parser.Result is a generic alias, which is slower to call
+        result_type = processor.Result
+        read_str = self._str
+        read_token = self._token
+        strings = self._strings
+        # each pending entry is a node's rule_name, value, children and child count
+        pending: MutableSequence[Tuple[
+            Optional[str], Optional[lexer.Token], MutableSequence[parser.Result], int]] = []
+        while True:
+            buffer = self._buffer
+            offset = self._offset
+            committed = (offset, len(strings), self._line)
+            try:
+                while True:
+                    flags = buffer[offset]
+                    rule_name: Optional[str] = None
+                    value: Optional[lexer.Token] = None
+                    if flags & _RULE_NAME:
+                        rule_name, offset = read_str(buffer, offset + 1)
+                    else:
+                        offset += 1
+                    if flags & _VALUE:
+                        value, offset = read_token(buffer, offset)
+                    if flags & _CHILDREN:
+                        count, offset = _uint(buffer, offset)
+                        committed = (offset, len(strings), self._line)
+                        pending.append((rule_name, value, [], count))
+                        continue
+                    committed = (offset, len(strings), self._line)
+                    result = result_type(rule_name=rule_name, value=value, children=[])
+                    while pending:
+                        children = pending[-1][2]
+                        children.append(result)
+                        if len(children) < pending[-1][3]:
+                            break
+                        rule_name, value, children, _ = pending.pop()
+                        result = result_type(rule_name=rule_name, value=value, children=children)
+                    else:
+                        self._offset = offset
+                        return result
+            except IndexError:
+                # a node's value may have been read, and its line delta applied,
+                # before the record ran out
+                self._offset, _, self._line = committed
+                self._refill(committed[1])
+
+    def _tag(self) -> Optional[int]:
+        '''the next record's tag, or None at the end of the file'''
+        if self._offset >= len(self._buffer) and not self._fill():
+            return None
+        tag = self._buffer[self._offset]
+        self._offset += 1
+        return tag
+
+    def read(self) -> Optional[Value]:
+        '''the next record, or None at the end of the file'''
+        tag = self._tag()
+        if tag is None:
+            return None
+        if tag == _TOKENS:
+            return lexer.TokenStream(list(self._tokens()))
+        if tag == _RESULT:
+            return self._result()
+        raise Error(msg=f'unexpected tag {tag}')
+
+    def __iter__(self) -> Iterator[Value]:
+        while (value := self.read()) is not None:
+            yield value
+
+
+def dumps(value: Value) -> bytes:
+    '''value in the binary format'''
+    file = io.BytesIO()
+    with Writer(file) as writer:
+        writer.write(value)
+    return file.getvalue()
+
+
+def loads(data: bytes) -> Value:
+    '''the value in data, which holds one record'''
+    reader = Reader(io.BytesIO(data))
+    value = reader.read()
+    if value is None or reader.read() is not None:
+        raise Error(msg='expected one record')
+    return value
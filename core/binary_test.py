@@ -0,0 +1,111 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+import io
+import unittest
+from core import binary, lexer, loader, parser
+
+
+def _token(rule_name: str, value: str, line: int = 0, column: int = 0) -> lexer.Token:
+    return lexer.Token(rule_name, value, lexer.Position(line, column))
+
+
+class BinaryTest(unittest.TestCase):
+
+    grammar = r'''
+        id = "[a-z]+";
+        _ws = "\w+";
+        root => item+;
+        item => id | ("(" item* ")");
+    '''
+
+    def test_tokens(self):
+        for tokens in list[lexer.TokenStream]([
+            lexer.TokenStream([]),
+            lexer.TokenStream([_token('a', 'x')]),
+            lexer.TokenStream([
+                _token('a', 'x', 3, 2),
+                _token('a', 'y', 1, 0),
+                _token('b', 'x', -1, -5),
+                _token('a', 'x', 1000000, 300),
+                _token('é', 'ü\n', 1000000, 301),
+                _token('', '', 0, 0),
+            ]),
+        ]):
+            with self.subTest(tokens=tokens):
+                self.assertEqual(binary.loads(binary.dumps(tokens)), tokens)
+
+    def test_result(self):
+        parser_ = loader.load_parser(self.grammar)
+        for result in list[parser.Result]([
+            parser.Result(),
+            parser.Result(rule_name='a'),
+            parser.Result(value=_token('a', 'x')),
+            parser.Result(children=[parser.Result(), parser.Result(rule_name='a')]),
+            parser_.apply('a (b (c) () d) e'),
+        ]):
+            with self.subTest(result=result):
+                self.assertEqual(binary.loads(binary.dumps(result)), result)
+
+    def test_deep_result(self):
+        result = parser.Result(value=_token('a', 'x'))
+        for depth in range(20000):
+            result = parser.Result(rule_name=str(depth % 3), children=[result, parser.Result()])
+        actual = binary.loads(binary.dumps(result))
+        for _ in range(20000):
+            self.assertEqual(actual.rule_name, result.rule_name)
+            self.assertEqual(len(actual.children), 2)
+            actual, result = actual.children[0], result.children[0]
+        self.assertEqual(actual, result)
+
+    def test_multi_chunk_result(self):
+        # every node has a value and children, so refills land between them
+        result = parser.Result(value=_token('a', 'x', 20000))
+        for line in reversed(range(20000)):
+            result = parser.Result(value=_token('a', 'x', line, 1), children=[result])
+        data = binary.dumps(result)
+        self.assertGreater(len(data), 1 << 16)
+        actual = binary.loads(data)
+        for _ in range(20000):
+            self.assertEqual(actual.value, result.value)
+            self.assertEqual(len(actual.children), 1)
+            actual, result = actual.children[0], result.children[0]
+        self.assertEqual(actual, result)
+
+    def test_size(self):
+        tokens = lexer.TokenStream([_token('id', 'abc', line, 0) for line in range(100)])
+        # a tag byte and four one byte varints per token
+        self.assertLessEqual(len(binary.dumps(tokens)), 20 + 5 * len(tokens))
+
+    def test_stream(self):
+        tokens = lexer.TokenStream([_token('id', f'v{i}', i, i % 7) for i in range(20000)])
+        result = loader.load_parser(self.grammar).apply('a (b c) d')
+        file = io.BytesIO()
+        with binary.Writer(file) as writer:
+            writer.write(tokens)
+            writer.write(result)
+            writer.write(tokens)
+        self.assertGreater(len(file.getvalue()), 1 << 16)
+        file.seek(0)
+        reader = binary.Reader(file)
+        self.assertEqual(list(reader.iter_tokens()), list(tokens))
+        self.assertEqual(list(reader), [result, tokens])
+
+    def test_errors(self):
+        data = binary.dumps(lexer.TokenStream([_token('a', 'x')]))
+        for input_data in [
+            b'',
+            b'nope',
+            binary.MAGIC + bytes([binary.VERSION + 1]),
+            data[:-3],
+            data + data[len(binary.MAGIC) + 1:],
+            data[:len(binary.MAGIC) + 1] + b'\x09',
+        ]:
+            with self.subTest(input_data=input_data):
+                with self.assertRaises(binary.Error):
+                    binary.loads(input_data)
+        with self.assertRaises(binary.Error):
+            binary.dumps(parser.Result(value='x'))  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
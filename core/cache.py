@@ -0,0 +1,300 @@
+'''caches for compiled grammars and the results of applying them'''
+
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, is_dataclass
+import hashlib
+import os
+import pickle
+import struct
+import tempfile
+import threading
+from typing import Any, Callable, Mapping, MutableMapping, Optional, Tuple, TypeVar
+import weakref
+from core import binary, lexer, parser
+
+_Value = TypeVar('_Value', lexer.TokenStream, parser.Result)
+
+ENGINE_VERSION = 2
+'''version of the compiled representation, bump when rule types change'''
+
+_FORMAT_VERSION = 2
+CACHE_DIR_ENV = 'PYSH_CACHE_DIR'
+
+_MAGIC = b'PYSHC'
+_HEADER = struct.Struct('<5sHH32s')
+
+
+def key(*parts: str) -> str:
+    '''hash of the given source parts and the engine version'''
+    digest = hashlib.sha256(f'{_FORMAT_VERSION}:{ENGINE_VERSION}'.encode())
+    for part in parts:
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part.encode())
+    return digest.hexdigest()
+
+
+def _header(source: str) -> bytes:
+    '''the header of cache files for source'''
+    return _HEADER.pack(_MAGIC, _FORMAT_VERSION, ENGINE_VERSION,
+                        hashlib.sha256(source.encode()).digest())
+
+
+def read_bytes(path: str, source: str) -> Optional[bytes]:
+    '''the data stored in the file at path for source, or None
+
+    Files that don't exist, are truncated, or were written by a different
+    version or from a different source are treated as misses.
+    '''
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(_HEADER.size)
+            if header != _header(source):
+                return None
+            return file.read()
+    except OSError:
+        return None
+
+
+def write_bytes(path: str, source: str, data: bytes) -> None:
+    '''atomically store data for source in the file at path
+
+    The file is a header holding the versions and a digest of source, then data.
+    '''
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(_header(source))
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read(path: str, source: str) -> Optional[Any]:
+    '''the value pickled in the file at path for source, or None
+
+    Files that fail to unpickle are treated as misses too.
+    '''
+    data = read_bytes(path, source)
+    if data is None:
+        return None
+    try:
+        return pickle.loads(data)
+    except Exception:  # pylint: disable=broad-exception-caught
+        return None
+
+
+def write(path: str, source: str, value: Any) -> None:
+    '''atomically pickle value for source in the file at path'''
+    write_bytes(path, source, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+@dataclass(frozen=True)
+class DiskCache:
+    '''cache files in a directory, keyed by a hash of their source
+
+    Writes are atomic so concurrent processes can share a directory.
+    '''
+
+    directory: str
+
+    def _path(self, kind: str, source: str) -> str:
+        return os.path.join(self.directory, f'{key(kind, source)}.{kind}')
+
+    def get_bytes(self, kind: str, source: str) -> Optional[bytes]:
+        '''the data stored for source, or None'''
+        return read_bytes(self._path(kind, source), source)
+
+    def put_bytes(self, kind: str, source: str, data: bytes) -> None:
+        '''store data for source, ignoring directories that can't be written'''
+        try:
+            write_bytes(self._path(kind, source), source, data)
+        except OSError:
+            pass
+
+    def get(self, kind: str, source: str) -> Optional[Any]:
+        '''the value pickled for source, or None'''
+        return read(self._path(kind, source), source)
+
+    def put(self, kind: str, source: str, value: Any) -> None:
+        '''pickle value for source, ignoring values or directories that can't be written'''
+        try:
+            write(self._path(kind, source), source, value)
+        except (OSError, pickle.PicklingError, AttributeError, TypeError, RecursionError):
+            pass
+
+
+def default_disk_cache() -> Optional[DiskCache]:
+    '''the disk cache in $PYSH_CACHE_DIR, if set'''
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if not directory:
+        return None
+    return DiskCache(directory)
+
+
+DEFAULT_MAX_SIZE = 1 << 24
+'''the default total size of the values a MemoryCache keeps'''
+
+
+class MemoryCache:
+    '''least recently used values, evicted once their total size passes max_size
+
+    Values are sized by the caller, usually by the length of the input they
+    were made from. This is safe to share between threads.
+    '''
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._entries: OrderedDict[str, Tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key_: str) -> Optional[Any]:
+        '''the value stored for key_, or None'''
+        with self._lock:
+            entry = self._entries.get(key_)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key_)
+            return entry[0]
+
+    def put(self, key_: str, value: Any, size: int) -> None:
+        '''store value for key_, evicting the least recently used values to fit it'''
+        if size > self.max_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key_, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key_] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+
+def structure_key(value: Any) -> str:
+    '''a hash of value's structure, such as a processor's rules
+
+    Dataclasses are described by their type and compared fields, so unlike their
+    text a literal and a ref to a rule of the same name differ. A dataclass
+    that's reachable more than once is described once and referred to after.
+    '''
+    digest = hashlib.sha256()
+    seen: MutableMapping[int, int] = {}
+
+    def add(value: Any) -> None:
+        if is_dataclass(value) and not isinstance(value, type):
+            index = seen.get(id(value))
+            if index is not None:
+                digest.update(f'@{index};'.encode())
+                return
+            seen[id(value)] = len(seen)
+            digest.update(f'{type(value).__module__}.{type(value).__qualname__}('.encode())
+            for field_ in fields(value):
+                if field_.compare:
+                    digest.update(f'{field_.name}='.encode())
+                    add(getattr(value, field_.name))
+            digest.update(b')')
+        elif isinstance(value, Mapping):
+            digest.update(b'{')
+            for item_key, item_value in value.items():
+                add(item_key)
+                add(item_value)
+            digest.update(b'}')
+        elif isinstance(value, (list, tuple)):
+            digest.update(b'[')
+            for item in value:
+                add(item)
+            digest.update(b']')
+        else:
+            digest.update(f'{type(value).__qualname__}:{value!r};'.encode())
+
+    add(value)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class ResultCache:
+    '''the outputs of lexers and parsers, keyed by a hash of their grammar and input
+
+    Outputs are kept in memory and, if disk is set, stored there too in the
+    binary format so other processes can reuse them.
+    '''
+
+    memory: MemoryCache = field(default_factory=MemoryCache)
+    disk: Optional[DiskCache] = None
+    _grammars: MutableMapping[int, Tuple[weakref.ref, str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+
+    def _grammar(self, processor: Any, grammar: Optional[str]) -> str:
+        '''grammar, or the structure_key of processor, remembered while processor lives'''
+        if grammar is not None:
+            return grammar
+        processor_id = id(processor)
+        entry = self._grammars.get(processor_id)
+        if entry is not None and entry[0]() is processor:
+            return entry[1]
+
+        def forget(ref: weakref.ref) -> None:
+            entry = self._grammars.get(processor_id)
+            if entry is not None and entry[0] is ref:
+                del self._grammars[processor_id]
+
+        grammar = structure_key(processor)
+        self._grammars[processor_id] = (weakref.ref(processor, forget), grammar)
+        return grammar
+
+    def apply(
+        self,
+        kind: str,
+        grammar: str,
+        input_str: str,
+        apply: Callable[[str], _Value],
+    ) -> _Value:
+        '''apply(input_str), reusing the stored output for the same kind, grammar and input'''
+        key_ = key(kind, grammar, input_str)
+        value = self.memory.get(key_)
+        if value is not None:
+            return value
+        source = f'{grammar}\0{input_str}'
+        if self.disk is not None:
+            data = self.disk.get_bytes(kind, source)
+            if data is not None:
+                try:
+                    value = binary.loads(data)
+                except binary.Error:
+                    pass
+        if value is None:
+            value = apply(input_str)
+            if self.disk is not None:
+                self.disk.put_bytes(kind, source, binary.dumps(value))
+        self.memory.put(key_, value, len(input_str) + 1)
+        return value
+
+    def lex(self, lexer_: lexer.Lexer, input_str: str, grammar: Optional[str] = None
+            ) -> lexer.TokenStream:
+        '''lexer_.apply(input_str), cached
+
+        grammar identifies lexer_'s rules and defaults to their structure_key.
+        '''
+        return self.apply('tokens', self._grammar(lexer_, grammar), input_str, lexer_.apply)
+
+    def parse(self, parser_: parser.Parser, input_str: str, grammar: Optional[str] = None
+              ) -> parser.Result:
+        '''parser_.apply(input_str), cached
+
+        grammar identifies parser_'s rules and defaults to their structure_key.
+        '''
+        return self.apply('result', self._grammar(parser_, grammar), input_str, parser_.apply)
+
+
+def default_result_cache() -> ResultCache:
+    '''a result cache backed by the disk cache in $PYSH_CACHE_DIR, if set'''
+    return ResultCache(disk=default_disk_cache())
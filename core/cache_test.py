@@ -0,0 +1,211 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+import collections
+import gc
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+from core import binary, cache, lexer, loader, processor
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache = cache.DiskCache(os.path.join(self.tmp_dir.name, 'cache'))
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get('parser', 'a'))
+
+    def test_put_get(self):
+        self.cache.put('parser', 'a', [1, 2])
+        self.assertEqual(self.cache.get('parser', 'a'), [1, 2])
+        self.assertIsNone(self.cache.get('parser', 'b'))
+        self.assertIsNone(self.cache.get('lexer', 'a'))
+
+    def test_engine_version(self):
+        self.cache.put('parser', 'a', 1)
+        with mock.patch.object(cache, 'ENGINE_VERSION', cache.ENGINE_VERSION + 1):
+            self.assertIsNone(self.cache.get('parser', 'a'))
+
+    def test_corrupt(self):
+        self.cache.put('parser', 'a', 1)
+        (path,) = [os.path.join(self.cache.directory, name)
+                   for name in os.listdir(self.cache.directory)]
+        with open(path, 'wb') as file:
+            file.write(b'garbage')
+        self.assertIsNone(self.cache.get('parser', 'a'))
+
+    def test_source_digest(self):
+        self.cache.put('parser', 'a', 1)
+        os.replace(self.cache._path('parser', 'a'),  # pylint: disable=protected-access
+                   self.cache._path('parser', 'b'))  # pylint: disable=protected-access
+        self.assertIsNone(self.cache.get('parser', 'b'))
+
+    def test_truncated(self):
+        self.cache.put_bytes('parser', 'a', b'data')
+        path = self.cache._path('parser', 'a')  # pylint: disable=protected-access
+        with open(path, 'rb') as file:
+            data = file.read()
+        self.assertTrue(data.endswith(b'data'))
+        with open(path, 'wb') as file:
+            file.write(data[:10])
+        self.assertIsNone(self.cache.get_bytes('parser', 'a'))
+
+    def test_unpicklable(self):
+        self.cache.put('parser', 'a', lambda: None)
+        self.assertIsNone(self.cache.get('parser', 'a'))
+
+
+class LoadParserCacheTest(unittest.TestCase):
+
+    grammar = r'''
+        id = "[a-z]+";
+        _ws = "\w+";
+        root => id+;
+    '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+        loader.load_parser.cache_clear()
+        self.addCleanup(loader.load_parser.cache_clear)
+
+    def test_in_process(self):
+        with mock.patch.dict(os.environ, {cache.CACHE_DIR_ENV: ''}):
+            self.assertIs(loader.load_parser(self.grammar), loader.load_parser(self.grammar))
+
+    def test_disk(self):
+        with mock.patch.dict(os.environ, {cache.CACHE_DIR_ENV: self.tmp_dir.name}):
+            expected = loader.load_parser(self.grammar)
+            loader.load_parser.cache_clear()
+            with mock.patch.object(loader, '_load_parser') as load:
+                actual = loader.load_parser(self.grammar)
+                load.assert_not_called()
+        self.assertIsNot(actual, expected)
+        self.assertEqual(actual, expected)
+        self.assertEqual(actual.apply('a b'), expected.apply('a b'))
+
+    def test_pickle_lexer(self):
+        parser_ = loader.load_parser(self.grammar)
+        parser_.apply('a b')
+        self.assertEqual(pickle.loads(pickle.dumps(parser_)).apply('a b'),
+                         parser_.apply('a b'))
+
+
+class MemoryCacheTest(unittest.TestCase):
+
+    def test_put_get(self):
+        memory = cache.MemoryCache(10)
+        self.assertIsNone(memory.get('a'))
+        memory.put('a', 1, 4)
+        self.assertEqual(memory.get('a'), 1)
+        memory.put('a', 2, 6)
+        self.assertEqual(memory.get('a'), 2)
+        self.assertEqual(memory.size, 6)
+
+    def test_evict(self):
+        memory = cache.MemoryCache(10)
+        memory.put('a', 1, 4)
+        memory.put('b', 2, 4)
+        memory.get('a')
+        memory.put('c', 3, 4)
+        self.assertEqual((memory.get('a'), memory.get('b'), memory.get('c')), (1, None, 3))
+        self.assertEqual(memory.size, 8)
+
+    def test_too_big(self):
+        memory = cache.MemoryCache(10)
+        memory.put('a', 1, 11)
+        self.assertIsNone(memory.get('a'))
+        self.assertEqual(len(memory), 0)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    grammar = r'''
+        id = "[a-z]+";
+        _ws = "\w+";
+        root => id+;
+    '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.parser = loader.load_parser(self.grammar)
+
+    def test_parse(self):
+        results = cache.ResultCache()
+        result = results.parse(self.parser, 'a b')
+        self.assertEqual(result, self.parser.apply('a b'))
+        with mock.patch.object(type(self.parser), 'apply') as apply:
+            self.assertIs(results.parse(self.parser, 'a b'), result)
+            apply.assert_not_called()
+        self.assertNotEqual(results.parse(self.parser, 'c'), result)
+
+    def test_lex(self):
+        results = cache.ResultCache()
+        tokens = results.lex(self.parser.lexer, 'a b')
+        self.assertEqual(tokens, self.parser.lexer.apply('a b'))
+        self.assertIs(results.lex(self.parser.lexer, 'a b'), tokens)
+
+    def test_grammar(self):
+        results = cache.ResultCache()
+        other = loader.load_parser(self.grammar.replace('id+', 'id'))
+        self.assertNotEqual(results.parse(self.parser, 'a b'), results.parse(other, 'a b'))
+        self.assertIs(results.parse(self.parser, 'a', 'g'), results.parse(other, 'a', 'g'))
+
+    def test_grammar_structure(self):
+        results = cache.ResultCache()
+        literal = lexer.Lexer(collections.OrderedDict({
+            'x': lexer.Literal('y'), 'y': lexer.Literal('z')}))
+        ref = lexer.Lexer(collections.OrderedDict({
+            'x': lexer.Ref('y'), 'y': lexer.Literal('z')}))
+        self.assertEqual(str(literal), str(ref))
+        self.assertEqual(len(results.lex(literal, 'y')), 1)
+        with self.assertRaises(lexer.Error):
+            results.lex(ref, 'y')
+
+    def test_grammar_forgotten(self):
+        results = cache.ResultCache()
+        parser_ = loader.load_parser(self.grammar.replace('id+', 'id*'))
+        results.parse(parser_, 'a')
+        self.assertEqual(len(results._grammars), 1)  # pylint: disable=protected-access
+        del parser_
+        loader.load_parser.cache_clear()
+        gc.collect()
+        self.assertEqual(len(results._grammars), 0)  # pylint: disable=protected-access
+
+    def test_error(self):
+        results = cache.ResultCache()
+        for _ in range(2):
+            with self.assertRaises(processor.Error):
+                results.parse(self.parser, '1')
+        self.assertEqual(len(results.memory), 0)
+
+    def test_disk(self):
+        disk = cache.DiskCache(self.tmp_dir.name)
+        expected = cache.ResultCache(disk=disk).parse(self.parser, 'a b')
+        results = cache.ResultCache(disk=disk)
+        with mock.patch.object(type(self.parser), 'apply') as apply:
+            actual = results.parse(self.parser, 'a b')
+            apply.assert_not_called()
+        self.assertIsNot(actual, expected)
+        self.assertEqual(actual, expected)
+
+    def test_disk_format(self):
+        disk = cache.DiskCache(self.tmp_dir.name)
+        input_str = 'abcdefgh ' * 8
+        result = cache.ResultCache(disk=disk).parse(self.parser, input_str)
+        (name,) = os.listdir(self.tmp_dir.name)
+        with open(os.path.join(self.tmp_dir.name, name), 'rb') as file:
+            data = file.read()
+        self.assertTrue(data.endswith(binary.dumps(result)))
+        self.assertNotIn(input_str.encode(), data)
+        self.assertNotIn(self.grammar.encode(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+'''context free grammars rewritten from parser rules
+
+Backends that don't apply rule trees directly, such as earley and lalr, parse
+with a Grammar instead. Ands become sequences, Ors become alternative
+productions, repetitions become left recursive productions and each precedence
+level of a Precedence becomes its own nonterminal. Each nonterminal has a build
+function that makes the same result parser.Parser makes for its rule.
+'''
+
+from dataclasses import dataclass
+from typing import Callable, MutableMapping, MutableSequence, Optional, Sequence, Set, Tuple, Union
+from core import parser, processor, stream
+
+
+class Error(parser.Error):
+    '''grammar rewriting error'''
+
+
+@dataclass(frozen=True)
+class Token:
+    '''terminal matching a token with rule_name, or any token if it's None'''
+
+    rule_name: Optional[str]
+
+    def __str__(self) -> str:
+        return '.' if self.rule_name is None else self.rule_name
+
+
+@dataclass(frozen=True)
+class End:
+    '''terminal matching the end of input without consuming a token'''
+
+    def __str__(self) -> str:
+        return '$'
+
+
+END = End()
+
+Nonterminal = Union[str, int]
+'''the name of a parser rule, or the index of an anonymous subrule'''
+
+Symbol = Union[Nonterminal, Token, End]
+
+Build = Callable[[int, Sequence[Optional[parser.Result]]], parser.Result]
+'''builds a nonterminal's result from its production's index and child results'''
+
+
+def _sequence(_: int, children: Sequence[Optional[parser.Result]]) -> parser.Result:
+    '''the result of an And, Or or ZeroOrOne: its children's results'''
+    return parser.Result(children=[child for child in children if child is not None])
+
+
+def _first(_: int, children: Sequence[Optional[parser.Result]]) -> parser.Result:
+    '''the result of a nonterminal that derives one child'''
+    child = children[0]
+    assert child is not None
+    return child
+
+
+def _repeat(_: int, children: Sequence[Optional[parser.Result]]) -> parser.Result:
+    '''the result of a repetition: the previous iterations' children, then the last'''
+    if not children or children[-1] is None:
+        return parser.Result()
+    if len(children) == 1:
+        return parser.Result(children=[children[0]])
+    previous, last = children
+    assert previous is not None and last is not None
+    return parser.Result(children=[*previous.children, last])
+
+
+class Grammar:  # pylint: disable=too-few-public-methods
+    '''the context free grammar a parser's rules are rewritten into
+
+    Nonterminals named after parser rules build the result of a Ref to the rule,
+    so the root rule's result is the only child of the root's result.
+    '''
+
+    def __init__(self, parser_: parser.Parser):
+        self._parser = parser_
+        self._tokens = parser_.lexer.lexer_rules()
+        self.productions: MutableMapping[Nonterminal, MutableSequence[Tuple[Symbol, ...]]] = {}
+        self.builds: MutableMapping[Nonterminal, Build] = {}
+        self.repetitions: MutableMapping[Nonterminal, Symbol] = {}
+        self._symbols: MutableMapping[int, Symbol] = {}
+        for rule_name, rule in parser_.rules.items():
+            self._add_rule(rule_name, rule)
+        self.nullable = self._nullable()
+
+    def _add(self, build: Build, *productions: Tuple[Symbol, ...]) -> int:
+        nonterminal = len(self.builds)
+        self.productions[nonterminal] = list(productions)
+        self.builds[nonterminal] = build
+        return nonterminal
+
+    def _add_rule(self, rule_name: str, rule: parser.Rule) -> None:
+        def build(_: int, children: Sequence[Optional[parser.Result]]) -> parser.Result:
+            child = _first(0, children)
+            return parser.Result(children=[child.with_rule_name(rule_name).simplify()])
+        self.productions[rule_name] = [(self.symbol(rule),)]
+        self.builds[rule_name] = build
+
+    def symbol(self, rule: parser.Rule) -> Symbol:
+        '''the symbol matching what rule matches, adding nonterminals as needed'''
+        symbol = self._symbols.get(id(rule))
+        if symbol is None:
+            symbol = self._symbol(rule)
+            self._symbols[id(rule)] = symbol
+        return symbol
+
+    def _symbol(self, rule: parser.Rule) -> Symbol:  # pylint: disable=too-many-return-statements
+        if isinstance(rule, parser.Ref):
+            if rule.rule_name in self._tokens:
+                return Token(rule.rule_name)
+            if rule.rule_name in self._parser.rules:
+                return rule.rule_name
+            raise Error(msg=f'unknown rule {rule.rule_name}')
+        if isinstance(rule, stream.Any):
+            return Token(None)
+        if isinstance(rule, processor.And):
+            return self._add(_sequence, tuple(self.symbol(child) for child in rule.children))
+        if isinstance(rule, processor.Or):
+            return self._add(_sequence, *[(self.symbol(child),) for child in rule.children])
+        if isinstance(rule, (processor.ZeroOrMore, processor.OneOrMore, stream.UntilEmpty)):
+            child = self.symbol(rule.child)
+            repetition = self._add(_repeat)
+            self.repetitions[repetition] = child
+            self.productions[repetition].extend([
+                (repetition, child),
+                (child,) if isinstance(rule, processor.OneOrMore) else (),
+            ])
+            if isinstance(rule, stream.UntilEmpty):
+                return self._add(_first, (repetition, END))
+            return repetition
+        if isinstance(rule, processor.ZeroOrOne):
+            return self._add(_sequence, (self.symbol(rule.child),), ())
+        if isinstance(rule, processor.Precedence):
+            return self._precedence(rule)
+        raise Error(msg=f'unsupported rule {rule}')
+
+    def _precedence(self, rule: parser.Precedence) -> Symbol:
+        '''one nonterminal per precedence level, each deriving the level above it'''
+        def operation(_: int, children: Sequence[Optional[parser.Result]]) -> parser.Result:
+            if len(children) == 1:
+                return _first(0, children)
+            return _sequence(0, children).with_rule_name(rule.rule_name)
+
+        level = self.symbol(rule.operand)
+        for precedence in sorted({operator.precedence for operator in rule.operators},
+                                 reverse=True):
+            operators = [
+                operator for operator in rule.operators if operator.precedence == precedence]
+            nonterminal = self._add(operation)
+            self.productions[nonterminal].extend([
+                (level, self.symbol(operator.rule), nonterminal) if operator.right
+                else (nonterminal, self.symbol(operator.rule), level)
+                for operator in operators
+            ] + [(level,)])
+            level = nonterminal
+
+        def build(_: int, children: Sequence[Optional[parser.Result]]) -> parser.Result:
+            child = _first(0, children)
+            if child.rule_name == rule.rule_name:
+                return child
+            return child.as_child_result()
+        return self._add(build, (level,))
+
+    def _nullable(self) -> Set[Nonterminal]:
+        nullable: Set[Nonterminal] = set()
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, productions in self.productions.items():
+                if nonterminal not in nullable and any(
+                        all(symbol in nullable for symbol in production)
+                        for production in productions):
+                    nullable.add(nonterminal)
+                    changed = True
+        return nullable
@@ -0,0 +1,260 @@
+'''Earley parser backend
+
+Parses with the same rule trees as parser.Parser in worst case cubic time for
+any grammar, including ambiguous grammars and grammars where ordered choice
+commits to an alternative that a later rule can't follow. Rules are rewritten
+into a cfg.Grammar first.
+
+Since a context free grammar has no ordered choice an input can have several
+derivations, and the Policy picks the one the result is built from. Results
+have the same shape as parser.Parser's results for the same derivation.
+'''
+
+from dataclasses import dataclass
+from enum import Enum
+from functools import cached_property
+from typing import (
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from core import cfg, lexer, parser, processor
+
+
+class Error(parser.Error):
+    '''earley parser error'''
+
+
+class Policy(Enum):
+    '''how a derivation is picked when an input has several'''
+
+    PEG = 'peg'
+    '''the derivation parser.Parser would find wherever it succeeds, else ORDERED'''
+
+    ORDERED = 'ordered'
+    '''the earliest alternative of each rule, then the longest earlier children'''
+
+
+_Item = Tuple[cfg.Nonterminal, int, int, int]
+'''a nonterminal, the index of one of its productions, the dot and the origin'''
+
+
+class _Chart:
+    '''the spans of tokens each nonterminal derives'''
+
+    def __init__(self, grammar: cfg.Grammar, tokens: Sequence[lexer.Token], root: cfg.Nonterminal):
+        self._grammar = grammar
+        self._tokens = tokens
+        self.ends: MutableMapping[Tuple[cfg.Nonterminal, int], Set[int]] = {}
+        self.starts: MutableMapping[Tuple[cfg.Nonterminal, int], Set[int]] = {}
+        self.furthest = 0
+        self._waiting: MutableSequence[Mapping[cfg.Nonterminal, Sequence[_Item]]] = []
+        '''the items at each position waiting for each nonterminal to complete'''
+        self._parse(root)
+
+    def _terminal(self, symbol: Union[cfg.Token, cfg.End], start: int) -> Optional[int]:
+        '''where symbol ends if it matches at start'''
+        if isinstance(symbol, cfg.End):
+            return start if start == len(self._tokens) else None
+        if start < len(self._tokens) and symbol.rule_name in (
+                None, self._tokens[start].rule_name):
+            return start + 1
+        return None
+
+    def _parse(self, root: cfg.Nonterminal) -> None:  # pylint: disable=too-many-locals
+        productions = self._grammar.productions
+        nullable = self._grammar.nullable
+        sets: Sequence[MutableSequence[_Item]] = [[] for _ in range(len(self._tokens) + 1)]
+        seen: Sequence[Set[_Item]] = [set() for _ in sets]
+
+        def add(position: int, item: _Item) -> None:
+            if item not in seen[position]:
+                seen[position].add(item)
+                sets[position].append(item)
+
+        for index in range(len(productions[root])):
+            add(0, (root, index, 0, 0))
+        for position, items in enumerate(sets):
+            waiting: MutableMapping[cfg.Nonterminal, MutableSequence[_Item]] = {}
+            predicted: Set[cfg.Nonterminal] = set()
+            if items:
+                self.furthest = position
+            for nonterminal, index, dot, origin in items:
+                production = productions[nonterminal][index]
+                if dot == len(production):
+                    self.ends.setdefault((nonterminal, origin), set()).add(position)
+                    self.starts.setdefault((nonterminal, position), set()).add(origin)
+                    parents = (waiting.get(nonterminal, []) if origin == position
+                               else self._waiting[origin].get(nonterminal, []))
+                    for parent, parent_index, parent_dot, parent_origin in parents:
+                        add(position, (parent, parent_index, parent_dot + 1, parent_origin))
+                    continue
+                symbol = production[dot]
+                if isinstance(symbol, (cfg.Token, cfg.End)):
+                    end = self._terminal(symbol, position)
+                    if end is not None:
+                        add(end, (nonterminal, index, dot + 1, origin))
+                    continue
+                waiting.setdefault(symbol, []).append((nonterminal, index, dot, origin))
+                if symbol not in predicted:
+                    predicted.add(symbol)
+                    for symbol_index in range(len(productions[symbol])):
+                        add(position, (symbol, symbol_index, 0, position))
+                if symbol in nullable or position in self.ends.get((symbol, position), ()):
+                    add(position, (nonterminal, index, dot + 1, origin))
+            self._waiting.append(waiting)
+
+    def span_ends(self, symbol: cfg.Symbol, start: int) -> Set[int]:
+        '''where symbol can end if it starts at start'''
+        if isinstance(symbol, (cfg.Token, cfg.End)):
+            end = self._terminal(symbol, start)
+            return set() if end is None else {end}
+        return self.ends.get((symbol, start), set())
+
+    def span_starts(self, symbol: cfg.Symbol, end: int) -> Set[int]:
+        '''where symbol can start if it ends at end'''
+        if isinstance(symbol, cfg.End):
+            return {end} if end == len(self._tokens) else set()
+        if isinstance(symbol, cfg.Token):
+            if 0 < end == self._terminal(symbol, end - 1):
+                return {end - 1}
+            return set()
+        return self.starts.get((symbol, end), set())
+
+
+_Derivation = Tuple[cfg.Nonterminal, int, Sequence[Union['_Derivation', cfg.Symbol, None]]]
+
+
+class _Extractor:  # pylint: disable=too-few-public-methods
+    '''builds the ORDERED derivation of a span from a chart'''
+
+    def __init__(self, grammar: cfg.Grammar, chart: _Chart, tokens: Sequence[lexer.Token]):
+        self._grammar = grammar
+        self._chart = chart
+        self._tokens = tokens
+        # the spans being built, so cyclic derivations like a => b; b => a are skipped
+        self._building: Set[Tuple[cfg.Symbol, int, int]] = set()
+
+    def _splits(
+        self,
+        production: Tuple[cfg.Symbol, ...],
+        start: int,
+        end: int,
+    ) -> Optional[Sequence[int]]:
+        '''the boundaries of production's children over start to end, longest first'''
+        # feasible[i] holds where production[i:] can start and still end at end
+        feasible: MutableSequence[Set[int]] = [{end}]
+        for symbol in reversed(production):
+            feasible.append({
+                symbol_start
+                for symbol_end in feasible[-1]
+                for symbol_start in self._chart.span_starts(symbol, symbol_end)
+                if symbol_start >= start
+            })
+        feasible.reverse()
+        if start not in feasible[0]:
+            return None
+        bounds = [start]
+        for index, symbol in enumerate(production):
+            bounds.append(max(
+                self._chart.span_ends(symbol, bounds[-1]) & feasible[index + 1]))
+        return bounds
+
+    def _repetition(self, child: cfg.Symbol, start: int, end: int) -> Sequence[int]:
+        '''the boundaries of a repetition's iterations over start to end, longest first
+
+        Iterations are found in a loop rather than by following the left
+        recursive productions so long repetitions don't exhaust the stack.
+        '''
+        feasible = {end}
+        pending = [end]
+        while pending:
+            for child_start in self._chart.span_starts(child, pending.pop()):
+                if child_start >= start and child_start not in feasible:
+                    feasible.add(child_start)
+                    pending.append(child_start)
+        bounds = [start]
+        while bounds[-1] != end:
+            bounds.append(max(
+                child_end for child_end in self._chart.span_ends(child, bounds[-1])
+                if child_end in feasible and child_end > bounds[-1]))
+        return bounds
+
+    def build(self, symbol: cfg.Symbol, start: int, end: int) -> Optional[parser.Result]:
+        '''the result of the ORDERED derivation of symbol over start to end'''
+        if isinstance(symbol, cfg.End):
+            return None
+        if isinstance(symbol, cfg.Token):
+            return parser.Result(value=self._tokens[start])
+        build = self._grammar.builds[symbol]
+        child = self._grammar.repetitions.get(symbol)
+        if child is not None:
+            bounds = self._repetition(child, start, end)
+            return parser.Result(children=[
+                self.build(child, child_start, child_end)  # type: ignore
+                for child_start, child_end in zip(bounds, bounds[1:])
+            ])
+        span = (symbol, start, end)
+        self._building.add(span)
+        try:
+            for index, production in enumerate(self._grammar.productions[symbol]):
+                bounds = self._splits(production, start, end)
+                if bounds is None:
+                    continue
+                children = list(zip(production, bounds, bounds[1:]))
+                if any(child in self._building for child in children):
+                    continue
+                try:
+                    return build(index, [self.build(*child) for child in children])
+                except Error:
+                    # every derivation of a child was cyclic
+                    continue
+        finally:
+            self._building.discard(span)
+        raise Error(msg=f'no derivation of {symbol} from {start} to {end}')
+
+
+@dataclass(frozen=True)
+class Parser:
+    '''parses with grammar's rules using the Earley algorithm'''
+
+    grammar: parser.Parser
+    policy: Policy = Policy.PEG
+
+    @cached_property
+    def _grammar(self) -> cfg.Grammar:
+        return cfg.Grammar(self.grammar)
+
+    def apply(self, input_str: str) -> parser.Result:
+        '''apply the grammar to the input text and return the structured result'''
+        return self.apply_tokens(self.grammar.lexer.apply(input_str))
+
+    def apply_tokens(self, tokens: lexer.TokenStream) -> parser.Result:
+        '''apply the grammar to tokens
+
+        Like parser.Parser the root rule may match a prefix of tokens, and the
+        longest prefix it derives is used.
+        '''
+        grammar = self._grammar
+        if self.policy == Policy.PEG:
+            try:
+                return self.grammar.apply_root_to_state_value_memoized(tokens)
+            except processor.Error:
+                pass
+        items = tokens.items
+        root = self.grammar.root_rule_name
+        if root not in grammar.productions:
+            raise Error(msg=f'unknown rule {root}')
+        chart = _Chart(grammar, items, root)
+        ends = chart.ends.get((root, 0))
+        if not ends:
+            raise Error(msg=f'failed to parse at {items[chart.furthest]}'
+                        if chart.furthest < len(items) else 'failed to parse: unexpected end')
+        result = _Extractor(grammar, chart, items).build(root, 0, max(ends))
+        assert result is not None
+        return result.children[0]
@@ -0,0 +1,123 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+from typing import Tuple
+import unittest
+from core import earley, loader, parser
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_same_results(self):
+        for grammar, input_str in list[Tuple[str, str]]([
+            (
+                r'''
+                    id = "[a-z]+";
+                    _ws = "\w+";
+                    root => item!;
+                    item => id | ("(" item* ")");
+                ''',
+                'a (b c) (d (e)) f',
+            ),
+            (
+                r'''
+                    int = "[0-9]+";
+                    _ws = "\w+";
+                    root => stmt+;
+                    stmt => int ";"?;
+                ''',
+                '1; 2 3;',
+            ),
+            (
+                r'''
+                    int = "[0-9]+";
+                    _ws = "\w+";
+                    expr => operand % "+" "-" | "*" "/" | right "^";
+                    operand => int | ("(" expr ")");
+                ''',
+                '1 + 2 * (3 - 4) ^ 5 ^ 6 - 7',
+            ),
+            (
+                r'''
+                    int = "[0-9]+";
+                    _ws = "\w+";
+                    sum => (sum "+" int) | (sum "-" int) | int;
+                ''',
+                '1 - 2 + 3',
+            ),
+        ]):
+            parser_ = loader.load_parser(grammar)
+            expected = parser_.apply(input_str)
+            for policy in earley.Policy:
+                with self.subTest(input_str=input_str, policy=policy):
+                    self.assertEqual(earley.Parser(parser_, policy).apply(input_str), expected)
+
+    def test_prefix(self):
+        parser_ = loader.load_parser(r'''
+            int = "[0-9]+";
+            _ws = "\w+";
+            expr => int % "+";
+        ''')
+        for policy in earley.Policy:
+            with self.subTest(policy=policy):
+                self.assertEqual(earley.Parser(parser_, policy).apply('1 + 2 +'),
+                                 parser_.apply('1 + 2 +'))
+
+    def test_ordered_choice_failure(self):
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            root => "a"* "a";
+        ''')
+        with self.assertRaises(parser.Error):
+            parser_.apply('a a a')
+        for policy in earley.Policy:
+            with self.subTest(policy=policy):
+                result = earley.Parser(parser_, policy).apply('a a a')
+                self.assertEqual(result.rule_name, 'root')
+                self.assertEqual(len(result.children), 2)
+                self.assertEqual(len(result.children[0].children), 2)
+
+    def test_ordered(self):
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            root => x "c";
+            x => many | two;
+            many => "a"+;
+            two => "a" "a";
+        ''')
+        result = earley.Parser(parser_, earley.Policy.ORDERED).apply('a a c')
+        self.assertEqual(len(result['many']), 1)
+        self.assertEqual(len(result['two']), 0)
+
+    def test_backtracking(self):
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            x => (y "b") | (y "a") | y;
+            y => ("a" x) | "a";
+        ''')
+        result = earley.Parser(parser_).apply(' '.join(['a'] * 50))
+        self.assertEqual(len(result.all_values()), 50)
+
+    def test_cyclic(self):
+        parser_ = loader.load_parser(r'''
+            x = "x";
+            a => b | x;
+            b => a;
+        ''')
+        expected = parser_.apply('x')
+        for policy in earley.Policy:
+            with self.subTest(policy=policy):
+                self.assertEqual(earley.Parser(parser_, policy).apply('x'), expected)
+
+    def test_error(self):
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            root => "a" "b";
+        ''')
+        for policy in earley.Policy:
+            with self.subTest(policy=policy):
+                with self.assertRaises(earley.Error):
+                    earley.Parser(parser_, policy).apply('a a')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,339 @@
+'''LALR(1) parser backend
+
+Parses with the same rule trees as parser.Parser using a table driven shift
+reduce parser, so parsing never recurses, backtracks or raises until it fails,
+runs in time linear in the number of tokens and keeps one stack entry per
+unfinished rule. Rules are rewritten into a cfg.Grammar and LALR(1) tables are
+built from it.
+
+Grammars that aren't LALR(1) have conflicts. They're resolved the way ordered
+choice and greedy repetition would resolve them: shift/reduce conflicts by
+shifting and reduce/reduce conflicts by reducing the production that comes
+first. Each resolved conflict is reported as an analyzer.GrammarWarning.
+
+Unlike parser.Parser the root rule has to match all of the tokens.
+'''
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import (
+    Any,
+    FrozenSet,
+    Hashable,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+import warnings
+from core import analyzer, cfg, lexer, parser
+
+
+class Error(parser.Error):
+    '''lalr parser error'''
+
+
+@dataclass(frozen=True)
+class Conflict:
+    '''a state where more than one action applies for the same lookahead'''
+
+    state: int
+    lookahead: str
+    actions: Sequence[str]
+    '''the conflicting actions, the one taken first'''
+
+    def __str__(self) -> str:
+        return f'conflict in state {self.state} on {self.lookahead}: {" over ".join(self.actions)}'
+
+
+_START = -1
+'''the nonterminal of the production added to accept the root rule'''
+
+_PROPAGATE = object()
+'''placeholder lookahead marking lookaheads propagated from a kernel item'''
+
+_Item = Tuple[int, int]
+'''a production's index and the position of the dot in it'''
+
+_Lookahead = Hashable
+'''a token's rule_name, None for any token or cfg.END'''
+
+
+def _lookahead(symbol: cfg.Symbol) -> _Lookahead:
+    if isinstance(symbol, cfg.Token):
+        return symbol.rule_name
+    return symbol
+
+
+def _str_lookahead(lookahead: _Lookahead) -> str:
+    if lookahead is None:
+        return '.'
+    if isinstance(lookahead, cfg.End):
+        return '$'
+    return str(lookahead)
+
+
+@dataclass(frozen=True)
+class _Production:
+    nonterminal: cfg.Nonterminal
+    index: int
+    '''the index of the production among its nonterminal's productions'''
+    symbols: Tuple[cfg.Symbol, ...]
+
+    def __str__(self) -> str:
+        return f'{self.nonterminal} -> {" ".join(str(symbol) for symbol in self.symbols)}'
+
+
+class _Tables:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    '''the LALR(1) action and goto tables for a grammar'''
+
+    def __init__(self, grammar: cfg.Grammar, root: str):
+        self._grammar = grammar
+        self.productions: MutableSequence[_Production] = [
+            _Production(_START, 0, (root, cfg.END))]
+        self._nonterminal_productions: MutableMapping[cfg.Nonterminal, Sequence[int]] = {}
+        for nonterminal, productions in grammar.productions.items():
+            self._nonterminal_productions[nonterminal] = range(
+                len(self.productions), len(self.productions) + len(productions))
+            self.productions.extend(
+                _Production(nonterminal, index, production)
+                for index, production in enumerate(productions))
+        self._first = self._firsts()
+        self.kernels: MutableSequence[FrozenSet[_Item]] = []
+        self.transitions: MutableSequence[MutableMapping[cfg.Symbol, int]] = []
+        self._states()
+        self.actions: MutableSequence[MutableMapping[_Lookahead, int]] = []
+        '''shifts to state n as n and reductions by production n as ~n'''
+        self.conflicts: MutableSequence[Conflict] = []
+        self._actions(self._lookaheads())
+
+    def _firsts(self) -> Mapping[cfg.Nonterminal, Set[_Lookahead]]:
+        '''the lookaheads each nonterminal can start with'''
+        first: MutableMapping[cfg.Nonterminal, Set[_Lookahead]] = {
+            production.nonterminal: set() for production in self.productions}
+        changed = True
+        while changed:
+            changed = False
+            for production in self.productions:
+                symbols_first = self._symbols_first(production.symbols, set(), first)
+                if not symbols_first <= first[production.nonterminal]:
+                    first[production.nonterminal] |= symbols_first
+                    changed = True
+        return first
+
+    def _symbols_first(
+        self,
+        symbols: Sequence[cfg.Symbol],
+        follow: Set[_Lookahead],
+        first: Optional[Mapping[cfg.Nonterminal, Set[_Lookahead]]] = None,
+    ) -> Set[_Lookahead]:
+        '''the lookaheads symbols can start with, or follow if they can match nothing'''
+        if first is None:
+            first = self._first
+        result: Set[_Lookahead] = set()
+        for symbol in symbols:
+            if isinstance(symbol, (cfg.Token, cfg.End)):
+                result.add(_lookahead(symbol))
+                return result
+            result |= first[symbol]
+            if symbol not in self._grammar.nullable:
+                return result
+        return result | follow
+
+    def _closure(self, items: Set[_Item]) -> Set[_Item]:
+        pending = list(items)
+        while pending:
+            index, dot = pending.pop()
+            symbols = self.productions[index].symbols
+            if dot < len(symbols) and not isinstance(symbols[dot], (cfg.Token, cfg.End)):
+                for production in self._nonterminal_productions[symbols[dot]]:
+                    if (production, 0) not in items:
+                        items.add((production, 0))
+                        pending.append((production, 0))
+        return items
+
+    def _states(self) -> None:
+        '''the LR(0) automaton'''
+        states: MutableMapping[FrozenSet[_Item], int] = {}
+
+        def state(kernel: FrozenSet[_Item]) -> int:
+            if kernel not in states:
+                states[kernel] = len(self.kernels)
+                self.kernels.append(kernel)
+                self.transitions.append({})
+            return states[kernel]
+
+        state(frozenset([(0, 0)]))
+        for kernel, transitions in zip(self.kernels, self.transitions):
+            successors: MutableMapping[cfg.Symbol, Set[_Item]] = {}
+            for index, dot in sorted(self._closure(set(kernel))):
+                symbols = self.productions[index].symbols
+                if dot < len(symbols):
+                    successors.setdefault(symbols[dot], set()).add((index, dot + 1))
+            for symbol, successor in successors.items():
+                transitions[symbol] = state(frozenset(successor))
+
+    def _lr1_closure(
+        self,
+        items: MutableMapping[_Item, Set[Any]],
+    ) -> MutableMapping[_Item, Set[Any]]:
+        pending = list(items)
+        while pending:
+            item = pending.pop()
+            index, dot = item
+            symbols = self.productions[index].symbols
+            if dot < len(symbols) and not isinstance(symbols[dot], (cfg.Token, cfg.End)):
+                follow = self._symbols_first(symbols[dot + 1:], items[item])
+                for production in self._nonterminal_productions[symbols[dot]]:
+                    lookaheads = items.setdefault((production, 0), set())
+                    if not follow <= lookaheads:
+                        lookaheads |= follow
+                        pending.append((production, 0))
+        return items
+
+    def _lookaheads(self) -> Mapping[Tuple[int, _Item], Set[_Lookahead]]:  # pylint: disable=too-many-locals
+        '''the lookaheads of each kernel item, spontaneous or propagated'''
+        lookaheads: MutableMapping[Tuple[int, _Item], Set[_Lookahead]] = {
+            (state, item): set() for state, kernel in enumerate(self.kernels) for item in kernel}
+        lookaheads[(0, (0, 0))].add(cfg.END)
+        propagate: MutableMapping[Tuple[int, _Item], MutableSequence[Tuple[int, _Item]]] = {}
+        for state, kernel in enumerate(self.kernels):
+            for kernel_item in kernel:
+                closure = self._lr1_closure({kernel_item: {_PROPAGATE}})
+                for (index, dot), item_lookaheads in closure.items():
+                    symbols = self.productions[index].symbols
+                    if dot == len(symbols):
+                        continue
+                    target = (self.transitions[state][symbols[dot]], (index, dot + 1))
+                    for lookahead in item_lookaheads:
+                        if lookahead is _PROPAGATE:
+                            propagate.setdefault((state, kernel_item), []).append(target)
+                        else:
+                            lookaheads[target].add(lookahead)
+        changed = True
+        while changed:
+            changed = False
+            for source, targets in propagate.items():
+                for target in targets:
+                    if not lookaheads[source] <= lookaheads[target]:
+                        lookaheads[target] |= lookaheads[source]
+                        changed = True
+        return lookaheads
+
+    def _actions(self, lookaheads: Mapping[Tuple[int, _Item], Set[_Lookahead]]) -> None:
+        for state, kernel in enumerate(self.kernels):
+            candidates: MutableMapping[_Lookahead, MutableSequence[int]] = {}
+            for symbol, target in self.transitions[state].items():
+                if isinstance(symbol, (cfg.Token, cfg.End)):
+                    candidates.setdefault(_lookahead(symbol), []).append(target)
+            closure = self._lr1_closure(
+                {item: set(lookaheads[(state, item)]) for item in kernel})
+            for (index, dot), item_lookaheads in sorted(closure.items()):
+                if dot == len(self.productions[index].symbols):
+                    for lookahead in item_lookaheads:
+                        candidates.setdefault(lookahead, []).append(~index)
+            actions: MutableMapping[_Lookahead, int] = {}
+            for lookahead, lookahead_actions in candidates.items():
+                actions[lookahead] = lookahead_actions[0]
+                if len(lookahead_actions) > 1:
+                    self.conflicts.append(Conflict(
+                        state,
+                        _str_lookahead(lookahead),
+                        [self._str_action(action) for action in lookahead_actions],
+                    ))
+            self.actions.append(actions)
+
+    def _str_action(self, action: int) -> str:
+        if action >= 0:
+            return 'shift'
+        return f'reduce {self.productions[~action]}'
+
+
+@dataclass(frozen=True)
+class Parser:
+    '''parses with grammar's rules using LALR(1) tables'''
+
+    grammar: parser.Parser
+
+    def __post_init__(self):
+        for conflict in self.conflicts:
+            warnings.warn(str(conflict), analyzer.GrammarWarning, stacklevel=3)
+
+    @cached_property
+    def _grammar(self) -> cfg.Grammar:
+        return cfg.Grammar(self.grammar)
+
+    @cached_property
+    def _tables(self) -> _Tables:
+        return _Tables(self._grammar, self.grammar.root_rule_name)
+
+    @property
+    def conflicts(self) -> Sequence[Conflict]:
+        '''the conflicts resolved while building the tables'''
+        return self._tables.conflicts
+
+    def apply(self, input_str: str) -> parser.Result:
+        '''apply the grammar to the input text and return the structured result'''
+        return self.apply_tokens(self.grammar.lexer.apply(input_str))
+
+    def apply_tokens(  # pylint: disable=too-many-locals,too-many-branches
+        self,
+        tokens: lexer.TokenStream,
+    ) -> parser.Result:
+        '''apply the grammar to all of tokens'''
+        tables = self._tables
+        actions = tables.actions
+        transitions = tables.transitions
+        productions = tables.productions
+        builds = self._grammar.builds
+        repetitions = self._grammar.repetitions
+        items = tokens.items
+        states = [0]
+        # repetitions are kept as lists of their items' results until they're used
+        values: MutableSequence[Any] = []
+        position = 0
+        while True:
+            state_actions = actions[states[-1]]
+            if position < len(items):
+                token: Optional[lexer.Token] = items[position]
+                assert token is not None
+                action = state_actions.get(token.rule_name)
+                if action is None:
+                    action = state_actions.get(None)
+            else:
+                token = None
+                action = state_actions.get(cfg.END)
+            if action is None:
+                raise Error(msg=f'unexpected {token}' if token is not None
+                            else 'unexpected end of input')
+            if action >= 0:
+                states.append(action)
+                if token is None:
+                    values.append(None)
+                else:
+                    values.append(parser.Result(value=token))
+                    position += 1
+                continue
+            production = productions[~action]
+            if production.nonterminal == _START:
+                return values[0].children[0]
+            count = len(production.symbols)
+            children = values[len(values) - count:]
+            del values[len(values) - count:]
+            del states[len(states) - count:]
+            if production.nonterminal in repetitions:
+                if production.index == 0:
+                    value = children[0]
+                    value.append(children[1])
+                else:
+                    value = children
+            else:
+                value = builds[production.nonterminal](production.index, [
+                    parser.Result(children=child) if isinstance(child, list) else child
+                    for child in children
+                ])
+            states.append(transitions[states[-1]][production.nonterminal])
+            values.append(value)
@@ -0,0 +1,90 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+from typing import Tuple
+import unittest
+import warnings
+from core import analyzer, lalr, loader
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_same_results(self):
+        for grammar, input_str in list[Tuple[str, str]]([
+            (
+                r'''
+                    id = "[a-z]+";
+                    _ws = "\w+";
+                    root => item!;
+                    item => id | ("(" item* ")");
+                ''',
+                'a (b c) (d (e)) f',
+            ),
+            (
+                r'''
+                    int = "[0-9]+";
+                    _ws = "\w+";
+                    root => stmt!;
+                    stmt => int ";"?;
+                ''',
+                '1; 2 3;',
+            ),
+            (
+                r'''
+                    int = "[0-9]+";
+                    _ws = "\w+";
+                    root => expr!;
+                    expr => operand % "+" "-" | "*" "/" | right "^";
+                    operand => int | ("(" expr ")");
+                ''',
+                '1 + 2 * (3 - 4) ^ 5 ^ 6 - 7',
+            ),
+        ]):
+            with self.subTest(input_str=input_str):
+                parser_ = loader.load_parser(grammar)
+                lalr_parser = lalr.Parser(parser_)
+                self.assertEqual(lalr_parser.conflicts, [])
+                self.assertEqual(lalr_parser.apply(input_str), parser_.apply(input_str))
+
+    def test_conflict(self):
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            root => stmt!;
+            stmt => ("if" stmt "else" stmt) | ("if" stmt) | "x";
+        ''')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            lalr_parser = lalr.Parser(parser_)
+        self.assertEqual(len(lalr_parser.conflicts), 1)
+        self.assertEqual(lalr_parser.conflicts[0].lookahead, 'else')
+        self.assertEqual([warning.category for warning in caught], [analyzer.GrammarWarning])
+        input_str = 'if if x else x'
+        self.assertEqual(lalr_parser.apply(input_str), parser_.apply(input_str))
+
+    def test_left_recursion(self):
+        parser_ = loader.load_parser(r'''
+            int = "[0-9]+";
+            _ws = "\w+";
+            sum => (sum "+" int) | int;
+        ''')
+        result = lalr.Parser(parser_).apply(' + '.join(['1'] * 2000))
+        sums = 0
+        pending = [result]
+        while pending:
+            result = pending.pop()
+            sums += result.rule_name == 'sum'
+            pending.extend(result.children)
+        self.assertEqual(sums, 2000)
+
+    def test_error(self):
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            root => "a" "b";
+        ''')
+        for input_str in ['a a', 'a', 'a b b']:
+            with self.subTest(input_str=input_str):
+                with self.assertRaises(lalr.Error):
+                    lalr.Parser(parser_).apply(input_str)
+
+
+if __name__ == '__main__':
+    unittest.main()
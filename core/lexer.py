@@ -1,8 +1,31 @@
-'''lexer splits an input stream in a stream of tokens'''
-
-from dataclasses import dataclass
+'''lexer splits an input stream in a stream of tokens'''  # pylint: disable=too-many-lines
+
+from array import array
+import bisect
+from concurrent import futures
+import copy
+import re
+from dataclasses import dataclass, field
+from functools import cached_property
+import os
 import string
-from typing import Mapping, MutableSequence, OrderedDict, Sequence, Type
+import threading
+from typing import (
+    Callable,
+    Container,
+    FrozenSet,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    OrderedDict,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    overload,
+)
 from core import stream, processor
 
 
@@ -10,13 +33,17 @@ class Error(processor.Error):
     '''lexer error'''
 
 
-@dataclass(frozen=True, order=True)
+@dataclass(frozen=True, order=True, slots=True, init=False)
 class Position:
     '''the position of a token in a input document'''
 
     line: int
     column: int
 
+    def __init__(self, line: int, column: int) -> None:
+        _set_line(self, line)
+        _set_column(self, column)
+
     def __add__(self, input_str: str) -> 'Position':
         line = self.line
         column = self.column
@@ -28,8 +55,43 @@ class Position:
                 column += 1
         return Position(line, column)
 
+    def offset(self, input_str: str) -> int:
+        '''the offset of this position in input_str'''
+        start = 0
+        for _ in range(self.line):
+            start = input_str.index('\n', start) + 1
+        return start + self.column
+
+    @staticmethod
+    def at(input_str: str, offset: int) -> 'Position':
+        '''the position of the given offset in input_str'''
+        line = input_str.count('\n', 0, offset)
+        return Position(line, offset - input_str.rfind('\n', 0, offset) - 1)
+
+
+# Positions and tokens are made for every token lexed, so they set their slots
+# through the slots' descriptors rather than the frozen dataclass's
+# object.__setattr__ calls, which cost more than the rest of construction.
+_set_line = vars(Position)['line'].__set__
+_set_column = vars(Position)['column'].__set__
+
 
 @dataclass(frozen=True)
+class Edit:
+    '''replacement of deleted chars at offset in a text with inserted'''
+
+    offset: int
+    deleted: int
+    inserted: str
+
+    def apply(self, input_str: str) -> str:
+        '''the text after this edit'''
+        if self.offset < 0 or self.deleted < 0 or self.offset + self.deleted > len(input_str):
+            raise Error(msg=f'invalid edit {self} for text of length {len(input_str)}')
+        return input_str[:self.offset] + self.inserted + input_str[self.offset+self.deleted:]
+
+
+@dataclass(frozen=True, slots=True)
 class Char:
     '''one char in an incoming doc'''
 
@@ -65,7 +127,7 @@ class RuleError(StateError, processor.RuleError[Char, CharStream]):  # pylint: d
     '''lexer error for rule'''
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True, init=False)
 class Token:
     '''one item in an input document'''
 
@@ -73,12 +135,30 @@ class Token:
     value: str
     position: Position
 
+    def __init__(self, rule_name: str, value: str, position: Position) -> None:
+        _set_rule_name(self, rule_name)
+        _set_value(self, value)
+        _set_position(self, position)
+
     def __repr__(self) -> str:
         return f'{self.rule_name}({self.value})'
 
 
+_set_rule_name = vars(Token)['rule_name'].__set__
+_set_value = vars(Token)['value'].__set__
+_set_position = vars(Token)['position'].__set__
+
+
+@dataclass(frozen=True)
 class TokenStream(stream.Stream[Token]):
-    '''token stream'''
+    '''token stream
+
+    lookahead, if known, is the offset past the furthest char examined while
+    lexing each token or any token before it. relex sets it so later edits can
+    tell which tokens they might change.
+    '''
+
+    lookahead: Optional[Sequence[int]] = field(default=None, compare=False, repr=False)
 
     def __str__(self) -> str:
         if self.empty:
@@ -93,6 +173,128 @@ class TokenStream(stream.Stream[Token]):
         return TokenStream(self._items[1:])
 
 
+class _Columns:  # pylint: disable=too-few-public-methods
+    '''the columns a TokenBuffer and its slices share'''
+
+    def __init__(self, text: str):
+        self.text = text
+        self.types: MutableSequence[str] = []
+        self.type_ids: MutableMapping[str, int] = {}
+        self.type_column = array('I')
+        self.start_column = array('q')
+        self.end_column = array('q')
+        self._line_starts: Optional[array] = None
+
+    @property
+    def line_starts(self) -> array:
+        '''the offset each line of text starts at, found the first time it's needed'''
+        if self._line_starts is None:
+            line_starts = array('q', [0])
+            offset = self.text.find('\n')
+            while offset != -1:
+                line_starts.append(offset + 1)
+                offset = self.text.find('\n', offset + 1)
+            self._line_starts = line_starts
+        return self._line_starts
+
+
+class TokenBuffer(Sequence[Token]):
+    '''tokens stored as columns of type ids and offsets into the text they're from
+
+    Rule names are interned and each token takes one int and two offsets in
+    array columns. Indexing builds a Token view with the value sliced from the
+    text, so the buffer can back a TokenStream for existing consumers. Slices
+    are views that share the columns.
+    '''
+
+    def __init__(self, text: str):
+        self._columns = _Columns(text)
+        self._start = 0
+        self._stop: Optional[int] = None
+        '''where this view ends, or None for the whole buffer as it grows'''
+
+    def __len__(self) -> int:
+        if self._stop is None:
+            return len(self._columns.type_column) - self._start
+        return self._stop - self._start
+
+    @overload
+    def __getitem__(self, index: int) -> Token: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> 'TokenBuffer': ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Token, 'TokenBuffer']:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise Error(msg=f'unsupported TokenBuffer slice step {step}')
+            view = copy.copy(self)
+            view._start = self._start + start
+            view._stop = self._start + max(start, stop)
+            return view
+        return Token(self.rule_name(index), self.value(index), self.position(index))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def _index(self, index: int) -> int:
+        '''the index of the token at index in the columns'''
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError(f'TokenBuffer index {index} out of range')
+        return self._start + index
+
+    @property
+    def text(self) -> str:
+        '''the text the tokens are from'''
+        return self._columns.text
+
+    def append(self, rule_name: str, start: int, end: int) -> None:
+        '''add a token for rule_name spanning start to end in text'''
+        if self._stop is not None:
+            raise Error(msg='appending to TokenBuffer slice')
+        columns = self._columns
+        type_id = columns.type_ids.get(rule_name)
+        if type_id is None:
+            type_id = columns.type_ids[rule_name] = len(columns.types)
+            columns.types.append(rule_name)
+        columns.type_column.append(type_id)
+        columns.start_column.append(start)
+        columns.end_column.append(end)
+
+    def rule_name(self, index: int) -> str:
+        '''the rule name of the token at index'''
+        return self._columns.types[self._columns.type_column[self._index(index)]]
+
+    def value(self, index: int) -> str:
+        '''the text of the token at index'''
+        index = self._index(index)
+        columns = self._columns
+        return columns.text[columns.start_column[index]:columns.end_column[index]]
+
+    def offsets(self, index: int) -> Tuple[int, int]:
+        '''where the token at index starts and ends in text'''
+        index = self._index(index)
+        return self._columns.start_column[index], self._columns.end_column[index]
+
+    def position(self, index: int) -> Position:
+        '''the position of the token at index'''
+        start = self._columns.start_column[self._index(index)]
+        line_starts = self._columns.line_starts
+        line = bisect.bisect_right(line_starts, start) - 1
+        return Position(line, start - line_starts[line])
+
+
 State = processor.State[Char, CharStream]
 Result = processor.Result[Char]
 ResultAndState = processor.ResultAndState[Char, CharStream]
@@ -106,6 +308,18 @@ ZeroOrOne = processor.ZeroOrOne[Char, CharStream]
 NaryRule = processor.NaryRule[Char, CharStream]
 UnaryRule = processor.UnaryRule[Char, CharStream]
 
+Text = str | bytes | bytearray | memoryview
+'''input accepted by the lexer: decoded text or a utf-8 buffer'''
+
+_Matcher = Callable[[Text, int], int]
+_NO_MATCH = -1
+
+_LiteralMatcher = Callable[[Text, int], Tuple[int, str]]
+'''a matcher that also returns the name of the rule that matched'''
+
+_Scanner = Tuple[str, _Matcher, Optional[_LiteralMatcher]]
+'''a rule name and matcher, and for a run of literal rules a _LiteralMatcher too'''
+
 _INTERNAL_PREFIX = '_lexer_'
 _ROOT_RULE_NAME = f'{_INTERNAL_PREFIX}root'
 _TOKEN_RULE_NAME = f'{_INTERNAL_PREFIX}token'
@@ -130,6 +344,9 @@ class Lexer(processor.Processor[Char, CharStream]):
             },
         )
 
+    def __reduce__(self):
+        return Lexer, (OrderedDict[str, Rule](self.lexer_rules()),)
+
     def __str__(self) -> str:
         output = ''
         for name, rule in self.lexer_rules().items():
@@ -157,24 +374,421 @@ class Lexer(processor.Processor[Char, CharStream]):
             position += char
         return CharStream(chars)
 
-    def _convert_result(self, result: Result) -> TokenStream:
+    def _scan_rules(self, input_str: str) -> Iterator[Tuple[str, int, int, Position]]:
+        '''yield (rule_name, start, end, position) for every token that isn't excluded,
+        by matching the rules themselves
+
+        Each token is emitted as its rule matches, from the offsets before and
+        after it, so no result tree is built. If no rule matches the token rule
+        is applied there to report why.
+        '''
+        chars = self._convert_input(input_str)
+        rule_names = list(self.lexer_rules())
+        excluded = self._excluded
+        state = self.new_state(chars)
+        while not state.value.empty:
+            start = len(chars) - len(state.value)
+            for rule_name in rule_names:
+                next_state = self.match_rule_name_to_state(rule_name, state)
+                if next_state is not None:
+                    break
+            else:
+                self.apply_rule_name_to_state(_TOKEN_RULE_NAME, state)
+                raise Error(msg=f'failed to lex at {state.value.head.position}')
+            end = len(chars) - len(next_state.value)
+            if end == start:
+                raise Error(
+                    msg=f'lex rule {rule_name} matched empty token at {state.value.head.position}')
+            if rule_name not in excluded:
+                yield rule_name, start, end, state.value.head.position
+            state = next_state
+
+    def _apply_rules(self, input_str: str) -> TokenStream:
+        '''split input_str into tokens by matching the rules themselves'''
+        return TokenStream([
+            Token(rule_name, input_str[start:end], position)
+            for rule_name, start, end, position in self._scan_rules(input_str)
+        ])
+
+    def apply(self, input_str: str, lookahead: bool = False) -> TokenStream:
+        '''split an input str into a tokens
+
+        This runs the compiled matchers. If they fail, or the rules can't be
+        compiled, the input is lexed again with the rules themselves to get the
+        tokens or the detailed error. If lookahead is set the compiled matchers
+        also record how far they look, which is slower, and the stream's
+        lookahead is set so the first relex of it doesn't lex input_str again.
+        '''
+        if lookahead:
+            try:
+                return self._apply_lookahead(input_str)
+            except Error:
+                return self._apply_rules(input_str)
+        return TokenStream(list(self.iter_tokens(input_str)))
+
+    def _apply_lookahead(self, input_str: str) -> TokenStream:
+        '''split input_str into tokens with the compiled matchers, setting lookahead'''
         tokens: MutableSequence[Token] = []
-        for token_result in result[_TOKEN_RULE_NAME]:
-            rule_result = token_result.skip().where_one(Result.has_rule_name)
-            rule_name = rule_result.rule_name
-            assert rule_name, rule_result
-            chars = rule_result.all_values()
-            value = ''.join(char.value for char in chars)
-            assert value
-            if not rule_name.startswith(EXCLUDE_NAME_PREFIX):
-                tokens.append(Token(rule_name, value, chars[0].position))
-        return TokenStream(tokens)
+        lookahead = array('q')
+        position = Position(0, 0)
+        offset = 0
+        for rule_name, start, end, reach in self._scan_lookahead(input_str):
+            position = _advance_str(position, input_str, offset, start)
+            offset = start
+            tokens.append(Token(rule_name, input_str[start:end], position))
+            lookahead.append(max(reach, lookahead[-1]) if lookahead else reach)
+        return TokenStream(tokens, lookahead)
+
+    @cached_property
+    def _str_matchers(self) -> Sequence[Tuple[str, _Matcher]]:
+        return _Compiler(self.rules, binary=False).compile_lexer_rules(self.lexer_rules())
+
+    @cached_property
+    def _bytes_matchers(self) -> Sequence[Tuple[str, _Matcher]]:
+        return _Compiler(self.rules, binary=True).compile_lexer_rules(self.lexer_rules())
+
+    def _matchers(self, text: Text) -> Sequence[Tuple[str, _Matcher]]:
+        return self._str_matchers if isinstance(text, str) else self._bytes_matchers
+
+    @cached_property
+    def _str_scanners(self) -> Sequence[_Scanner]:
+        return _scanners(self.rules, self._str_matchers, binary=False)
+
+    @cached_property
+    def _bytes_scanners(self) -> Sequence[_Scanner]:
+        return _scanners(self.rules, self._bytes_matchers, binary=True)
+
+    def _scanners(self, text: Text) -> Sequence[_Scanner]:
+        return self._str_scanners if isinstance(text, str) else self._bytes_scanners
+
+    @cached_property
+    def _excluded(self) -> FrozenSet[str]:
+        return frozenset(
+            name for name in self.lexer_rules() if name.startswith(EXCLUDE_NAME_PREFIX))
+
+    @cached_property
+    def _str_skips(self) -> Sequence[Tuple[Container[str], _Matcher]]:
+        return _skips(self.rules, self._str_matchers, binary=False)
+
+    @cached_property
+    def _bytes_skips(self) -> Sequence[Tuple[Container[int], _Matcher]]:
+        return _skips(self.rules, self._bytes_matchers, binary=True)
+
+    def recognize(self, text: Text) -> int:
+        '''the offset up to which text splits into tokens
+
+        This only runs the compiled matchers, without building tokens, results or
+        errors: text is fully lexable iff this returns len(text).
+        '''
+        scanners = self._scanners(text)
+        pos = 0
+        end = len(text)
+        while pos < end:
+            for _, matcher, _ in scanners:
+                token_end = matcher(text, pos)
+                if token_end != _NO_MATCH:
+                    break
+            else:
+                return pos
+            if token_end == pos:
+                return pos
+            pos = token_end
+        return pos
+
+    def _scan(  # pylint: disable=too-many-branches
+        self,
+        text: Text,
+        start: int = 0,
+        scanners: Optional[Sequence[_Scanner]] = None,
+        skips: Optional[Sequence[Tuple[Container, _Matcher]]] = None,
+    ) -> Iterator[Tuple[str, int, int]]:
+        '''yield (rule_name, start, end) for every token that isn't excluded
+
+        Lex rules are compiled into offset matchers over text, so no Char or Result
+        objects are built. Rules are tried in order and the first match wins, as in
+        the processor-based apply, with each run of literal rules tried at once by
+        one trie matcher. Excluded text is skipped by advancing the offset:
+        wherever the next char can't start any rule before an excluded rule, runs
+        of that rule are skipped in a tight loop before the other rules are tried.
+        scanners and skips default to the lexer's own.
+        '''
+        if scanners is None:
+            scanners = self._scanners(text)
+        if skips is None:
+            skips = self._str_skips if isinstance(text, str) else self._bytes_skips
+        excluded = self._excluded
+        pos = start
+        end = len(text)
+        while pos < end:
+            for blocked, skip in skips:
+                while pos < end and text[pos] not in blocked:  # type: ignore
+                    skip_end = skip(text, pos)
+                    if skip_end <= pos:
+                        break
+                    pos = skip_end
+            if pos >= end:
+                return
+            for rule_name, matcher, literal_matcher in scanners:
+                if literal_matcher is None:
+                    token_end = matcher(text, pos)
+                else:
+                    token_end, rule_name = literal_matcher(text, pos)
+                if token_end != _NO_MATCH:
+                    break
+            else:
+                raise Error(msg=f'failed to lex at offset {pos}')
+            if token_end == pos:
+                raise Error(
+                    msg=f'lex rule {rule_name} matched empty token at offset {pos}')
+            if rule_name not in excluded:
+                yield rule_name, pos, token_end
+            pos = token_end
+
+    def _scan_lookahead(self, text: str, start: int = 0) -> Iterator[Tuple[str, int, int, int]]:
+        '''_scan, also yielding the offset past the furthest char examined since the
+        previous token was yielded
+
+        This uses matchers that record how far they look, which is slower, so
+        it's only used by relex and apply with lookahead.
+        '''
+        reach, scanners, skips = self._lookahead_scanners()
+        reach[0] = 0
+        for rule_name, token_start, token_end in self._scan(text, start, scanners, skips):
+            yield rule_name, token_start, token_end, reach[0]
+            reach[0] = 0
+
+    @cached_property
+    def _lookahead_local(self) -> threading.local:
+        return threading.local()
+
+    def _lookahead_scanners(self) -> Tuple[
+            MutableSequence[int], Sequence[_Scanner], Sequence[Tuple[Container[str], _Matcher]]]:
+        '''the reach cell, scanners and skips of matchers that record how far they look
+
+        These are compiled once per thread, since the matchers share the cell.
+        '''
+        local = self._lookahead_local
+        if not hasattr(local, 'scanners'):
+            reach = [0]
+            matchers = _Compiler(self.rules, binary=False, reach=reach).compile_lexer_rules(
+                self.lexer_rules())
+            local.scanners = (
+                reach,
+                _scanners(self.rules, matchers, binary=False, reach=reach),
+                _skips(self.rules, matchers, binary=False),
+            )
+        return local.scanners
+
+    def iter_tokens(self, input_str: str) -> Iterator[Token]:
+        '''yield the tokens of input_str as they're lexed
 
-    def apply(self, input_str: str) -> TokenStream:
-        '''split an input str into a tokens'''
-        return self._convert_result(
-            self.apply_root_to_state_value(
-                self._convert_input(input_str)))
+        This runs the compiled matchers, so tokens are produced one at a time
+        without building Char or Result objects. If they fail, or the rules
+        can't be compiled, the input is lexed again with the rules themselves,
+        as apply does, and the tokens not yet yielded are yielded from that.
+        '''
+        position = Position(0, 0)
+        offset = 0
+        count = 0
+        try:
+            for rule_name, start, end in self._scan(input_str):
+                position = _advance_str(position, input_str, offset, start)
+                offset = start
+                yield Token(rule_name, input_str[start:end], position)
+                count += 1
+        except Error:
+            yield from self._apply_rules(input_str).items[count:]
+
+    def apply_buffer(self, input_str: str) -> TokenStream:
+        '''split an input str into tokens held in a TokenBuffer
+
+        This runs the compiled matchers like iter_tokens, falling back to the
+        rules themselves in the same way, and the stream's items are the
+        TokenBuffer, which is far smaller than a list of Tokens.
+        '''
+        buffer = TokenBuffer(input_str)
+        try:
+            for rule_name, start, end in self._scan(input_str):
+                buffer.append(rule_name, start, end)
+        except Error:
+            buffer = TokenBuffer(input_str)
+            for rule_name, start, end, _ in self._scan_rules(input_str):
+                buffer.append(rule_name, start, end)
+        return TokenStream(buffer)
+
+    def apply_parallel(
+        self,
+        input_str: str,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> TokenStream:
+        '''split an input str into tokens, lexing chunks of it in a process pool
+
+        Each worker lexes from the start of its chunk as if a token started
+        there, over the whole text, until a token starts in the next chunk. Since
+        lexing from an offset only depends on the text after it, the tokens are
+        stitched together by lexing from where the previous chunk's tokens end
+        until a token boundary lines up with one the worker found, and taking
+        the worker's tokens from there. The result is the same as apply's.
+        '''
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if chunk_size is None:
+            chunk_size = max(_PARALLEL_CHUNK_SIZE, -(-len(input_str) // workers))
+        bounds = list(range(0, len(input_str), chunk_size)) + [len(input_str)]
+        if workers < 2 or len(bounds) < 3:
+            return self.apply(input_str)
+        try:
+            with futures.ProcessPoolExecutor(
+                    workers, initializer=_init_lex_worker, initargs=(self, input_str)) as pool:
+                chunks = list(pool.map(_lex_chunk, bounds[:-1], bounds[1:]))
+            return TokenStream(list(self._stitch(input_str, chunks)))
+        except Error:
+            return self.apply(input_str)
+
+    def _stitch(  # pylint: disable=too-many-locals
+        self,
+        input_str: str,
+        chunks: Sequence['_Chunk'],
+    ) -> Iterator[Token]:
+        '''the tokens of input_str from speculatively lexed chunks'''
+        position = Position(0, 0)
+        offset = 0
+        # where the tokens found so far end
+        frontier = 0
+
+        def token(rule_name: str, start: int, end: int) -> Token:
+            nonlocal position, offset, frontier
+            position = _advance_str(position, input_str, offset, start)
+            offset = start
+            frontier = end
+            return Token(rule_name, input_str[start:end], position)
+
+        for chunk in chunks:
+            index = chunk.sync(frontier)
+            while index is None and frontier < chunk.stop:
+                for rule_name, start, end in self._scan(input_str, frontier):
+                    yield token(rule_name, start, end)
+                    break
+                else:
+                    return
+                index = chunk.sync(frontier)
+            if index is not None:
+                for index in range(index, len(chunk.starts)):
+                    yield token(chunk.rule_names[chunk.types[index]],
+                                chunk.starts[index], chunk.ends[index])
+        yield from (token(*span) for span in self._scan(input_str, frontier))
+
+    def relex(  # pylint: disable=too-many-locals
+        self,
+        input_str: str,
+        tokens: TokenStream,
+        edit: Edit,
+    ) -> TokenStream:
+        '''lex input_str after edit, given the tokens of input_str before the edit
+
+        Lexing restarts after the last token whose lexing, along with that of all
+        the tokens before it, examined nothing the edit touches, and stops as soon
+        as a token boundary lines up with an old token after the edit. Since
+        lexing from an offset only depends on the text after it, the remaining old
+        tokens are reused with their positions shifted.
+
+        How far lexing looked is kept in the returned stream's lookahead. If tokens
+        don't have it, it's found by lexing input_str again.
+        '''
+        new_input_str = edit.apply(input_str)
+        items = tokens.items
+        lookahead = tokens.lookahead
+        if lookahead is None or len(lookahead) != len(items):
+            lookahead = self._apply_lookahead(input_str).lookahead
+            if lookahead is None or len(lookahead) != len(items):
+                raise Error(msg='tokens are not the tokens of input_str')
+        edit_position = Position.at(input_str, edit.offset)
+        old_end = edit_position + \
+            input_str[edit.offset:edit.offset+edit.deleted]
+        new_end = edit_position + edit.inserted
+        delta = len(edit.inserted) - edit.deleted
+
+        def shift(position: Position) -> Position:
+            if position.line == old_end.line:
+                return Position(new_end.line, position.column - old_end.column + new_end.column)
+            return Position(position.line - old_end.line + new_end.line, position.column)
+
+        restart_index = bisect.bisect_right(lookahead, edit.offset)
+        if restart_index > 0:
+            token = items[restart_index - 1]
+            start = _line_start(input_str, token.position.line, edit.offset,
+                                edit_position.line) + token.position.column
+            offset = start + len(token.value)
+            position = _advance_str(token.position, input_str, start, offset)
+        else:
+            position = Position(0, 0)
+            offset = 0
+        suffix_index = bisect.bisect_left(
+            items, old_end, key=_token_position)
+
+        new_tokens: MutableSequence[Token] = list(items[:restart_index])
+        new_lookahead = array('q', lookahead[:restart_index])
+        furthest = new_lookahead[-1] if new_lookahead else 0
+        for rule_name, start, end, reach in self._scan_lookahead(new_input_str, offset):
+            position = _advance_str(position, new_input_str, offset, start)
+            offset = start
+            furthest = max(furthest, reach)
+            while suffix_index < len(items) and shift(items[suffix_index].position) < position:
+                suffix_index += 1
+            if suffix_index < len(items) and shift(items[suffix_index].position) == position:
+                break
+            new_tokens.append(
+                Token(rule_name, new_input_str[start:end], position))
+            new_lookahead.append(furthest)
+        else:
+            return TokenStream(new_tokens, new_lookahead)
+        for token, reach in zip(items[suffix_index:], lookahead[suffix_index:]):
+            shifted = shift(token.position)
+            if shifted == token.position:
+                new_tokens.append(token)
+            else:
+                new_tokens.append(Token(token.rule_name, token.value, shifted))
+            # the old lookahead bounds how far the token itself looked, which is
+            # past the edit and so shifts with the text
+            furthest = max(furthest, reach + delta)
+            new_lookahead.append(furthest)
+        return TokenStream(new_tokens, new_lookahead)
+
+    def apply_bytes(self, data: bytes | bytearray | memoryview) -> TokenStream:
+        '''split a utf-8 encoded buffer into tokens
+
+        Rules run directly over the buffer: ascii chars are tested as bytes and
+        multi-byte sequences are only decoded when a rule needs the code point.
+        Only the text of emitted tokens is ever decoded. If the compiled matchers
+        fail, or the rules can't be compiled, the decoded buffer is lexed again
+        with the rules themselves, as apply does.
+        '''
+        if isinstance(data, memoryview) and data.format != 'B':
+            data = data.cast('B')
+        try:
+            return self._apply_bytes(data)
+        except Error as error:
+            try:
+                input_str = str(data, 'utf-8')
+            except UnicodeDecodeError:
+                raise error  # pylint: disable=raise-missing-from
+            return self._apply_rules(input_str)
+
+    def _apply_bytes(self, data: bytes | bytearray | memoryview) -> TokenStream:
+        tokens: MutableSequence[Token] = []
+        position = Position(0, 0)
+        pos = 0
+        for rule_name, start, end in self._scan(data):
+            position = _advance_bytes(position, data, pos, start)
+            pos = start
+            try:
+                value = str(data[start:end], 'utf-8')
+            except UnicodeDecodeError as error:
+                raise Error(
+                    msg=f'invalid utf-8 in token {rule_name} at {position}') from error
+            tokens.append(Token(rule_name, value, position))
+        return TokenStream(tokens)
 
 
 @dataclass(frozen=True)
@@ -186,13 +800,25 @@ class Class(Rule):
     def __post_init__(self):
         if not all(len(c) == 1 for c in self.values):
             raise Error(msg=f'invalid class values {repr(self.values)}')
+        if not isinstance(self.values, str):
+            object.__setattr__(self, 'values', tuple(self.values))
+
+    @cached_property
+    def _members(self) -> frozenset[str]:
+        return frozenset(self.values)
 
     def apply(self, state: State) -> ResultAndState:
         if state.value.empty:
             raise RuleError(rule=self, state=state, msg='empty state')
-        if state.value.head.value not in self.values:
+        if state.value.head.value not in self._members:
             raise RuleError(rule=self, state=state, msg='class not found')
-        return ResultAndState(Result(value=state.value.head), state.with_value(state.value.tail))
+        return processor.ResultAndState(
+            processor.Result(value=state.value.head), state.with_value(state.value.tail))
+
+    def match(self, state: State) -> Optional[State]:
+        if state.value.empty or state.value.head.value not in self._members:
+            return None
+        return state.with_value(state.value.tail)
 
     @staticmethod
     def whitespace() -> 'Class':
@@ -201,6 +827,7 @@ class Class(Rule):
 
 
 UntilEmpty = stream.UntilEmpty[Char, CharStream]
+Any = stream.Any[Char, CharStream]
 
 
 @dataclass(frozen=True)
@@ -221,7 +848,13 @@ class Literal(Rule):
             raise RuleError(rule=self, state=state, msg='empty stream')
         if state.value.head.value != self.value:
             raise RuleError(rule=self, state=state)
-        return ResultAndState(Result(value=state.value.head), state.with_value(state.value.tail))
+        return processor.ResultAndState(
+            processor.Result(value=state.value.head), state.with_value(state.value.tail))
+
+    def match(self, state: State) -> Optional[State]:
+        if state.value.empty or state.value.head.value != self.value:
+            return None
+        return state.with_value(state.value.tail)
 
 
 @dataclass(frozen=True)
@@ -235,8 +868,8 @@ class Not(UnaryRule):
         try:
             self.child.apply(state)
         except processor.Error:
-            return ResultAndState(
-                Result(value=state.value.head),
+            return processor.ResultAndState(
+                processor.Result(value=state.value.head),
                 state.with_value(state.value.tail)
             )
         else:
@@ -246,18 +879,10 @@ class Not(UnaryRule):
                 msg=f'Not {self} successfully applied child {self.child}',
             )
 
-
-@dataclass(frozen=True)
-class Any(Rule):
-    '''lex rule matching anything'''
-
-    def __str__(self) -> str:
-        return '.'
-
-    def apply(self, state: State) -> ResultAndState:
-        if state.value.empty:
-            raise RuleError(rule=self, state=state, msg='empty stream')
-        return ResultAndState(Result(value=state.value.head), state.with_value(state.value.tail))
+    def match(self, state: State) -> Optional[State]:
+        if state.value.empty or self.child.match(state) is not None:
+            return None
+        return state.with_value(state.value.tail)
 
 
 @dataclass(frozen=True)
@@ -283,4 +908,520 @@ class Range(Rule):
             raise RuleError(rule=self, state=state, msg='empty stream')
         if state.value.head.value < self.min or state.value.head.value > self.max:
             raise RuleError(rule=self, state=state)
-        return ResultAndState(Result(value=state.value.head), state.with_value(state.value.tail))
+        return processor.ResultAndState(
+            processor.Result(value=state.value.head), state.with_value(state.value.tail))
+
+    def match(self, state: State) -> Optional[State]:
+        if state.value.empty or not self.min <= state.value.head.value <= self.max:
+            return None
+        return state.with_value(state.value.tail)
+
+
+_PARALLEL_CHUNK_SIZE = 1 << 20
+'''the smallest chunk apply_parallel gives a worker by default'''
+
+
+@dataclass(frozen=True)
+class _Chunk:
+    '''the tokens a worker found from the start of a chunk up to the next one'''
+
+    start: int
+    stop: int
+    rule_names: Sequence[str]
+    types: Sequence[int]
+    starts: Sequence[int]
+    ends: Sequence[int]
+
+    def sync(self, frontier: int) -> Optional[int]:
+        '''the index of the first of these tokens after frontier, if lexing from
+        frontier passes through a position the worker lexed from'''
+        if frontier == self.start:
+            return 0
+        index = bisect.bisect_left(self.ends, frontier)
+        if index < len(self.ends) and self.ends[index] == frontier:
+            return index + 1
+        index = bisect.bisect_left(self.starts, frontier)
+        if index < len(self.starts) and self.starts[index] == frontier:
+            return index
+        return None
+
+
+_LEX_WORKER: MutableMapping[str, Tuple[Lexer, str]] = {}
+'''the lexer and input of a worker process'''
+
+
+def _init_lex_worker(lexer: Lexer, input_str: str) -> None:
+    _LEX_WORKER['input'] = (lexer, input_str)
+
+
+def _lex_chunk(start: int, stop: int) -> _Chunk:
+    '''lex from start until a token starts at or after stop, or lexing fails'''
+    lexer, input_str = _LEX_WORKER['input']
+    rule_names: MutableSequence[str] = []
+    type_ids: MutableMapping[str, int] = {}
+    chunk = _Chunk(start, stop, rule_names, array('I'), array('q'), array('q'))
+    try:
+        for rule_name, token_start, token_end in lexer._scan(  # pylint: disable=protected-access
+                input_str, start):
+            if token_start >= stop:
+                break
+            if rule_name not in type_ids:
+                type_ids[rule_name] = len(rule_names)
+                rule_names.append(rule_name)
+            chunk.types.append(type_ids[rule_name])  # type: ignore
+            chunk.starts.append(token_start)  # type: ignore
+            chunk.ends.append(token_end)  # type: ignore
+    except Error:
+        pass
+    return chunk
+
+
+def _token_position(token: Token) -> Position:
+    return token.position
+
+
+def _line_start(input_str: str, line: int, anchor: int, anchor_line: int) -> int:
+    '''offset of the start of line, found by walking back from a known offset'''
+    start = input_str.rfind('\n', 0, anchor) + 1
+    for _ in range(anchor_line - line):
+        start = input_str.rfind('\n', 0, start - 1) + 1
+    return start
+
+
+def _advance_str(position: Position, text: str, start: int, end: int) -> Position:
+    '''advance position over text[start:end]'''
+    lines = text.count('\n', start, end)
+    if not lines:
+        return Position(position.line, position.column + end - start)
+    return Position(position.line + lines, end - text.rfind('\n', start, end) - 1)
+
+
+_MAX_FIRST_CHARS = 1024
+
+
+def _first_chars(  # pylint: disable=too-many-return-statements
+    rules: Mapping[str, Rule],
+    rule: Rule,
+    refs: FrozenSet[str] = frozenset(),
+) -> Optional[FrozenSet[str]]:
+    '''the chars a match of rule can start with, or None if rule can match nothing
+    or they aren't known'''
+    if isinstance(rule, Literal):
+        return frozenset(rule.value)
+    if isinstance(rule, Class):
+        return frozenset(rule.values)
+    if isinstance(rule, Range):
+        if ord(rule.max) - ord(rule.min) >= _MAX_FIRST_CHARS:
+            return None
+        return frozenset(map(chr, range(ord(rule.min), ord(rule.max) + 1)))
+    if isinstance(rule, processor.Ref):
+        if rule.value in refs or rule.value not in rules:
+            return None
+        return _first_chars(rules, rules[rule.value], refs | {rule.value})
+    if isinstance(rule, processor.And):
+        return _first_chars(rules, rule.children[0], refs) if rule.children else None
+    if isinstance(rule, processor.Or):
+        chars: FrozenSet[str] = frozenset()
+        for child in rule.children:
+            child_chars = _first_chars(rules, child, refs)
+            if child_chars is None:
+                return None
+            chars |= child_chars
+        return chars
+    if isinstance(rule, processor.OneOrMore):
+        return _first_chars(rules, rule.child, refs)
+    return None
+
+
+def _skips(
+    rules: Mapping[str, Rule],
+    matchers: Sequence[Tuple[str, _Matcher]],
+    binary: bool,
+) -> Sequence[Tuple[Container, _Matcher]]:
+    '''the matchers of excluded rules with the chars where an earlier rule could match
+
+    Excluded rules after a rule whose first chars aren't known are left out.
+    '''
+    skips: MutableSequence[Tuple[Container, _Matcher]] = []
+    blocked: FrozenSet[str] = frozenset()
+    for rule_name, matcher in matchers:
+        if rule_name.startswith(EXCLUDE_NAME_PREFIX):
+            if binary:
+                # non-ascii bytes are left to the matchers
+                skips.append((frozenset(map(ord, blocked)) | frozenset(range(0x80, 0x100)),
+                              matcher))
+            else:
+                skips.append((blocked, matcher))
+        chars = _first_chars(rules, rules[rule_name])
+        if chars is None:
+            break
+        blocked |= chars
+    return skips
+
+
+def _literal_value(rule: Rule) -> Optional[str]:
+    '''the text rule matches if it only matches one text'''
+    if isinstance(rule, Literal):
+        return rule.value
+    if (isinstance(rule, processor.And) and rule.children
+            and all(isinstance(child, Literal) for child in rule.children)):
+        return ''.join(child.value for child in rule.children)  # type: ignore
+    return None
+
+
+def _trie(literals: Mapping[Text, str], reach: Optional[MutableSequence[int]] = None
+          ) -> _LiteralMatcher:
+    '''a matcher for the first of literals that text starts with at an offset,
+    also returning the rule name that literal maps to
+
+    Literals are chars or utf-8 bytes, to match str or bytes text. reach is
+    raised as by _Compiler matchers.
+    '''
+    root: dict = {}
+    for index, (literal, rule_name) in enumerate(literals.items()):
+        node = root
+        for unit in literal:
+            node = node.setdefault(unit, {})
+        # None marks the index and rule name of the literal ending at a node
+        node.setdefault(None, (index, rule_name))
+
+    def match(text: Text, pos: int) -> Tuple[int, str]:
+        node = root
+        first = len(literals)
+        token_end = _NO_MATCH
+        rule_name = ''
+        end = len(text)
+        while pos < end:
+            node = node.get(text[pos])
+            if node is None:
+                break
+            pos += 1
+            entry = node.get(None)
+            if entry is not None and entry[0] < first:
+                first, rule_name = entry
+                token_end = pos
+        if reach is not None and pos >= reach[0]:
+            reach[0] = pos + 1
+        return token_end, rule_name
+    return match
+
+
+def _scanners(
+    rules: Mapping[str, Rule],
+    matchers: Sequence[Tuple[str, _Matcher]],
+    binary: bool,
+    reach: Optional[MutableSequence[int]] = None,
+) -> Sequence[_Scanner]:
+    '''matchers with each run of literal rules merged into a trie matcher
+
+    Keyword and operator rules come first in loaded grammars, so this tries
+    all of them with one walk down the trie rather than one match per rule.
+    '''
+    scanners: MutableSequence[_Scanner] = []
+    run: MutableSequence[Tuple[str, str, _Matcher]] = []
+
+    def end_run() -> None:
+        if len(run) > 1:
+            names: MutableMapping[Text, str] = {}
+            for rule_name, literal, _ in run:
+                names.setdefault(literal.encode() if binary else literal, rule_name)
+            trie = _trie(names, reach)
+            scanners.append((run[0][0], lambda text, pos: trie(text, pos)[0], trie))
+        else:
+            scanners.extend((rule_name, matcher, None) for rule_name, _, matcher in run)
+        run.clear()
+
+    for rule_name, matcher in matchers:
+        literal = _literal_value(rules[rule_name])
+        if literal is None:
+            end_run()
+            scanners.append((rule_name, matcher, None))
+        else:
+            run.append((rule_name, literal, matcher))
+    end_run()
+    return scanners
+
+
+def _char_class(rule: Rule) -> Optional[Tuple[bool, str]]:  # pylint: disable=too-many-return-statements
+    '''whether rule matches one char not in a set or one in it, and the set as the
+    body of a regex char class, if it's that kind of rule'''
+    if isinstance(rule, Literal):
+        return False, re.escape(rule.value)
+    if isinstance(rule, Class):
+        if not rule.values:
+            return None
+        return False, ''.join(map(re.escape, rule.values))
+    if isinstance(rule, Range):
+        return False, f'{re.escape(rule.min)}-{re.escape(rule.max)}'
+    if isinstance(rule, processor.Or):
+        bodies: MutableSequence[str] = []
+        for child in rule.children:
+            char_class = _char_class(child)
+            if char_class is None or char_class[0]:
+                return None
+            bodies.append(char_class[1])
+        return (False, ''.join(bodies)) if bodies else None
+    if isinstance(rule, Not):
+        char_class = _char_class(rule.child)
+        if char_class is None or char_class[0]:
+            return None
+        return True, char_class[1]
+    return None
+
+
+def _utf8_width(lead: int) -> int:
+    if lead < 0xc0:
+        return 1
+    if lead < 0xe0:
+        return 2
+    if lead < 0xf0:
+        return 3
+    return 4
+
+
+def _advance_bytes(position: Position, data: Text, start: int, end: int) -> Position:
+    '''advance position over a utf-8 span, counting columns in code points'''
+    line = position.line
+    column = position.column
+    for pos in range(start, end):
+        byte = data[pos]
+        if byte == 0x0a:
+            line += 1
+            column = 0
+        elif byte & 0xc0 != 0x80:
+            column += 1
+    return Position(line, column)
+
+
+class _Compiler:
+    '''compiles lex rules into offset matchers over str or utf-8 buffers
+
+    A matcher takes the input and an offset and returns the offset after the match,
+    or _NO_MATCH. In binary mode ascii values are compared as bytes and anything else
+    is decoded one code point at a time. If reach is given, matchers also raise
+    reach[0] to the offset past the furthest one they examined, counting a check
+    for the end of the input as examining len(text).
+    '''
+
+    def __init__(
+        self,
+        rules: Mapping[str, Rule],
+        binary: bool,
+        reach: Optional[MutableSequence[int]] = None,
+    ):
+        self._rules = rules
+        self._binary = binary
+        self._reach = reach
+        self._ref_matchers: MutableMapping[str, _Matcher] = {}
+        # keyed by identity, which interned rules share, to avoid hashing rule trees
+        self._matchers: MutableMapping[int, Tuple[Rule, _Matcher]] = {}
+
+    def compile_lexer_rules(self, rules: Mapping[str, Rule]) -> Sequence[Tuple[str, _Matcher]]:
+        '''compile rules in order, keeping their names'''
+        return [(name, self.compile_rule_name(name)) for name in rules]
+
+    def compile_rule_name(self, rule_name: str) -> _Matcher:
+        '''compile the rule with the given name, allowing recursive refs'''
+        if rule_name not in self._ref_matchers:
+            if rule_name not in self._rules:
+                raise Error(msg=f'unknown rule {rule_name}')
+            matchers: MutableSequence[_Matcher] = []
+
+            def deferred(text: Text, pos: int) -> int:
+                return matchers[0](text, pos)
+            self._ref_matchers[rule_name] = deferred
+            matchers.append(self.compile(self._rules[rule_name]))
+            self._ref_matchers[rule_name] = matchers[0]
+        return self._ref_matchers[rule_name]
+
+    def compile(self, rule: Rule) -> _Matcher:
+        '''compile one rule, sharing matchers between uses of the same rule'''
+        entry = self._matchers.get(id(rule))
+        if entry is None:
+            # the rule is kept so its id isn't reused
+            entry = self._matchers[id(rule)] = (rule, self._compile(rule))
+        return entry[1]
+
+    def _compile(self, rule: Rule) -> _Matcher:  # pylint: disable=too-many-return-statements,too-many-branches
+        if isinstance(rule, Literal):
+            return self._char(lambda char: char == rule.value)
+        if isinstance(rule, Class):
+            return self._char(rule._members.__contains__)  # pylint: disable=protected-access
+        if isinstance(rule, Range):
+            return self._char(lambda char: rule.min <= char <= rule.max)
+        if isinstance(rule, stream.Any):
+            return self._char(lambda _: True)
+        if isinstance(rule, Not):
+            return self._not(self.compile(rule.child))
+        if isinstance(rule, processor.Ref):
+            return self.compile_rule_name(rule.value)
+        if isinstance(rule, processor.And):
+            if rule.children and all(isinstance(child, Literal) for child in rule.children):
+                return self._literal(''.join(child.value for child in rule.children))
+            return self._and([self.compile(child) for child in rule.children])
+        if isinstance(rule, processor.Or):
+            return self._or([self.compile(child) for child in rule.children])
+        if isinstance(rule, (processor.ZeroOrMore, processor.OneOrMore)):
+            run = self._run(rule.child, isinstance(rule, processor.OneOrMore))
+            if run is not None:
+                return run
+        if isinstance(rule, processor.ZeroOrMore):
+            return self._zero_or_more(self.compile(rule.child))
+        if isinstance(rule, processor.OneOrMore):
+            return self._one_or_more(self.compile(rule.child))
+        if isinstance(rule, processor.ZeroOrOne):
+            return self._zero_or_one(self.compile(rule.child))
+        if isinstance(rule, stream.UntilEmpty):
+            # a match ends by finding the end of the input
+            return self._tracked(self._until_empty(self.compile(rule.child)), 0, 1)
+        raise Error(msg=f'unable to compile lex rule {rule}')
+
+    def _run(self, child: Rule, one_or_more: bool) -> Optional[_Matcher]:
+        '''a matcher for a whole run of child, if child matches one char from a set
+
+        The run is matched by a regex char class, so it's consumed in one step
+        rather than a char at a time. Nothing follows the class in the pattern,
+        so greedy regex repetition matches the same run as repetition here.
+        '''
+        char_class = _char_class(child)
+        if char_class is None:
+            return None
+        negated, body = char_class
+        source = f'[{"^" if negated else ""}{body}]{"+" if one_or_more else "*"}'
+        if not self._binary:
+            pattern = re.compile(source)
+        elif not negated and body.isascii():
+            # a set of ascii chars matches the same run of utf-8 bytes
+            pattern = re.compile(source.encode())
+        else:
+            return None
+        match_pattern = pattern.match
+
+        def match(text: Text, pos: int) -> int:
+            match_ = match_pattern(text, pos)  # type: ignore
+            return _NO_MATCH if match_ is None else match_.end()
+        # the run stops at the first char not in the set
+        return self._tracked(match, 1, 1)
+
+    def _tracked(self, matcher: _Matcher, start_reach: int, end_reach: int) -> _Matcher:
+        '''matcher, recording that it examines start_reach chars from where it starts
+        and end_reach chars from where its match ends'''
+        reach = self._reach
+        if reach is None:
+            return matcher
+
+        def match(text: Text, pos: int) -> int:
+            end = matcher(text, pos)
+            examined = max(pos + start_reach, end + end_reach)
+            if examined > reach[0]:
+                reach[0] = examined
+            return end
+        return match
+
+    def _char(self, cond: Callable[[str], bool]) -> _Matcher:
+        if not self._binary:
+            def match_str(text: Text, pos: int) -> int:
+                if pos < len(text) and cond(text[pos]):  # type: ignore
+                    return pos + 1
+                return _NO_MATCH
+            return self._tracked(match_str, 1, 0)
+
+        ascii_table = [cond(chr(byte)) for byte in range(0x80)]
+
+        def match_bytes(data: Text, pos: int) -> int:
+            if pos >= len(data):
+                return _NO_MATCH
+            byte: int = data[pos]  # type: ignore
+            if byte < 0x80:
+                return pos + 1 if ascii_table[byte] else _NO_MATCH
+            width = _utf8_width(byte)
+            try:
+                char = str(data[pos:pos+width], 'utf-8')  # type: ignore
+            except UnicodeDecodeError:
+                return _NO_MATCH
+            return pos + width if cond(char) else _NO_MATCH
+        return self._tracked(match_bytes, 1, 0)
+
+    def _literal(self, value: str) -> _Matcher:
+        if not self._binary:
+            def match_str(text: Text, pos: int) -> int:
+                if text.startswith(value, pos):  # type: ignore
+                    return pos + len(value)
+                return _NO_MATCH
+            return self._tracked(match_str, len(value), 0)
+
+        encoded = value.encode()
+
+        def match_bytes(data: Text, pos: int) -> int:
+            if data[pos:pos+len(encoded)] == encoded:
+                return pos + len(encoded)
+            return _NO_MATCH
+        return self._tracked(match_bytes, len(encoded), 0)
+
+    def _not(self, child: _Matcher) -> _Matcher:
+        any_char = self._char(lambda _: True)
+
+        def match(text: Text, pos: int) -> int:
+            if child(text, pos) != _NO_MATCH:
+                return _NO_MATCH
+            return any_char(text, pos)
+        return match
+
+    @staticmethod
+    def _and(children: Sequence[_Matcher]) -> _Matcher:
+        def match(text: Text, pos: int) -> int:
+            for child in children:
+                pos = child(text, pos)
+                if pos == _NO_MATCH:
+                    return _NO_MATCH
+            return pos
+        return match
+
+    @staticmethod
+    def _or(children: Sequence[_Matcher]) -> _Matcher:
+        def match(text: Text, pos: int) -> int:
+            for child in children:
+                end = child(text, pos)
+                if end != _NO_MATCH:
+                    return end
+            return _NO_MATCH
+        return match
+
+    @staticmethod
+    def _zero_or_more(child: _Matcher) -> _Matcher:
+        def match(text: Text, pos: int) -> int:
+            while True:
+                end = child(text, pos)
+                if end <= pos:
+                    return pos
+                pos = end
+        return match
+
+    @staticmethod
+    def _one_or_more(child: _Matcher) -> _Matcher:
+        zero_or_more = _Compiler._zero_or_more(child)
+
+        def match(text: Text, pos: int) -> int:
+            pos = child(text, pos)
+            if pos == _NO_MATCH:
+                return _NO_MATCH
+            return zero_or_more(text, pos)
+        return match
+
+    @staticmethod
+    def _zero_or_one(child: _Matcher) -> _Matcher:
+        def match(text: Text, pos: int) -> int:
+            end = child(text, pos)
+            return pos if end == _NO_MATCH else end
+        return match
+
+    @staticmethod
+    def _until_empty(child: _Matcher) -> _Matcher:
+        def match(text: Text, pos: int) -> int:
+            while pos < len(text):
+                end = child(text, pos)
+                if end <= pos:
+                    return _NO_MATCH
+                pos = end
+            return pos
+        return match
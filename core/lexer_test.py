@@ -1,11 +1,13 @@
 '''tests for lexer module'''
 
 from collections import OrderedDict
+from dataclasses import dataclass
 import string
-from typing import Tuple
+from typing import Callable, Tuple
 import unittest
+from unittest import mock
 
-from core import lexer, processor_test
+from core import lexer, processor, processor_test
 
 
 class CharTest(unittest.TestCase):
@@ -193,3 +195,453 @@ class LexerTest(processor_test.ProcessorTestCase[lexer.Char, lexer.CharStream]):
             with self.subTest(min=min_value, max=max_value):
                 with self.assertRaises(lexer.Error):
                     lexer.Range(min_value, max_value)
+
+    def test_apply_bytes(self):
+        '''test that the bytes mode matches the str mode'''
+        for input_str in list[str]([
+            'a',
+            'bb',
+            'abba',
+            'cC',
+            'dDDD',
+            'eE',
+            'fff',
+            'aga',
+            '123',
+            'hz',
+            'iz',
+            'jkl',
+        ]):
+            with self.subTest(input_str=input_str):
+                data = input_str.encode()
+                expected = self.processor.apply(input_str)
+                self.assertEqual(expected, self.processor.apply_bytes(data))
+                self.assertEqual(
+                    expected, self.processor.apply_bytes(memoryview(data)))
+
+    def test_apply_bytes_fail(self):
+        '''test failing bytes mode cases'''
+        for input_str in list[str]([
+            'z',
+            'hh',
+            'i',
+        ]):
+            with self.subTest(input_str=input_str):
+                with self.assertRaises(lexer.Error):
+                    self.processor.apply_bytes(input_str.encode())
+
+
+class BytesLexerTest(unittest.TestCase):
+    '''tests for lexer.Lexer.apply_bytes with non-ascii input'''
+
+    @property
+    def lexer(self) -> lexer.Lexer:
+        '''a lexer that mixes ascii and non-ascii rules'''
+        return lexer.Lexer(OrderedDict({
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'arrow': lexer.Literal('→'),
+            'greek': lexer.OneOrMore(lexer.Range('α', 'ω')),
+            'str': lexer.And([
+                lexer.Literal('"'),
+                lexer.ZeroOrMore(lexer.Not(lexer.Literal('"'))),
+                lexer.Literal('"'),
+            ]),
+            'any': lexer.Any(),
+        }))
+
+    def test_apply_bytes(self):
+        '''test that utf-8 input lexes the same as decoded input'''
+        for input_str in list[str]([
+            'αβγ → δ',
+            '"日本語" α',
+            'x\n  "é"→z',
+            '🙂α',
+        ]):
+            with self.subTest(input_str=input_str):
+                self.assertEqual(
+                    self.lexer.apply(input_str),
+                    self.lexer.apply_bytes(input_str.encode()),
+                )
+
+    def test_apply_bytes_invalid_utf8(self):
+        '''test that invalid utf-8 in a token fails'''
+        with self.assertRaises(lexer.Error):
+            self.lexer.apply_bytes(b'"\xff"')
+
+
+class RelexTest(unittest.TestCase):
+    '''tests for lexer.Lexer.relex'''
+
+    @property
+    def lexer(self) -> lexer.Lexer:
+        '''a lexer with multi-char and multi-line tokens'''
+        return lexer.Lexer(OrderedDict({
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            'int': lexer.OneOrMore(lexer.Class(string.digits)),
+            '=': lexer.Literal('='),
+            'str': lexer.And([
+                lexer.Literal('"'),
+                lexer.ZeroOrMore(lexer.Not(lexer.Literal('"'))),
+                lexer.Literal('"'),
+            ]),
+        }))
+
+    def test_relex(self):
+        '''relex matches lexing the edited text from scratch'''
+        input_str = 'a = 1\nbc = "d\ne"\nf = 23 g\n\nh = i'
+        for edit in list[lexer.Edit]([
+            lexer.Edit(0, 0, 'x'),
+            lexer.Edit(0, 1, ''),
+            lexer.Edit(1, 0, 'b'),
+            lexer.Edit(4, 1, '45'),
+            lexer.Edit(5, 1, ' '),
+            lexer.Edit(5, 0, '\n\n'),
+            lexer.Edit(11, 0, '"q" '),
+            lexer.Edit(12, 3, ''),
+            lexer.Edit(17, 6, 'z'),
+            lexer.Edit(len(input_str), 0, ' j'),
+            lexer.Edit(len(input_str) - 1, 1, ''),
+            lexer.Edit(0, len(input_str), 'k'),
+        ]):
+            with self.subTest(edit=edit):
+                self.assertEqual(
+                    self.lexer.apply(edit.apply(input_str)),
+                    self.lexer.relex(
+                        input_str, self.lexer.apply(input_str), edit),
+                )
+
+    def test_relex_reuses_tokens(self):
+        '''tokens on lines after the edit are reused when line count is unchanged'''
+        input_str = 'a = 1\nb = 2'
+        tokens = self.lexer.apply(input_str)
+        new_tokens = self.lexer.relex(input_str, tokens, lexer.Edit(4, 1, '3'))
+        self.assertIs(tokens.items[-1], new_tokens.items[-1])
+
+    def test_relex_lookahead(self):
+        '''tokens whose lexing looked ahead past the edit are lexed again'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            **self.lexer.rules,
+            '"': lexer.Literal('"'),
+        }))
+        input_str = '" a b c d e'
+        tokens = lexer_.apply(input_str)
+        self.assertEqual(len(tokens), 6)
+        for edit in list[lexer.Edit]([
+            lexer.Edit(len(input_str), 0, '"'),
+            lexer.Edit(5, 0, '"'),
+        ]):
+            with self.subTest(edit=edit):
+                self.assertEqual(
+                    lexer_.relex(input_str, tokens, edit),
+                    lexer_.apply(edit.apply(input_str)),
+                )
+
+    def test_relex_chained(self):
+        '''relexing relexed tokens matches lexing from scratch'''
+        input_str = 'a = 1\nbc = "d\ne"\nf = 23 g'
+        tokens = self.lexer.apply(input_str)
+        for edit in list[lexer.Edit]([
+            lexer.Edit(4, 1, '"x"'),
+            lexer.Edit(0, 0, 'z '),
+            lexer.Edit(9, 0, ' "y"'),
+            lexer.Edit(7, 4, 'w'),
+            lexer.Edit(3, 2, ''),
+        ]):
+            with self.subTest(edit=edit):
+                tokens = self.lexer.relex(input_str, tokens, edit)
+                input_str = edit.apply(input_str)
+                self.assertIsNotNone(tokens.lookahead)
+                self.assertEqual(tokens, self.lexer.apply(input_str))
+
+    def test_apply_lookahead(self):
+        '''tokens lexed with lookahead are relexed without lexing the text again'''
+        input_str = 'a = 1\nbc = "d\ne"\nf = 23 g'
+        tokens = self.lexer.apply(input_str, lookahead=True)
+        self.assertEqual(tokens, self.lexer.apply(input_str))
+        self.assertEqual(len(tokens.lookahead), len(tokens))
+        edit = lexer.Edit(len(input_str) - 1, 1, 'h')
+        with mock.patch.object(lexer.Lexer, '_apply_lookahead') as apply_lookahead:
+            new_tokens = self.lexer.relex(input_str, tokens, edit)
+            apply_lookahead.assert_not_called()
+        self.assertEqual(new_tokens, self.lexer.apply(edit.apply(input_str)))
+
+    def test_relex_fail(self):
+        '''relex fails on edits that make the text unlexable'''
+        input_str = 'a = 1'
+        with self.assertRaises(lexer.Error):
+            self.lexer.relex(input_str, self.lexer.apply(input_str),
+                             lexer.Edit(2, 1, '!'))
+        with self.assertRaises(lexer.Error):
+            self.lexer.relex(input_str, self.lexer.apply(input_str),
+                             lexer.Edit(4, 2, ''))
+
+
+class TokenBufferTest(unittest.TestCase):
+    '''tests for lexer.TokenBuffer'''
+
+    @property
+    def lexer(self) -> lexer.Lexer:
+        '''a lexer with excluded whitespace'''
+        return lexer.Lexer(OrderedDict({
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            'int': lexer.OneOrMore(lexer.Class(string.digits)),
+        }))
+
+    def test_apply_buffer(self):
+        '''apply_buffer has the same tokens as apply'''
+        for input_str in list[str](['', 'a', 'a 1\n bc\n\n23 d', ' \n\na']):
+            with self.subTest(input_str=input_str):
+                tokens = self.lexer.apply_buffer(input_str)
+                self.assertIsInstance(tokens.items, lexer.TokenBuffer)
+                self.assertEqual(tokens, self.lexer.apply(input_str))
+
+    def test_columns(self):
+        '''tokens are read from the columns and slices share them'''
+        buffer = self.lexer.apply_buffer('a 1\n bc').items
+        assert isinstance(buffer, lexer.TokenBuffer)
+        self.assertEqual(buffer.rule_name(-1), 'id')
+        self.assertEqual(buffer.value(1), '1')
+        self.assertEqual(buffer.offsets(2), (5, 7))
+        self.assertEqual(buffer.position(2), lexer.Position(1, 1))
+        self.assertEqual(buffer[1:], [buffer[1], buffer[2]])
+        self.assertEqual(buffer[1:][1:][0], buffer[2])
+        self.assertEqual(len(buffer[5:]), 0)
+        with self.assertRaises(IndexError):
+            buffer[1:2].value(1)
+        with self.assertRaises(lexer.Error):
+            buffer[1:].append('id', 0, 1)
+
+
+class ExcludedTest(unittest.TestCase):
+    '''tests for skipping excluded rules'''
+
+    def test_earlier_rules(self):
+        '''excluded rules only win where no earlier rule matches'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            'nl': lexer.Literal('\n'),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            '_c': lexer.And([lexer.Literal('#'), lexer.ZeroOrMore(lexer.Not(lexer.Literal('\n')))]),
+        }))
+        for input_str in list[str](['', ' ', 'a  b\n c', ' \t\n\n# x\na#', '\n  ']):
+            with self.subTest(input_str=input_str):
+                expected = lexer_._apply_rules(input_str)  # pylint: disable=protected-access
+                self.assertEqual(lexer_.apply(input_str), expected)
+                self.assertEqual(lexer_.apply_bytes(input_str.encode()), expected)
+
+    def test_no_chars(self):
+        '''lexing doesn't build chars'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+        }))
+        with mock.patch.object(lexer, 'Char', side_effect=AssertionError):
+            self.assertEqual(lexer_.apply(' a  b ').items, [
+                lexer.Token('id', 'a', lexer.Position(0, 1)),
+                lexer.Token('id', 'b', lexer.Position(0, 4)),
+            ])
+
+    def test_nullable_earlier_rule(self):
+        '''excluded text isn't skipped past an earlier rule that matches nothing'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            'a': lexer.ZeroOrMore(lexer.Literal('a')),
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+        }))
+        with self.assertRaises(lexer.Error):
+            list(lexer_.iter_tokens(' '))
+
+
+@dataclass(frozen=True)
+class _Digit(lexer.Rule):
+    '''a rule the compiled matchers don't support'''
+
+    def apply(self, state: lexer.State) -> lexer.ResultAndState:
+        if state.value.empty or not state.value.head.value.isdigit():
+            raise lexer.RuleError(rule=self, state=state, msg='not a digit')
+        return lexer.ResultAndState(lexer.Result(value=state.value.head),
+                                    state.with_value(state.value.tail))
+
+
+class ApplyRulesTest(unittest.TestCase):
+    '''tests for lexing with rules that can't be compiled'''
+
+    @property
+    def lexer(self) -> lexer.Lexer:
+        '''a lexer with a custom rule'''
+        return lexer.Lexer(OrderedDict({
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            'int': lexer.OneOrMore(_Digit()),
+        }))
+
+    def test_apply(self):
+        '''tokens are emitted from the rules' matches'''
+        self.assertEqual(self.lexer.apply('a 12\n b'), lexer.TokenStream([
+            lexer.Token('id', 'a', lexer.Position(0, 0)),
+            lexer.Token('int', '12', lexer.Position(0, 2)),
+            lexer.Token('id', 'b', lexer.Position(1, 1)),
+        ]))
+
+    def test_apply_fail(self):
+        '''failures are reported from the token rule'''
+        with self.assertRaises(lexer.Error):
+            self.lexer.apply('a !')
+
+    def test_entry_points(self):
+        '''every entry point falls back to the rules'''
+        input_str = 'a 12\n b'
+        expected = self.lexer.apply(input_str)
+        self.assertEqual(lexer.TokenStream(list(self.lexer.iter_tokens(input_str))), expected)
+        self.assertEqual(list(self.lexer.apply_buffer(input_str)), list(expected))
+        self.assertEqual(self.lexer.apply_bytes(input_str.encode()), expected)
+        with self.assertRaises(lexer.Error) as expected_error:
+            self.lexer.apply('a !')
+        for apply in list[Callable[[str], object]]([
+            lambda input_str: list(self.lexer.iter_tokens(input_str)),
+            self.lexer.apply_buffer,
+            lambda input_str: self.lexer.apply_bytes(input_str.encode()),
+        ]):
+            with self.assertRaises(lexer.Error) as error:
+                apply('a !')
+            self.assertEqual(error.exception, expected_error.exception)
+
+
+class LiteralTrieTest(unittest.TestCase):
+    '''tests for lexing runs of literal rules with one trie'''
+
+    def test_rule_order(self):
+        '''the first literal rule in order that matches wins'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            '=': lexer.Literal('='),
+            '==': lexer.And([lexer.Literal('='), lexer.Literal('=')]),
+            '=>': lexer.And([lexer.Literal('='), lexer.Literal('>')]),
+            'def': lexer.And([lexer.Literal('d'), lexer.Literal('e'), lexer.Literal('f')]),
+            'define': lexer.And([lexer.Literal(char) for char in 'define']),
+            'd': lexer.And([lexer.Literal('d'), lexer.Literal('e'), lexer.Literal('f')]),
+            '→': lexer.Literal('→'),
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            '>': lexer.Literal('>'),
+            '>>': lexer.And([lexer.Literal('>'), lexer.Literal('>')]),
+        }))
+        for input_str, expected in list[Tuple[str, str]]([
+            ('==', '= ='),
+            ('=>', '= >'),
+            ('define de', 'def id id'),
+            ('→def', '→ def'),
+            ('>>', '> >'),
+        ]):
+            with self.subTest(input_str=input_str):
+                tokens = lexer_.apply(input_str)
+                self.assertEqual(' '.join(token.rule_name for token in tokens), expected)
+                self.assertEqual(tokens, lexer_._apply_rules(input_str))  # pylint: disable=protected-access
+                self.assertEqual(tokens, lexer_.apply_bytes(input_str.encode()))
+                self.assertEqual(tokens, lexer_.apply_bytes(bytearray(input_str.encode())))
+                self.assertEqual(
+                    tokens, lexer_.apply_bytes(memoryview(bytearray(input_str.encode()))))
+
+
+class RunTest(unittest.TestCase):
+    '''tests for matching runs of char set rules in one step'''
+
+    def test_runs(self):
+        '''runs match as the rules themselves do'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.And([
+                lexer.Class(string.ascii_letters),
+                lexer.ZeroOrMore(lexer.Or([
+                    lexer.Class(string.ascii_letters + '-]^\\'),
+                    lexer.Range('0', '9'),
+                ])),
+            ]),
+            'greek': lexer.OneOrMore(lexer.Range('α', 'ω')),
+            'str': lexer.And([
+                lexer.Literal('"'),
+                lexer.ZeroOrMore(lexer.Not(lexer.Literal('"'))),
+                lexer.Literal('"'),
+            ]),
+            'dots': lexer.OneOrMore(lexer.Literal('.')),
+        }))
+        for input_str in list[str]([
+            'a',
+            'ab-c]^\\9 d',
+            'αβγ a1 ω',
+            '"x\ny é" "" ..a',
+            '...',
+        ]):
+            with self.subTest(input_str=input_str):
+                expected = lexer_._apply_rules(input_str)  # pylint: disable=protected-access
+                self.assertEqual(lexer_.apply(input_str), expected)
+                self.assertEqual(lexer_.apply_bytes(input_str.encode()), expected)
+
+
+class CompileTest(unittest.TestCase):
+    '''tests for compiling lex rules into matchers'''
+
+    def test_compile_without_hashing_rules(self):
+        '''shared subrules are found by identity, not by hashing rule trees'''
+        rule: lexer.Rule = lexer.Literal('a')
+        for _ in range(100):
+            rule = lexer.Or([lexer.And([lexer.Literal('b'), rule]), rule])
+        lexer_ = lexer.Lexer(OrderedDict({'r': rule}))
+        with mock.patch.object(processor.And, '__hash__', side_effect=AssertionError), \
+                mock.patch.object(processor.Or, '__hash__', side_effect=AssertionError):
+            self.assertEqual(lexer_.recognize('b' * 100 + 'a'), 101)
+
+
+class ParallelTest(unittest.TestCase):
+    '''tests for lexer.Lexer.apply_parallel'''
+
+    @property
+    def lexer(self) -> lexer.Lexer:
+        '''a lexer with tokens that span chunks'''
+        return lexer.Lexer(OrderedDict({
+            'def': lexer.And([lexer.Literal('d'), lexer.Literal('e'), lexer.Literal('f')]),
+            '_ws': lexer.OneOrMore(lexer.Class.whitespace()),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            'int': lexer.OneOrMore(lexer.Class(string.digits)),
+            'str': lexer.And([
+                lexer.Literal('"'),
+                lexer.ZeroOrMore(lexer.Not(lexer.Literal('"'))),
+                lexer.Literal('"'),
+            ]),
+        }))
+
+    def test_apply_parallel(self):
+        '''chunks are stitched into the same tokens as apply'''
+        input_str = 'def abc 12\n  "x def \n y" defdef\n\n' * 20
+        expected = self.lexer.apply(input_str)
+        for chunk_size in [1, 5, 16, 100, len(input_str)]:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.lexer.apply_parallel(input_str, 3, chunk_size), expected)
+
+    def test_apply_parallel_fail(self):
+        '''failures are reported as apply reports them'''
+        with self.assertRaises(lexer.Error):
+            self.lexer.apply_parallel('abc ' * 20 + '!' + ' def' * 20, 2, 8)
+
+
+class RecognizeTest(unittest.TestCase):
+    '''tests for lexer.Lexer.recognize'''
+
+    def test_recognize(self):
+        '''recognize returns how far the input lexes'''
+        lexer_ = lexer.Lexer(OrderedDict({
+            '_ws': lexer.Class.whitespace(),
+            'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+            'h': lexer.And([lexer.Literal('1'), lexer.Not(lexer.Literal('1'))]),
+        }))
+        for input_str, expected in list[Tuple[str, int]]([
+            ('', 0),
+            ('ab cd', 5),
+            ('ab 1', 3),
+            ('ab 1a', 5),
+            ('ab 11', 3),
+        ]):
+            with self.subTest(input_str=input_str, expected=expected):
+                self.assertEqual(lexer_.recognize(input_str), expected)
+                self.assertEqual(lexer_.recognize(
+                    input_str.encode()), expected)
@@ -1,8 +1,10 @@
 '''utils for loading lexers and parsers from text specifications'''
 
 from collections import OrderedDict
-from typing import Callable, Container, Mapping, MutableMapping, Optional, Tuple, Type, TypeVar
-from core import lexer, parser, processor
+import functools
+from typing import (
+    Callable, Mapping, MutableMapping, MutableSequence, Optional, Tuple, Type, TypeVar)
+from core import analyzer, cache, lexer, parser, processor
 
 Error = processor.Error
 
@@ -58,71 +60,13 @@ def token_rule_name_is(rule_name: str) -> Callable[[parser.Result], bool]:
     return closure
 
 
-def load_lex_rule(regex: str) -> lexer.Rule:
-    '''load a lex rule from a regex str'''
-    operators = '.\\()|[]-*+?!^'
+_LEX_RULE_OPERATORS = '.\\()|[]-*+?!^'
 
-    def load_special(result: parser.Result) -> lexer.Rule:
-        value = get_token_value(result.where_one(
-            parser.Result.rule_name_is('special_char')))
-        special_rules = {
-            'w': lexer.Class.whitespace(),
-        }
-        if value in special_rules:
-            return special_rules[value]
-        if value in operators:
-            return lexer.Literal(value)
-        raise Error(msg=f'invalid special char {value}')
 
-    def load_literal(result: parser.Result) -> lexer.Rule:
-        return lexer.Literal(get_token_value(result))
-
-    def load_and(result: parser.Result) -> lexer.Rule:
-        rule = lexer.And([load_rule(rule) for rule in result['rule']])
-        if len(rule.children) == 1:
-            return rule.children[0]
-        return rule
-
-    def load_or(result: parser.Result) -> lexer.Rule:
-        return lexer.Or([load_rule(rule) for rule in result['rule']])
-
-    def load_class(result: parser.Result) -> lexer.Rule:
-        rule = lexer.Or([load_class_part(rule)
-                        for rule in result['class_part']])
-        if len(rule.children) == 1:
-            return rule.children[0]
-        return rule
-
-    def load_range(result: parser.Result) -> lexer.Rule:
-        min_result, max_result = result.where_n(token_rule_name_is('char'), 2)
-        return lexer.Range(get_token_value(min_result), get_token_value(max_result))
-
-    def load_unary_operation(rule_type: Type[lexer.UnaryRule]) -> _Loader[lexer.Token, lexer.Rule]:
-        def load(result: parser.Result) -> lexer.Rule:
-            return rule_type(load_rule(result.where_one(parser.Result.rule_name_is('operand'))))
-        return load
-
-    load_rule = factory({
-        'literal': load_literal,
-        'any': lambda _: lexer.Any(),
-        'special': load_special,
-        'and': load_and,
-        'or': load_or,
-        'class': load_class,
-        'zero_or_more': load_unary_operation(lexer.ZeroOrMore),
-        'one_or_more': load_unary_operation(lexer.OneOrMore),
-        'zero_or_one': load_unary_operation(lexer.ZeroOrOne),
-        'until_empty': load_unary_operation(lexer.UntilEmpty),
-        'not': load_unary_operation(lexer.Not),
-    })
-
-    load_class_part = factory({
-        'literal': load_literal,
-        'special': load_special,
-        'range': load_range,
-    })
-
-    return load_and(parser.Parser(
+@functools.lru_cache(maxsize=None)
+def _lex_rule_parser() -> parser.Parser:
+    '''the regex meta-parser, built once per process'''
+    return parser.Parser(
         'root',
         {
             'root': parser.UntilEmpty(parser.Ref('rule')),
@@ -170,7 +114,7 @@ def load_lex_rule(regex: str) -> lexer.Rule:
             'special': parser.And([parser.Ref('\\'), parser.Ref('special_char')]),
             'special_char': parser.Or([
                 parser.Ref('char'),
-                *[parser.Ref(operator) for operator in operators]
+                *[parser.Ref(operator) for operator in _LEX_RULE_OPERATORS]
             ]),
             'and': parser.And([
                 parser.Ref('('),
@@ -205,110 +149,97 @@ def load_lex_rule(regex: str) -> lexer.Rule:
             ]),
         },
         lexer.Lexer(OrderedDict({
-            'char': lexer.Not(lexer.Class(operators)),
-            **{operator: lexer.Literal(operator) for operator in operators}
+            'char': lexer.Not(lexer.Class(_LEX_RULE_OPERATORS)),
+            **{operator: lexer.Literal(operator) for operator in _LEX_RULE_OPERATORS}
         })
         )
-    ).apply(regex))
+    )
 
 
-def load_parser(grammar: str) -> parser.Parser:
-    '''load a generic parser from a text definition'''
+@functools.lru_cache(maxsize=1024)
+def load_lex_rule(regex: str) -> lexer.Rule:
+    '''load a lex rule from a regex str
 
-    operators: Container[str] = (
-        '=>', '=', ';', '|', '(', ')', '*', '+', '?', '!')
-    lexer_rules: OrderedDict[str, lexer.Rule] = OrderedDict[str, lexer.Rule]()
+    Rules are memoized by regex and shared, so they must not be modified.
+    '''
 
-    def lexer_literal_rule(operator: str) -> lexer.Rule:
-        if len(operator) == 1:
-            return lexer.Literal(operator)
-        return lexer.And([lexer.Literal(char) for char in operator])
+    def load_special(result: parser.Result) -> lexer.Rule:
+        value = get_token_value(result.where_one(
+            parser.Result.rule_name_is('special_char')))
+        special_rules = {
+            'w': lexer.Class.whitespace(),
+        }
+        if value in special_rules:
+            return special_rules[value]
+        if value in _LEX_RULE_OPERATORS:
+            return lexer.Literal(value)
+        raise Error(msg=f'invalid special char {value}')
 
-    def load_lexer_rules(result: parser.Result) -> None:
-        for lex_rule in result['lexer_decl']:
-            name = get_token_value(
-                lex_rule.where_one(token_rule_name_is('id')))
-            if name in lexer_rules:
-                raise Error(msg=f'duplicate lexer rule {name}')
-            regex = get_token_value(lex_rule.where_one(
-                token_rule_name_is('lexer_val')))[1:-1]
-            lexer_rules[name] = load_lex_rule(regex)
+    def load_literal(result: parser.Result) -> lexer.Rule:
+        return lexer.Literal(get_token_value(result))
 
-    def load_parser_rules(result: parser.Result) -> Tuple[str, Mapping[str, parser.Rule]]:
-        root_rule_name: Optional[str] = None
-        rules: MutableMapping[str, parser.Rule] = {}
+    def load_and(result: parser.Result) -> lexer.Rule:
+        rule = lexer.And([load_rule(rule) for rule in result['rule']])
+        if len(rule.children) == 1:
+            return rule.children[0]
+        return rule
 
-        def load_ref(result: parser.Result) -> parser.Rule:
-            try:
-                return parser.Ref(get_token_value(result))
-            except Error as error:
-                raise Error(
-                    msg=f'failed to load ref {result}', children=[error]) from error
+    def load_or(result: parser.Result) -> lexer.Rule:
+        return lexer.Or([load_rule(rule) for rule in result['rule']])
 
-        def load_nary_operation(
-            rule_type: Type[parser.NaryRule]
-        ) -> Callable[[parser.Result], parser.Rule]:
-            def closure(result: parser.Result) -> parser.Rule:
-                return rule_type([load_rule(operand) for operand in result['operand']])
-            return closure
+    def load_class(result: parser.Result) -> lexer.Rule:
+        rule = lexer.Or([load_class_part(rule)
+                        for rule in result['class_part']])
+        if len(rule.children) == 1:
+            return rule.children[0]
+        return rule
 
-        def load_unary_operation(
-            rule_type: Type[parser.UnaryRule]
-        ) -> Callable[[parser.Result], parser.Rule]:
-            def closure(result: parser.Result) -> parser.Rule:
-                return rule_type(
-                    load_rule(
-                        result.where_one(
-                            parser.Result.rule_name_is('unary_operand'))))
-            return closure
+    def load_range(result: parser.Result) -> lexer.Rule:
+        min_result, max_result = result.where_n(token_rule_name_is('char'), 2)
+        return lexer.Range(get_token_value(min_result), get_token_value(max_result))
 
-        def load_lexer_literal(result: parser.Result) -> parser.Rule:
-            lexer_val = get_token_value(result)[1:-1]
-            lexer_rule = lexer_literal_rule(lexer_val)
-            if lexer_val in lexer_rules and lexer_rules[lexer_val] != lexer_rule:
-                raise Error(
-                    msg=f'mismatched lexer literal rule {lexer_val}={lexer_rule}')
-            old_lexer_rules = lexer_rules.copy()
-            lexer_rules.clear()
-            lexer_rules[lexer_val] = lexer_rule
-            lexer_rules.update(old_lexer_rules)
-            return parser.Ref(lexer_val)
+    def load_unary_operation(rule_type: Type[lexer.UnaryRule]) -> _Loader[lexer.Token, lexer.Rule]:
+        def load(result: parser.Result) -> lexer.Rule:
+            return rule_type(load_rule(result.where_one(parser.Result.rule_name_is('operand'))))
+        return load
 
-        load_rule = factory({
-            'ref': load_ref,
-            'and': load_nary_operation(parser.And),
-            'or': load_nary_operation(parser.Or),
-            'zero_or_more': load_unary_operation(parser.ZeroOrMore),
-            'one_or_more': load_unary_operation(parser.OneOrMore),
-            'zero_or_one': load_unary_operation(parser.ZeroOrOne),
-            'until_empty': load_unary_operation(parser.UntilEmpty),
-            'lexer_literal': load_lexer_literal,
-        })
+    load_rule = factory({
+        'literal': load_literal,
+        'any': lambda _: lexer.Any(),
+        'special': load_special,
+        'and': load_and,
+        'or': load_or,
+        'class': load_class,
+        'zero_or_more': load_unary_operation(lexer.ZeroOrMore),
+        'one_or_more': load_unary_operation(lexer.OneOrMore),
+        'zero_or_one': load_unary_operation(lexer.ZeroOrOne),
+        'until_empty': load_unary_operation(lexer.UntilEmpty),
+        'not': load_unary_operation(lexer.Not),
+    })
 
-        for decl in result['parser_decl']:
-            try:
-                name = get_token_value(decl.where_one(
-                    parser.Result.rule_name_is('rule_name')))
-            except Error as error:
-                raise Error(
-                    msg=f'failed to get rule_name in {decl}', children=[error]) from error
-            if name in rules:
-                raise Error(msg=f'duplicate parser rule {name}')
-            if root_rule_name is None:
-                root_rule_name = name
-            try:
-                rule_result = decl.where_one(
-                    parser.Result.rule_name_is('rule'))
-            except Error as error:
-                raise Error(msg=f'failed to find rule in decl {decl}', children=[
-                            error]) from error
-            rules[name] = load_rule(rule_result)
+    load_class_part = factory({
+        'literal': load_literal,
+        'special': load_special,
+        'range': load_range,
+    })
 
-        if root_rule_name is None:
-            raise Error(msg='no root rule name found')
-        return root_rule_name, rules
+    return processor.intern(load_and(_lex_rule_parser().apply(regex)))
+
+
+_GRAMMAR_OPERATORS: Tuple[str, ...] = (
+    '=>', '=', ';', '|', '(', ')', '*', '+', '?', '!', '%')
 
-    result = parser.Parser(
+
+def _lexer_literal_rule(operator: str) -> lexer.Rule:
+    if len(operator) == 1:
+        return lexer.Literal(operator)
+    return lexer.And([lexer.Literal(char) for char in operator])
+
+
+@functools.lru_cache(maxsize=None)
+def _grammar_parser() -> parser.Parser:
+    '''the grammar-of-grammars parser, built once per process'''
+    return parser.Parser(
         'root',
         {
             'root': parser.UntilEmpty(parser.Ref('line')),
@@ -329,6 +260,7 @@ def load_parser(grammar: str) -> parser.Parser:
             ]),
             'rule_name': parser.Ref('id'),
             'rule': parser.Or([
+                parser.Ref('precedence'),
                 parser.Ref('or'),
                 parser.Ref('and'),
                 parser.Ref('operand'),
@@ -359,6 +291,22 @@ def load_parser(grammar: str) -> parser.Parser:
                     ])
                 )
             ]),
+            'precedence': parser.And([
+                parser.Ref('unary_operand'),
+                parser.Ref('%'),
+                parser.Ref('precedence_level'),
+                parser.ZeroOrMore(
+                    parser.And([
+                        parser.Ref('|'),
+                        parser.Ref('precedence_level'),
+                    ])
+                ),
+            ]),
+            'precedence_level': parser.And([
+                parser.ZeroOrOne(parser.Ref('precedence_associativity')),
+                parser.OneOrMore(parser.Ref('lexer_literal')),
+            ]),
+            'precedence_associativity': parser.Ref('id'),
             'paren_rule': parser.And([
                 parser.Ref('('),
                 parser.Ref('rule'),
@@ -386,10 +334,144 @@ def load_parser(grammar: str) -> parser.Parser:
             '_ws': lexer.Class.whitespace(),
             'id': load_lex_rule(r'[_a-zA-Z][_a-zA-Z0-9]*'),
             'lexer_val': load_lex_rule(r'"(^")+"'),
-            **{operator: lexer_literal_rule(operator) for operator in operators}
+            **{operator: _lexer_literal_rule(operator) for operator in _GRAMMAR_OPERATORS}
         }))
-    ).apply(grammar)
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def load_parser(grammar: str) -> parser.Parser:
+    '''load a generic parser from a text definition
+
+    Parsers are cached by grammar text, in process and, if $PYSH_CACHE_DIR is
+    set, on disk, so the returned parser is shared and must not be modified.
+    '''
+    disk_cache = cache.default_disk_cache()
+    if disk_cache is not None:
+        cached = disk_cache.get('parser', grammar)
+        if isinstance(cached, parser.Parser):
+            return cached
+    parser_ = _load_parser(grammar)
+    if disk_cache is not None:
+        disk_cache.put('parser', grammar, parser_)
+    return parser_
+
+
+def _load_parser(grammar: str) -> parser.Parser:  # pylint: disable=too-many-statements
+
+    lexer_rules: OrderedDict[str, lexer.Rule] = OrderedDict[str, lexer.Rule]()
+
+    def load_lexer_rules(result: parser.Result) -> None:
+        for lex_rule in result['lexer_decl']:
+            name = get_token_value(
+                lex_rule.where_one(token_rule_name_is('id')))
+            if name in lexer_rules:
+                raise Error(msg=f'duplicate lexer rule {name}')
+            regex = get_token_value(lex_rule.where_one(
+                token_rule_name_is('lexer_val')))[1:-1]
+            lexer_rules[name] = load_lex_rule(regex)
+
+    def load_parser_rules(result: parser.Result) -> Tuple[str, Mapping[str, parser.Rule]]:
+        root_rule_name: Optional[str] = None
+        rules: MutableMapping[str, parser.Rule] = {}
+        decl_name = ''
+
+        def load_ref(result: parser.Result) -> parser.Rule:
+            try:
+                return parser.Ref(get_token_value(result))
+            except Error as error:
+                raise Error(
+                    msg=f'failed to load ref {result}', children=[error]) from error
+
+        def load_nary_operation(
+            rule_type: Type[parser.NaryRule]
+        ) -> Callable[[parser.Result], parser.Rule]:
+            def closure(result: parser.Result) -> parser.Rule:
+                return rule_type([load_rule(operand) for operand in result['operand']])
+            return closure
+
+        def load_unary_operation(
+            rule_type: Type[parser.UnaryRule]
+        ) -> Callable[[parser.Result], parser.Rule]:
+            def closure(result: parser.Result) -> parser.Rule:
+                return rule_type(
+                    load_rule(
+                        result.where_one(
+                            parser.Result.rule_name_is('unary_operand'))))
+            return closure
+
+        def load_lexer_literal(result: parser.Result) -> parser.Rule:
+            lexer_val = get_token_value(result)[1:-1]
+            lexer_rule = _lexer_literal_rule(lexer_val)
+            if lexer_val in lexer_rules and lexer_rules[lexer_val] != lexer_rule:
+                raise Error(
+                    msg=f'mismatched lexer literal rule {lexer_val}={lexer_rule}')
+            old_lexer_rules = lexer_rules.copy()
+            lexer_rules.clear()
+            lexer_rules[lexer_val] = lexer_rule
+            lexer_rules.update(old_lexer_rules)
+            return parser.Ref(lexer_val)
+
+        def load_precedence(result: parser.Result) -> parser.Rule:
+            operators: MutableSequence[parser.Precedence.Operator] = []
+            for precedence, level in enumerate(result['precedence_level'], 1):
+                right = False
+                if 'precedence_associativity' in level:
+                    associativity = get_token_value(level['precedence_associativity', 1])
+                    if associativity not in ('left', 'right'):
+                        raise Error(msg=f'unknown associativity {associativity}')
+                    right = associativity == 'right'
+                operators.extend(
+                    parser.Precedence.Operator(load_lexer_literal(literal), precedence, right=right)
+                    for literal in level['lexer_literal'])
+            return parser.Precedence(
+                load_rule(result['unary_operand', 1]), operators, decl_name)
+
+        load_rule = factory({
+            'ref': load_ref,
+            'and': load_nary_operation(parser.And),
+            'or': load_nary_operation(parser.Or),
+            'zero_or_more': load_unary_operation(parser.ZeroOrMore),
+            'one_or_more': load_unary_operation(parser.OneOrMore),
+            'zero_or_one': load_unary_operation(parser.ZeroOrOne),
+            'until_empty': load_unary_operation(parser.UntilEmpty),
+            'lexer_literal': load_lexer_literal,
+            'precedence': load_precedence,
+        })
+
+        for decl in result['parser_decl']:
+            try:
+                name = get_token_value(decl.where_one(
+                    parser.Result.rule_name_is('rule_name')))
+            except Error as error:
+                raise Error(
+                    msg=f'failed to get rule_name in {decl}', children=[error]) from error
+            if name in rules:
+                raise Error(msg=f'duplicate parser rule {name}')
+            if root_rule_name is None:
+                root_rule_name = name
+            decl_name = name
+            try:
+                rule_result = decl.where_one(
+                    parser.Result.rule_name_is('rule'))
+            except Error as error:
+                raise Error(msg=f'failed to find rule in decl {decl}', children=[
+                            error]) from error
+            rules[name] = load_rule(rule_result)
+
+        if root_rule_name is None:
+            raise Error(msg='no root rule name found')
+        return root_rule_name, rules
+
+    result = _grammar_parser().apply(grammar)
 
     load_lexer_rules(result)
     root_rule_name, parser_rules = load_parser_rules(result)
-    return parser.Parser(root_rule_name, parser_rules, lexer.Lexer(lexer_rules))
+    parser_ = parser.Parser(
+        root_rule_name,
+        {name: processor.intern(rule) for name, rule in parser_rules.items()},
+        lexer.Lexer(OrderedDict[str, lexer.Rule](
+            (name, processor.intern(rule)) for name, rule in lexer_rules.items())),
+    )
+    analyzer.check(parser_)
+    return parser_
@@ -3,7 +3,7 @@
 from collections import OrderedDict
 from typing import Tuple
 import unittest
-from core import lexer, parser, loader
+from core import lexer, parser, loader, processor
 
 if 'unittest.util' in __import__('sys').modules:
     # Show full diff in self.assertEqual.
@@ -45,6 +45,17 @@ class LoadLexRuleTest(unittest.TestCase):
                 with self.assertRaises(loader.Error):
                     loader.load_lex_rule(regex)
 
+    def test_interned(self):
+        rule = loader.load_lex_rule('((ab)|(ab)*)')
+        assert isinstance(rule, processor.Or)
+        zero_or_more = rule.children[1]
+        assert isinstance(zero_or_more, processor.ZeroOrMore)
+        self.assertIs(rule.children[0], zero_or_more.child)
+
+    def test_memoized(self):
+        self.assertIs(loader.load_lex_rule('[a-z]+'), loader.load_lex_rule('[a-z]+'))
+        self.assertIsNot(loader.load_lex_rule('[a-z]+'), loader.load_lex_rule('[a-z]*'))
+
 
 class LoadParserTest(unittest.TestCase):
 
@@ -211,12 +222,35 @@ class LoadParserTest(unittest.TestCase):
                 self.assertEqual(expected_parser, actual_parser,
                                  f'expected {expected_parser} != actual {actual_parser}')
 
+    def test_load_precedence(self):
+        self.assertEqual(
+            loader.load_parser(r'''
+                id = "[a-z]+";
+                expr => operand % "+" "-" | left "*" | right "^";
+                operand => id;
+            ''').rules['expr'],
+            parser.Precedence(
+                parser.Ref('operand'),
+                [
+                    parser.Precedence.Operator(parser.Ref('+'), 1),
+                    parser.Precedence.Operator(parser.Ref('-'), 1),
+                    parser.Precedence.Operator(parser.Ref('*'), 2),
+                    parser.Precedence.Operator(parser.Ref('^'), 3, right=True),
+                ],
+                'expr',
+            ),
+        )
+
     def test_load_fail(self):
         for grammar in list[str]([
             r'''
                 a = "b";
                 a = "b";
             ''',
+            r'''
+                id = "[a-z]+";
+                expr => id % up "+";
+            ''',
             r'''
                 a = "b";
                 r => "a";
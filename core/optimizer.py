@@ -0,0 +1,204 @@
+'''grammar optimizer
+
+Rewrites rule trees into cheaper equivalents. Rewrites only drop unnamed
+intermediate results, so the tokens a lexer emits and the rule_names a parser
+result is annotated with are unchanged.
+'''
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Container, Mapping, MutableMapping, MutableSequence, Optional, Sequence, Set
+from core import lexer, parser, processor
+
+_MAX_CLASS_SIZE = 256
+'''largest range that is expanded when merging chars into a class'''
+
+
+@dataclass(frozen=True)
+class Report:
+    '''rules that can't contribute to a processor's result'''
+
+    unreachable_rules: Sequence[str]
+    '''rules that can't be reached from the root rule'''
+
+    unused_tokens: Sequence[str]
+    '''non-excluded lexer rules that no parser rule refers to'''
+
+
+def _ref_name(rule: processor.Rule) -> Optional[str]:
+    if isinstance(rule, processor.Ref):
+        return rule.value
+    if isinstance(rule, parser.Ref):
+        return rule.rule_name
+    return None
+
+
+def _children(rule: processor.Rule) -> Sequence[processor.Rule]:
+    if isinstance(rule, processor.NaryRule):
+        return rule.children
+    if isinstance(rule, processor.UnaryRule):
+        return [rule.child]
+    if isinstance(rule, processor.Precedence):
+        return [rule.operand, *[operator.rule for operator in rule.operators]]
+    return []
+
+
+def refs(rule: processor.Rule) -> Set[str]:
+    '''the names referred to anywhere in rule'''
+    names: Set[str] = set()
+    pending = [rule]
+    while pending:
+        rule = pending.pop()
+        name = _ref_name(rule)
+        if name is not None:
+            names.add(name)
+        pending.extend(_children(rule))
+    return names
+
+
+def reachable(rules: Mapping[str, processor.Rule], root_rule_name: str) -> Set[str]:
+    '''the names reachable from root_rule_name, including names that aren't rules'''
+    seen = {root_rule_name}
+    pending = [root_rule_name]
+    while pending:
+        rule = rules.get(pending.pop())
+        if rule is not None:
+            for name in refs(rule) - seen:
+                seen.add(name)
+                pending.append(name)
+    return seen
+
+
+def report(parser_: parser.Parser) -> Report:
+    '''find the rules and tokens in parser_ that are never used'''
+    seen = reachable(parser_.rules, parser_.root_rule_name)
+    return Report(
+        unreachable_rules=[name for name in parser_.rules if name not in seen],
+        unused_tokens=[
+            name for name in parser_.lexer.lexer_rules()
+            if name not in seen and not name.startswith(lexer.EXCLUDE_NAME_PREFIX)
+        ],
+    )
+
+
+def _chars(rule: processor.Rule) -> Optional[Sequence[str]]:
+    '''the chars a single char lex rule matches, if it's small enough to enumerate'''
+    if isinstance(rule, lexer.Literal):
+        return [rule.value]
+    if isinstance(rule, lexer.Class):
+        return list(rule.values)
+    if isinstance(rule, lexer.Range) and ord(rule.max) - ord(rule.min) < _MAX_CLASS_SIZE:
+        return [chr(code) for code in range(ord(rule.min), ord(rule.max) + 1)]
+    return None
+
+
+def _merge_chars(children: Sequence[processor.Rule]) -> Sequence[processor.Rule]:
+    '''merge runs of adjacent single char alternatives into classes'''
+    merged: MutableSequence[processor.Rule] = []
+    run: MutableSequence[processor.Rule] = []
+
+    def flush() -> None:
+        if len(run) == 1:
+            merged.append(run[0])
+        elif run:
+            values: MutableSequence[str] = []
+            for rule in run:
+                values.extend(char for char in _chars(rule) or [] if char not in values)
+            merged.append(lexer.Class(''.join(values)))
+        run.clear()
+
+    for child in children:
+        if _chars(child) is None:
+            flush()
+            merged.append(child)
+        else:
+            run.append(child)
+    flush()
+    return merged
+
+
+def optimize_rule(  # pylint: disable=too-many-return-statements
+    rule: processor.Rule,
+    inline: Optional[Mapping[str, processor.Rule]] = None,
+) -> processor.Rule:
+    '''simplify rule, replacing refs to the names in inline with their rules
+
+    Single child Ands and Ors are replaced by their child, nested Ands and Ors
+    are flattened into their parent, and adjacent single char lex rules in an
+    Or are merged into one Class.
+    '''
+    name = _ref_name(rule)
+    if name is not None:
+        if inline and name in inline:
+            return optimize_rule(inline[name], inline)
+        return rule
+    if isinstance(rule, processor.NaryRule):
+        children: MutableSequence[processor.Rule] = []
+        for child in rule.children:
+            child = optimize_rule(child, inline)
+            if (isinstance(rule, (processor.And, processor.Or))
+                    and type(child) is type(rule)):  # pylint: disable=unidiomatic-typecheck
+                assert isinstance(child, processor.NaryRule)
+                children.extend(child.children)
+            else:
+                children.append(child)
+        if isinstance(rule, processor.Or):
+            children = list(_merge_chars(children))
+        if len(children) == 1 and isinstance(rule, (processor.And, processor.Or)):
+            return children[0]
+        return replace(rule, children=children)
+    if isinstance(rule, processor.UnaryRule):
+        return replace(rule, child=optimize_rule(rule.child, inline))
+    if isinstance(rule, processor.Precedence):
+        return replace(
+            rule,
+            operand=optimize_rule(rule.operand, inline),
+            operators=[
+                replace(operator, rule=optimize_rule(operator.rule, inline))
+                for operator in rule.operators
+            ],
+        )
+    return rule
+
+
+def _recursive(rules: Mapping[str, processor.Rule], rule_name: str) -> bool:
+    return any(rule_name in reachable(rules, name) for name in refs(rules[rule_name]))
+
+
+def _optimize_rules(
+    rules: Mapping[str, processor.Rule],
+    keep: Container[str],
+    inline: Container[str],
+) -> Mapping[str, processor.Rule]:
+    '''optimize rules, inlining the non-recursive rules in inline that aren't in keep'''
+    optimized: MutableMapping[str, processor.Rule] = {
+        name: optimize_rule(rule) for name, rule in rules.items()}
+    inlined = {
+        name: rule
+        for name, rule in optimized.items()
+        if name in inline and name not in keep and not _recursive(optimized, name)
+    }
+    return {
+        name: processor.intern(optimize_rule(rule, inlined))
+        for name, rule in optimized.items()
+        if name not in inlined
+    }
+
+
+def optimize_lexer(lexer_: lexer.Lexer) -> lexer.Lexer:
+    '''an equivalent lexer with simplified rules'''
+    rules = lexer_.lexer_rules()
+    return lexer.Lexer(OrderedDict(_optimize_rules(rules, rules, ())))
+
+
+def optimize_parser(parser_: parser.Parser, inline: Container[str] = ()) -> parser.Parser:
+    '''an equivalent parser with simplified rules and lexer
+
+    Rules named in inline are substituted into the rules that refer to them and
+    removed, so results will no longer be annotated with their names.
+    '''
+    return parser.Parser(
+        parser_.root_rule_name,
+        _optimize_rules(parser_.rules, {parser_.root_rule_name}, inline),
+        optimize_lexer(parser_.lexer),
+    )
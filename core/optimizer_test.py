@@ -0,0 +1,133 @@
+# pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring
+
+from collections import OrderedDict
+from typing import Tuple
+import unittest
+import warnings
+from core import analyzer, lexer, loader, optimizer, parser
+
+
+class OptimizeRuleTest(unittest.TestCase):
+
+    def test_optimize_rule(self):
+        for rule, expected in list[Tuple[parser.Rule, parser.Rule]]([
+            (parser.Ref('a'), parser.Ref('a')),
+            (parser.And([parser.Ref('a')]), parser.Ref('a')),
+            (parser.Or([parser.Ref('a')]), parser.Ref('a')),
+            (
+                parser.And([parser.Ref('a'), parser.And([parser.Ref('b'), parser.Ref('c')])]),
+                parser.And([parser.Ref('a'), parser.Ref('b'), parser.Ref('c')]),
+            ),
+            (
+                parser.Or([parser.Or([parser.Ref('a'), parser.Ref('b')]), parser.Ref('c')]),
+                parser.Or([parser.Ref('a'), parser.Ref('b'), parser.Ref('c')]),
+            ),
+            (
+                parser.And([parser.Ref('a'), parser.Or([parser.Ref('b'), parser.Ref('c')])]),
+                parser.And([parser.Ref('a'), parser.Or([parser.Ref('b'), parser.Ref('c')])]),
+            ),
+            (
+                parser.ZeroOrMore(parser.And([parser.Ref('a')])),
+                parser.ZeroOrMore(parser.Ref('a')),
+            ),
+        ]):
+            with self.subTest(rule=rule, expected=expected):
+                self.assertEqual(optimizer.optimize_rule(rule), expected)
+
+    def test_merge_chars(self):
+        for rule, expected in list[Tuple[lexer.Rule, lexer.Rule]]([
+            (
+                lexer.Or([lexer.Literal('a'), lexer.Literal('b')]),
+                lexer.Class('ab'),
+            ),
+            (
+                lexer.Or([lexer.Literal('a'), lexer.Range('0', '2'), lexer.Class('ab')]),
+                lexer.Class('a012b'),
+            ),
+            (
+                lexer.Or([lexer.Literal('a'), lexer.Any(), lexer.Literal('b')]),
+                lexer.Or([lexer.Literal('a'), lexer.Any(), lexer.Literal('b')]),
+            ),
+            (
+                lexer.Or([lexer.Literal('a'), lexer.Literal('b'), lexer.Any()]),
+                lexer.Or([lexer.Class('ab'), lexer.Any()]),
+            ),
+        ]):
+            with self.subTest(rule=rule, expected=expected):
+                self.assertEqual(optimizer.optimize_rule(rule), expected)
+
+    def test_inline(self):
+        self.assertEqual(
+            optimizer.optimize_rule(
+                parser.And([parser.Ref('a'), parser.Ref('b')]),
+                {'a': parser.And([parser.Ref('c'), parser.Ref('d')])},
+            ),
+            parser.And([parser.Ref('c'), parser.Ref('d'), parser.Ref('b')]),
+        )
+
+
+class OptimizeParserTest(unittest.TestCase):
+
+    grammar = r'''
+        id = "[a-z]+";
+        int = "(0|1|2|3|4|5|6|7|8|9)+";
+        _ws = "\w+";
+        root => (stmt)+;
+        stmt => assignment | expr_stmt;
+        assignment => id "=" value ";";
+        value => int | ref;
+        ref => id;
+        expr_stmt => value ";";
+        unused => int;
+    '''
+
+    @staticmethod
+    def load(grammar: str) -> parser.Parser:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', analyzer.GrammarWarning)
+            return loader.load_parser(grammar)
+
+    def test_results(self):
+        parser_ = self.load(self.grammar)
+        optimized = optimizer.optimize_parser(parser_)
+        for input_str in ['a = 1;', 'a = b; 12;']:
+            with self.subTest(input_str=input_str):
+                self.assertEqual(optimized.lexer.apply(input_str),
+                                 parser_.lexer.apply(input_str))
+                result = parser_.apply(input_str)
+                optimized_result = optimized.apply(input_str)
+                for rule_name in parser_.rules:
+                    self.assertEqual(optimized_result[rule_name], result[rule_name])
+
+    def test_inline(self):
+        optimized = optimizer.optimize_parser(
+            self.load(self.grammar), inline={'value', 'ref', 'root'})
+        self.assertNotIn('value', optimized.rules)
+        self.assertNotIn('ref', optimized.rules)
+        self.assertIn('root', optimized.rules)
+        self.assertEqual(optimized.rules['expr_stmt'],
+                         parser.And([parser.Or([parser.Ref('int'), parser.Ref('id')]),
+                                     parser.Ref(';')]))
+        self.assertEqual(optimized.apply('a = b;')['assignment', 1].all_values(),
+                         self.load(self.grammar).apply('a = b;').all_values())
+
+    def test_inline_recursive(self):
+        parser_ = parser.Parser(
+            'a',
+            {
+                'a': parser.And([parser.Ref('x'), parser.ZeroOrOne(parser.Ref('b'))]),
+                'b': parser.Ref('a'),
+            },
+            lexer.Lexer(OrderedDict({'x': lexer.Literal('x')})),
+        )
+        self.assertEqual(optimizer.optimize_parser(parser_, inline={'b'}), parser_)
+
+    def test_report(self):
+        self.assertEqual(
+            optimizer.report(self.load(self.grammar + 'float = "f";')),
+            optimizer.Report(unreachable_rules=['unused'], unused_tokens=['float']),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
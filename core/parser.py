@@ -1,7 +1,10 @@
 '''syntactic text parser'''
 
-from dataclasses import dataclass
-from typing import Type
+from abc import ABC, abstractmethod
+from array import array
+import bisect
+from dataclasses import dataclass, field
+from typing import Generator, Iterator, MutableSequence, Optional, Sequence, Tuple, Type
 from core import processor, lexer, stream
 
 
@@ -20,6 +23,8 @@ Or = processor.Or[lexer.Token, lexer.TokenStream]
 ZeroOrMore = processor.ZeroOrMore[lexer.Token, lexer.TokenStream]
 OneOrMore = processor.OneOrMore[lexer.Token, lexer.TokenStream]
 ZeroOrOne = processor.ZeroOrOne[lexer.Token, lexer.TokenStream]
+Precedence = processor.Precedence[lexer.Token, lexer.TokenStream]
+Events = processor.Events[lexer.Token, lexer.TokenStream]
 
 
 class StateError(Error, processor.StateError[lexer.Token, lexer.TokenStream]):  # pylint: disable=too-many-ancestors
@@ -30,6 +35,37 @@ class RuleError(StateError, processor.RuleError[lexer.Token, lexer.TokenStream])
     '''parser error for rule'''
 
 
+class Handler(ABC):
+    '''receives rule matches from Parser.apply_events as the parse commits'''
+
+    @abstractmethod
+    def enter(self, rule_name: str, position: Optional[lexer.Position]) -> None:
+        '''a rule starts matching at position, or at the end of input if None'''
+
+    @abstractmethod
+    def token(self, token: lexer.Token) -> None:
+        '''a token was matched'''
+
+    @abstractmethod
+    def exit(self, rule_name: str) -> None:
+        '''the rule that was last entered matched'''
+
+
+@dataclass(frozen=True)
+class _EventHandler(processor.EventHandler[lexer.Token, lexer.TokenStream]):
+    handler: Handler
+
+    def enter(self, rule_name: str, state_value: lexer.TokenStream) -> None:
+        self.handler.enter(
+            rule_name, None if state_value.empty else state_value.head.position)
+
+    def value(self, value: lexer.Token) -> None:
+        self.handler.token(value)
+
+    def exit(self, rule_name: str) -> None:
+        self.handler.exit(rule_name)
+
+
 @dataclass(frozen=True)
 class Parser(processor.Processor[lexer.Token, lexer.TokenStream]):
     '''generic syntactic text parser'''
@@ -57,9 +93,318 @@ class Parser(processor.Processor[lexer.Token, lexer.TokenStream]):
                 output += str_rule(name)
         return output
 
-    def apply(self, input_str: str) -> Result:
-        '''apply the grammar to the input text and return the structured result'''
-        return self.apply_root_to_state_value(self.lexer.apply(input_str))
+    def apply(self, input_str: str, budget: Optional[processor.Budget] = None) -> Result:
+        '''apply the grammar to the input text and return the structured result
+
+        If a budget is given processor.BudgetExceeded is raised once the parse
+        has spent it. Lexing isn't counted against it.
+        '''
+        return self.apply_root_to_state_value(self.lexer.apply(input_str), budget)
+
+    def apply_events(
+        self,
+        input_str: str,
+        handler: Handler,
+        budget: Optional[processor.Budget] = None,
+    ) -> None:
+        '''apply the grammar to the input text, reporting matches to handler
+
+        No result tree is built: events are delivered as soon as no enclosing
+        alternative can backtrack over them, and events from alternatives that
+        failed are never delivered. If the parse fails the handler may already
+        have received the events of the committed prefix.
+        '''
+        self.apply_root_to_state_value_events(
+            self.lexer.apply(input_str), _EventHandler(handler), budget)
+
+    def recognize(self, input_str: str, budget: Optional[processor.Budget] = None) -> Optional[int]:
+        '''the offset up to which the grammar matches input_str, or None
+
+        The grammar runs in match mode, without building results or errors.
+        input_str fully matches iff this returns len(input_str).
+        '''
+        if self.lexer.recognize(input_str) != len(input_str):
+            return None
+        tokens = self.match_prefix(self.lexer.apply(input_str), budget)
+        if tokens is None:
+            return None
+        if tokens.empty:
+            return len(input_str)
+        return tokens.head.position.offset(input_str)
+
+    def apply_bytes(
+        self,
+        data: bytes | bytearray | memoryview,
+        budget: Optional[processor.Budget] = None,
+    ) -> Result:
+        '''apply the grammar to a utf-8 buffer without decoding it up front'''
+        return self.apply_root_to_state_value(self.lexer.apply_bytes(data), budget)
+
+    def _spine(self) -> Optional[Tuple[Sequence[str], Rule, str]]:
+        '''the refs from the root down to a repetition of an item rule, if any'''
+        rule_names = [self.root_rule_name]
+        lexer_rules = self.lexer.lexer_rules()
+        while True:
+            rule = self.rules.get(rule_names[-1])
+            if (isinstance(rule, Ref)
+                and rule.rule_name in self.rules
+                    and rule.rule_name not in rule_names):
+                rule_names.append(rule.rule_name)
+            elif (isinstance(rule, (processor.ZeroOrMore, processor.OneOrMore, stream.UntilEmpty))
+                  and isinstance(rule.child, Ref)
+                  and rule.child.rule_name in self.rules
+                  and rule.child.rule_name not in lexer_rules):
+                return rule_names, rule, rule.child.rule_name
+            else:
+                return None
+
+    def apply_steps(
+        self,
+        tokens: 'lexer.TokenStream',
+        budget: Optional[processor.Budget] = None,
+    ) -> Generator[int, None, Result]:
+        '''apply the grammar to tokens one item at a time
+
+        For grammars whose root reaches a repetition of an item rule through plain
+        refs, such as root => line!, this yields the number of tokens consumed
+        after each item so the caller can interleave other work, and returns the
+        same result as apply. Other grammars are applied in one step.
+        '''
+        spine = self._spine()
+        if spine is None:
+            return self.apply_root_to_state_value(tokens, budget)
+        rule_names, repetition, item_rule_name = spine
+        state = self.new_state(tokens, budget)
+        items: MutableSequence[Result] = []
+        while not state.value.empty:
+            try:
+                item_and_state = self.apply_rule_name_to_state(item_rule_name, state)
+            except processor.Error:
+                if isinstance(repetition, stream.UntilEmpty):
+                    # reapply in one step for the error apply would raise
+                    return self.apply_root_to_state_value(tokens, budget)
+                break
+            items.append(item_and_state.result)
+            state = item_and_state.state
+            yield len(tokens) - len(state.value)
+        if isinstance(repetition, processor.OneOrMore) and not items:
+            return self.apply_root_to_state_value(tokens, budget)
+        return _spine_result(rule_names, items)
+
+    def apply_lookahead(
+        self,
+        tokens: 'lexer.TokenStream',
+        budget: Optional[processor.Budget] = None,
+    ) -> Result:
+        '''apply the grammar to tokens, keeping how far each item looked ahead
+
+        The result is the same as apply_steps', with its lookahead set for grammars
+        reparse applies to, so reparse can tell which items an edit might change
+        without parsing the items before it again.
+        '''
+        left = [len(tokens) + 1]
+        steps = self.apply_steps(_ExaminedTokenStream(tokens.items, examined=left), budget)
+        lookahead = array('q')
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                result: Result = stop.value
+                if self._spine() is None:
+                    return result
+                return processor.Result(value=result.value, rule_name=result.rule_name,
+                                        children=result.children, lookahead=lookahead)
+            lookahead.append(max(len(tokens) - left[0] + 1, lookahead[-1] if lookahead else 0))
+            left[0] = len(tokens) + 1
+
+    def reparse(
+        self,
+        result: Result,
+        tokens: 'lexer.TokenStream',
+        new_tokens: 'lexer.TokenStream',
+    ) -> Result:
+        '''re-apply the grammar after tokens changed, reusing unaffected subtrees
+
+        This applies to grammars whose root reaches a repetition of an item rule
+        through plain refs, such as root => line!. Items are reused as is up to the
+        first one whose parse looked at a changed token, found from result's
+        lookahead. From there items are re-parsed up to the first item boundary
+        that lines up with an old one after the change, and the remaining old
+        items are reused with their tokens swapped for the shifted new ones.
+        Other grammars fall back to a full parse.
+
+        How far parsing looked is kept in the returned result's lookahead. If
+        result doesn't have it, as when it's not from apply_lookahead or reparse,
+        it's found by parsing tokens again.
+        '''
+        spine = self._spine()
+        if spine is not None:
+            try:
+                return self._reparse(*spine, result, tokens, new_tokens.items)
+            except processor.Error:
+                pass
+        return self.apply_root_to_state_value(new_tokens)
+
+    def _reparse(  # pylint: disable=too-many-arguments,too-many-locals,too-many-positional-arguments,too-many-branches,too-many-statements
+        self,
+        rule_names: Sequence[str],
+        repetition: Rule,
+        item_rule_name: str,
+        result: Result,
+        old_tokens: 'lexer.TokenStream',
+        new_tokens: Sequence['lexer.Token'],
+    ) -> Result:
+        tokens = old_tokens.items
+        spine_results = [result]
+        for rule_name in rule_names[1:]:
+            if len(spine_results[-1].children) != 1:
+                raise Error(msg=f'unexpected result shape for {rule_name}')
+            spine_results.append(spine_results[-1].children[0])
+        for rule_name, spine_result in zip(rule_names, spine_results):
+            if spine_result.rule_name != rule_name:
+                raise Error(msg=f'unexpected result shape for {rule_name}')
+        items = spine_results[-1].children
+        lookahead = result.lookahead
+        if lookahead is None or len(lookahead) != len(items):
+            lookahead = self.apply_lookahead(old_tokens).lookahead
+            if lookahead is None or len(lookahead) != len(items):
+                raise Error(msg='result is not the result of tokens')
+
+        prefix = 0
+        limit = min(len(tokens), len(new_tokens))
+        while prefix < limit and tokens[prefix] == new_tokens[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < limit - prefix
+               and tokens[-1-suffix].rule_name == new_tokens[-1-suffix].rule_name
+               and tokens[-1-suffix].value == new_tokens[-1-suffix].value):
+            suffix += 1
+        delta = len(new_tokens) - len(tokens)
+        bounds = [0]
+        for item in items:
+            bounds.append(bounds[-1] + sum(1 for _ in _tokens(item)))
+        resync = {
+            bound + delta: index
+            for index, bound in enumerate(bounds)
+            if bound >= len(tokens) - suffix
+        }
+
+        # items are parsed independently of the ones before them, so every item
+        # whose parse, and that of the items before it, only looked at tokens
+        # before the change parses the same after it
+        restart = bisect.bisect_right(lookahead, prefix)
+        parsed: MutableSequence[Result] = []
+        new_lookahead = array('q', lookahead[:restart])
+        index = bounds[restart]
+        left = [len(new_tokens) + 1]
+        state = processor.State(
+            self, _ExaminedTokenStream(new_tokens[index:], examined=left))
+        furthest = new_lookahead[-1] if new_lookahead else 0
+        while index not in resync:
+            if isinstance(repetition, stream.UntilEmpty):
+                if state.value.empty:
+                    break
+                item_and_state = self.apply_rule_name_to_state(
+                    item_rule_name, state)
+            else:
+                try:
+                    item_and_state = self.apply_rule_name_to_state(
+                        item_rule_name, state)
+                except processor.Error:
+                    break
+            parsed.append(item_and_state.result)
+            furthest = max(furthest, len(new_tokens) - left[0] + 1)
+            new_lookahead.append(furthest)
+            left[0] = len(new_tokens) + 1
+            state = item_and_state.state
+            if len(new_tokens) - len(state.value) == index:
+                raise Error(msg=f'item {item_rule_name} matched no tokens')
+            index = len(new_tokens) - len(state.value)
+        # parsed items are nested in the spine like apply's, so they're simplified
+        # the same way
+        new_items: MutableSequence[Result] = list(items[:restart])
+        if parsed:
+            parsed_result = _spine_result(rule_names, parsed)
+            for _ in rule_names[1:]:
+                parsed_result = parsed_result.children[0]
+            new_items.extend(parsed_result.children)
+        if index in resync:
+            new_token_iter = iter(new_tokens[index:])
+            for item, reach in zip(items[resync[index]:], lookahead[resync[index]:]):
+                new_items.append(_replace_tokens(item, new_token_iter))
+                # the old lookahead bounds how far the item itself looked, which is
+                # past the change and so shifts with the tokens
+                furthest = max(furthest, reach + delta)
+                new_lookahead.append(furthest)
+        if isinstance(repetition, processor.OneOrMore) and not new_items:
+            raise Error(msg=f'expected at least one {item_rule_name}')
+
+        new_result = processor.Result(
+            value=spine_results[-1].value,
+            rule_name=spine_results[-1].rule_name,
+            children=new_items,
+        )
+        for spine_result in reversed(spine_results[:-1]):
+            new_result = processor.Result(
+                value=spine_result.value,
+                rule_name=spine_result.rule_name,
+                children=[new_result],
+            )
+        return processor.Result(value=new_result.value, rule_name=new_result.rule_name,
+                                children=new_result.children, lookahead=new_lookahead)
+
+
+@dataclass(frozen=True)
+class _ExaminedTokenStream(lexer.TokenStream):
+    '''a token stream that records in examined[0] the fewest tokens left at any
+    point a token, or the end of the stream, was looked at'''
+
+    examined: MutableSequence[int] = field(default_factory=lambda: [0], compare=False, repr=False)
+
+    def _examine(self) -> None:
+        if len(self._items) < self.examined[0]:
+            self.examined[0] = len(self._items)
+
+    @property
+    def empty(self) -> bool:
+        self._examine()
+        return len(self._items) == 0
+
+    @property
+    def head(self) -> 'lexer.Token':
+        self._examine()
+        return super().head
+
+    @property
+    def tail(self) -> '_ExaminedTokenStream':
+        return _ExaminedTokenStream(super().tail.items, examined=self.examined)
+
+
+def _spine_result(rule_names: Sequence[str], items: Sequence[Result]) -> Result:
+    '''the result of the spine of rule_names over the results of its items'''
+    result = processor.Result(children=[item.as_child_result() for item in items])
+    for rule_name in reversed(rule_names):
+        result = result.with_rule_name(rule_name).simplify().as_child_result()
+    return result.children[0]
+
+
+def _tokens(result: Result) -> Iterator[lexer.Token]:
+    if result.value is not None:
+        yield result.value
+    for child in result.children:
+        yield from _tokens(child)
+
+
+def _replace_tokens(result: Result, tokens: Iterator[lexer.Token]) -> Result:
+    '''replace the tokens in result in order, reusing unchanged subtrees'''
+    value = result.value
+    if value is not None:
+        value = next(tokens)
+    children = [_replace_tokens(child, tokens) for child in result.children]
+    if value is result.value and all(
+            child is old_child for child, old_child in zip(children, result.children)):
+        return result
+    return processor.Result(value=value, rule_name=result.rule_name, children=children)
 
 
 @dataclass(frozen=True)
@@ -71,39 +416,44 @@ class Ref(Rule):
     def __str__(self) -> str:
         return self.rule_name
 
+    def _apply_token(self, state: State) -> lexer.Token:
+        if state.value.empty:
+            raise RuleError(
+                rule=self,
+                state=state,
+                msg=f'failed to match parser literal {self}: empty stream',
+            )
+        if state.value.head.rule_name != self.rule_name:
+            raise RuleError(
+                rule=self,
+                state=state,
+                msg=f'failed to match parser literal {self}',
+            )
+        return state.value.head
+
     def apply(self, state: State) -> ResultAndState:
         assert isinstance(state.processor, Parser)
-        lexer_rules = state.processor.lexer.lexer_rules()
-        if self.rule_name in lexer_rules:
-            if state.value.empty:
-                raise RuleError(
-                    rule=self,
-                    state=state,
-                    msg=f'failed to match parser literal {self}: empty stream',
-                )
-            if state.value.head.rule_name != self.rule_name:
-                raise RuleError(
-                    rule=self,
-                    state=state,
-                    msg=f'failed to match parser literal {self}',
-                )
-            return ResultAndState(
-                Result(value=state.value.head),
+        if self.rule_name in state.processor.lexer.lexer_rules():
+            return processor.ResultAndState(
+                processor.Result(value=self._apply_token(state)),
                 state.with_value(state.value.tail))
         return state.processor.apply_rule_name_to_state(self.rule_name, state).as_child_result()
 
+    def apply_events(self, state: State, events: Events) -> State:
+        assert isinstance(state.processor, Parser)
+        if self.rule_name in state.processor.lexer.lexer_rules():
+            events.value(self._apply_token(state))
+            return state.with_value(state.value.tail)
+        return state.processor.apply_rule_name_to_state_events(self.rule_name, state, events)
 
-@dataclass(frozen=True)
-class Any(Rule):  # pylint: disable=duplicate-code
-    '''rule for matching any token'''
-
-    def __str__(self) -> str:
-        return '.'
-
-    def apply(self, state: State) -> ResultAndState:
-        if state.value.empty:
-            raise RuleError(rule=self, state=state, msg='empty stream')
-        return ResultAndState(Result(value=state.value.head), state.with_value(state.value.tail))
+    def match(self, state: State) -> Optional[State]:
+        assert isinstance(state.processor, Parser)
+        if self.rule_name in state.processor.lexer.lexer_rules():
+            if state.value.empty or state.value.head.rule_name != self.rule_name:
+                return None
+            return state.with_value(state.value.tail)
+        return state.processor.match_rule_name_to_state(self.rule_name, state)
 
 
 UntilEmpty = stream.UntilEmpty[lexer.Token, lexer.TokenStream]
+Any = stream.Any[lexer.Token, lexer.TokenStream]
@@ -2,8 +2,11 @@
 
 import collections
 import string
-from typing import Tuple
-from core import lexer, parser, processor_test
+import threading
+from typing import Callable, Iterator, Optional, Tuple
+import unittest
+from unittest import mock
+from core import lexer, loader, parser, processor, processor_test
 
 
 class ParserTest(processor_test.ProcessorTestCase[lexer.Token, lexer.TokenStream]):
@@ -62,3 +65,479 @@ class ParserTest(processor_test.ProcessorTestCase[lexer.Token, lexer.TokenStream
                 actual_result = self.processor.apply(input_str)
                 self.assertEqual(expected_result, actual_result,
                                  f'{expected_result} != {actual_result}')
+
+    def test_apply_bytes(self):
+        '''tests for parser.Parser.apply_bytes'''
+        for input_str in list[str](['a', 'a b c', 'ab\n cd']):
+            with self.subTest(input_str=input_str):
+                self.assertEqual(
+                    self.processor.apply(input_str),
+                    self.processor.apply_bytes(input_str.encode()),
+                )
+
+
+class ReparseTest(unittest.TestCase):
+    '''tests for parser.Parser.reparse'''
+
+    @property
+    def parser(self) -> parser.Parser:
+        '''a parser for a list of assignments'''
+        return parser.Parser(
+            'root',
+            {
+                'root': parser.UntilEmpty(parser.Ref('line')),
+                'line': parser.And([
+                    parser.Ref('id'),
+                    parser.Ref('='),
+                    parser.Ref('value'),
+                    parser.Ref(';'),
+                ]),
+                'value': parser.Or([parser.Ref('id'), parser.Ref('int')]),
+            },
+            lexer.Lexer(collections.OrderedDict({
+                '_ws': lexer.Class.whitespace(),
+                'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+                'int': lexer.OneOrMore(lexer.Class(string.digits)),
+                '=': lexer.Literal('='),
+                ';': lexer.Literal(';'),
+            }))
+        )
+
+    def test_reparse(self):
+        '''reparse matches parsing the edited text from scratch'''
+        input_str = 'a = 1;\nb = c;\nd = 2;\ne = f;'
+        for edit in list[lexer.Edit]([
+            lexer.Edit(4, 1, '3'),
+            lexer.Edit(0, 0, 'x = y; '),
+            lexer.Edit(7, 7, ''),
+            lexer.Edit(11, 1, 'ghi'),
+            lexer.Edit(len(input_str), 0, '\ng = 4;'),
+            lexer.Edit(13, 0, '\n\n'),
+        ]):
+            with self.subTest(edit=edit):
+                tokens = self.parser.lexer.apply(input_str)
+                result = self.parser.apply_root_to_state_value(tokens)
+                new_tokens = self.parser.lexer.relex(input_str, tokens, edit)
+                self.assertEqual(
+                    self.parser.apply(edit.apply(input_str)),
+                    self.parser.reparse(result, tokens, new_tokens),
+                )
+
+    def test_reparse_reuses_items(self):
+        '''items outside the edit are reused'''
+        input_str = 'a = 1;\nb = c;\nd = 2;\ne = f;'
+        tokens = self.parser.lexer.apply(input_str)
+        result = self.parser.apply_root_to_state_value(tokens)
+        new_tokens = self.parser.lexer.relex(
+            input_str, tokens, lexer.Edit(18, 1, '5'))
+        new_result = self.parser.reparse(result, tokens, new_tokens)
+        self.assertIs(result.children[0], new_result.children[0])
+        self.assertIs(result.children[3], new_result.children[3])
+
+    def test_reparse_lookahead(self):
+        '''items whose parse looked ahead past the change are re-parsed'''
+        parser_ = loader.load_parser(r'''
+            x = "x";
+            y = "y";
+            z = "z";
+            _ws = "\w+";
+            root => item!;
+            item => long | x | y | z;
+            long => x y y y z;
+        ''')
+        input_str = 'x y y y'
+        tokens = parser_.lexer.apply(input_str)
+        result = parser_.apply_root_to_state_value(tokens)
+        self.assertEqual(len(result.children), 4)
+        edit = lexer.Edit(len(input_str), 0, ' z')
+        new_tokens = parser_.lexer.relex(input_str, tokens, edit)
+        self.assertEqual(
+            parser_.reparse(result, tokens, new_tokens),
+            parser_.apply(edit.apply(input_str)),
+        )
+
+    def test_reparse_chained(self):
+        '''reparsing reparsed results matches parsing from scratch'''
+        input_str = 'a = 1;\nb = c;\nd = 2;\ne = f;'
+        tokens = self.parser.lexer.apply(input_str, lookahead=True)
+        result = self.parser.apply_lookahead(tokens)
+        self.assertEqual(result, self.parser.apply(input_str))
+        for edit in list[lexer.Edit]([
+            lexer.Edit(4, 1, '3'),
+            lexer.Edit(0, 0, 'x = y; '),
+            lexer.Edit(14, 7, ''),
+            lexer.Edit(25, 1, 'ghi'),
+        ]):
+            with self.subTest(edit=edit):
+                new_tokens = self.parser.lexer.relex(input_str, tokens, edit)
+                result = self.parser.reparse(result, tokens, new_tokens)
+                input_str, tokens = edit.apply(input_str), new_tokens
+                self.assertEqual(result, self.parser.apply(input_str))
+                self.assertEqual(result.lookahead,
+                                 self.parser.apply_lookahead(tokens).lookahead)
+
+    def test_reparse_skips_prefix(self):
+        '''items before the change aren't parsed again'''
+        input_str = 'a = 1;\nb = c;\nd = 2;\ne = f;'
+        tokens = self.parser.lexer.apply(input_str, lookahead=True)
+        result = self.parser.apply_lookahead(tokens)
+        new_tokens = self.parser.lexer.relex(input_str, tokens, lexer.Edit(25, 1, 'g'))
+        apply_rule_name_to_state = self.parser.apply_rule_name_to_state
+        with mock.patch.object(parser.Parser, 'apply_rule_name_to_state',
+                               side_effect=apply_rule_name_to_state) as apply:
+            new_result = self.parser.reparse(result, tokens, new_tokens)
+        self.assertEqual(new_result, self.parser.apply(input_str[:25] + 'g;'))
+        self.assertEqual([call.args[0] for call in apply.call_args_list].count('line'), 1)
+
+    def test_reparse_nested_spine(self):
+        '''re-parsed items are simplified as they are in a full parse'''
+        parser_ = loader.load_parser(r'''
+            id = "[a-z]+";
+            _ws = "\w+";
+            root => block;
+            block => line+;
+            line => id "(" (id ("," id)*)? ")" ";";
+        ''')
+        input_str = 'f(a, b);\ng(c, d);'
+        tokens = parser_.lexer.apply(input_str)
+        edit = lexer.Edit(len(input_str) - 3, 1, 'e')
+        self.assertEqual(
+            parser_.reparse(parser_.apply(input_str), tokens,
+                            parser_.lexer.relex(input_str, tokens, edit)),
+            parser_.apply(edit.apply(input_str)),
+        )
+
+    def test_reparse_fail(self):
+        '''reparse fails like a full parse when the edit breaks the grammar'''
+        input_str = 'a = 1;\nb = c;'
+        tokens = self.parser.lexer.apply(input_str)
+        result = self.parser.apply_root_to_state_value(tokens)
+        new_tokens = self.parser.lexer.relex(
+            input_str, tokens, lexer.Edit(5, 1, ''))
+        with self.assertRaises(parser.Error):
+            self.parser.reparse(result, tokens, new_tokens)
+
+
+class _RecordingHandler(parser.Handler):
+    def __init__(self):
+        self.events: list[Tuple[str, object]] = []
+
+    def enter(self, rule_name: str, position: Optional[lexer.Position]) -> None:
+        self.events.append(('enter', rule_name))
+
+    def token(self, token: lexer.Token) -> None:
+        self.events.append(('token', token))
+
+    def exit(self, rule_name: str) -> None:
+        self.events.append(('exit', rule_name))
+
+
+def _result_events(result: parser.Result) -> Iterator[Tuple[str, object]]:
+    if result.rule_name is not None:
+        yield 'enter', result.rule_name
+    if result.value is not None:
+        yield 'token', result.value
+    for child in result.children:
+        yield from _result_events(child)
+    if result.rule_name is not None:
+        yield 'exit', result.rule_name
+
+
+class ApplyEventsTest(unittest.TestCase):
+    '''tests for parser.Parser.apply_events'''
+
+    @property
+    def parser(self) -> parser.Parser:
+        '''a parser with alternatives that share a prefix'''
+        return parser.Parser(
+            'root',
+            {
+                'root': parser.UntilEmpty(parser.Ref('stmt')),
+                'stmt': parser.Or([parser.Ref('call'), parser.Ref('assign')]),
+                'call': parser.And([
+                    parser.Ref('name'),
+                    parser.Ref('('),
+                    parser.ZeroOrOne(parser.Ref('args')),
+                    parser.Ref(')'),
+                    parser.Ref(';'),
+                ]),
+                'args': parser.And([
+                    parser.Ref('name'),
+                    parser.ZeroOrMore(parser.And([parser.Ref(','), parser.Ref('name')])),
+                ]),
+                'assign': parser.And([
+                    parser.Ref('name'),
+                    parser.Ref('='),
+                    parser.Any(),
+                    parser.Ref(';'),
+                ]),
+                'name': parser.Ref('id'),
+            },
+            lexer.Lexer(collections.OrderedDict({
+                '_ws': lexer.Class.whitespace(),
+                'id': lexer.OneOrMore(lexer.Class(string.ascii_letters)),
+                **{char: lexer.Literal(char) for char in '(),=;'},
+            }))
+        )
+
+    def test_apply_events(self):
+        '''events match the result of apply'''
+        for input_str in list[str]([
+            'a();',
+            'a = b;',
+            'f(a, b, c); x = y; g(z);',
+        ]):
+            with self.subTest(input_str=input_str):
+                handler = _RecordingHandler()
+                self.parser.apply_events(input_str, handler)
+                self.assertEqual(
+                    handler.events,
+                    list(_result_events(self.parser.apply(input_str))),
+                )
+
+    def test_apply_events_position(self):
+        '''enter reports the position of the first token of a rule'''
+        positions = []
+
+        class Handler(_RecordingHandler):
+            '''records enter positions'''
+
+            def enter(self, rule_name: str, position: Optional[lexer.Position]) -> None:
+                positions.append((rule_name, position))
+
+        self.parser.apply_events('a();\n b = c;', Handler())
+        self.assertEqual(positions[-2:], [
+            ('assign', lexer.Position(1, 1)),
+            ('name', lexer.Position(1, 1)),
+        ])
+
+    def test_apply_events_commits(self):
+        '''committed statements are delivered before a later failure'''
+        handler = _RecordingHandler()
+        with self.assertRaises(parser.Error):
+            self.parser.apply_events('a = b; c', handler)
+        self.assertEqual(
+            handler.events,
+            list(_result_events(self.parser.apply('a = b;')))[:-1]
+            + [('enter', 'stmt')],
+        )
+
+    def test_recognize(self):
+        '''recognize returns how far the grammar matches'''
+        for input_str, expected in list[Tuple[str, Optional[int]]]([
+            ('a();', 4),
+            ('f(a, b);\n x = y;', 16),
+            ('a(); b', None),
+            ('a', None),
+            ('a!', None),
+        ]):
+            with self.subTest(input_str=input_str, expected=expected):
+                self.assertEqual(self.parser.recognize(input_str), expected)
+
+
+class LeftRecursionTest(unittest.TestCase):
+    '''tests for left recursive grammars'''
+
+    @staticmethod
+    def _eval(result: parser.Result) -> int:
+        '''evaluate a sum result, following its tree structure'''
+        lhs = result.skip().where(parser.Result.rule_name_is('sum'))
+        values = result.all_values()
+        if not lhs.children:
+            return int(values[0].value)
+        operator, rhs = values[-2:]
+        if operator.value == '+':
+            return LeftRecursionTest._eval(lhs.children[0]) + int(rhs.value)
+        return LeftRecursionTest._eval(lhs.children[0]) - int(rhs.value)
+
+    def test_direct(self):
+        '''left recursive rules parse left associatively'''
+        parser_ = loader.load_parser(r'''
+            int = "[0-9]+";
+            _ws = "\w+";
+            sum => (sum "+" int) | (sum "-" int) | int;
+        ''')
+        for input_str, expected in list[Tuple[str, int]]([
+            ('1', 1),
+            ('1 - 2', -1),
+            ('1 - 2 + 3', 2),
+            ('10 - 2 - 3 - 4', 1),
+        ]):
+            with self.subTest(input_str=input_str, expected=expected):
+                self.assertEqual(self._eval(parser_.apply(input_str)), expected)
+                self.assertEqual(parser_.recognize(input_str), len(input_str))
+
+    def test_indirect(self):
+        '''rules that are left recursive through other rules grow together'''
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            a => (b "x") | "y";
+            b => a "z";
+        ''')
+        result = parser_.apply('y z x z x')
+        self.assertEqual(len(result['a']), 1)
+        self.assertEqual(len(result['b']), 1)
+        self.assertEqual([token.value for token in result.all_values()],
+                         ['y', 'z', 'x', 'z', 'x'])
+        self.assertEqual(parser_.recognize('y z x z'), 6)
+
+    def test_memoized(self):
+        '''memoized parses reuse results without reusing ones built from a seed'''
+        parser_ = loader.load_parser(r'''
+            int = "[0-9]+";
+            _ws = "\w+";
+            expr => (sum ";") | (sum "!") | sum;
+            sum => (sum "+" int) | (sum "-" int) | int;
+        ''')
+        for input_str in ['1', '1 - 2 + 3 !', '10 - 2 - 3 - 4;', '1 + 2 +']:
+            with self.subTest(input_str=input_str):
+                tokens = parser_.lexer.apply(input_str)
+                self.assertEqual(parser_.apply_root_to_state_value_memoized(tokens),
+                                 parser_.apply_root_to_state_value(tokens))
+
+    def test_events(self):
+        '''left recursion is an error in events mode'''
+        parser_ = loader.load_parser(r'''
+            _ws = "\w+";
+            a => (a "x") | "y";
+        ''')
+        with self.assertRaises(parser.Error):
+            parser_.apply_events('y x', _RecordingHandler())
+
+
+class PrecedenceTest(unittest.TestCase):
+    '''tests for parser.Precedence'''
+
+    @property
+    def expr_parser(self) -> parser.Parser:
+        '''a parser for arithmetic with right associative exponents'''
+        return loader.load_parser(r'''
+            int = "[0-9]+";
+            _ws = "\w+";
+            expr => operand % "+" "-" | "*" "/" | right "^";
+            operand => int | ("(" expr ")");
+        ''')
+
+    @staticmethod
+    def _eval(result: parser.Result) -> int:
+        '''evaluate an expr result, following its tree structure'''
+        if result.rule_name == 'expr' and len(result.children) == 3:
+            lhs, operator, rhs = result.children
+            assert operator.value
+            return {
+                '+': int.__add__,
+                '-': int.__sub__,
+                '*': int.__mul__,
+                '/': int.__floordiv__,
+                '^': int.__pow__,
+            }[operator.value.value](PrecedenceTest._eval(lhs), PrecedenceTest._eval(rhs))
+        if 'expr' in result.skip():
+            return PrecedenceTest._eval(result.skip()['expr', 1])
+        return int(result.all_values()[0].value)
+
+    def test_apply(self):
+        '''operators bind by precedence and associativity'''
+        for input_str, expected in list[Tuple[str, int]]([
+            ('1', 1),
+            ('1 + 2', 3),
+            ('1 + 2 * 3', 7),
+            ('2 * 3 + 1', 7),
+            ('10 - 2 - 3', 5),
+            ('2 ^ 3 ^ 2', 512),
+            ('(1 + 2) * 3', 9),
+            ('1 + 2 * 3 ^ 2 - 8 / 4', 17),
+        ]):
+            with self.subTest(input_str=input_str, expected=expected):
+                self.assertEqual(self._eval(self.expr_parser.apply(input_str)), expected)
+                self.assertEqual(self.expr_parser.recognize(input_str), len(input_str))
+
+    def test_trailing_operator(self):
+        '''an operator without a rhs is left unconsumed'''
+        self.assertEqual(self.expr_parser.recognize('1 + 2 *'), 6)
+        self.assertEqual(self._eval(self.expr_parser.apply('1 + 2 *')), 3)
+
+    def test_operator_applied_once(self):
+        '''each operator is applied once where it's found'''
+        parser_ = parser.Parser(
+            'expr',
+            {
+                'expr': parser.Precedence(
+                    parser.Ref('int'),
+                    [parser.Precedence.Operator(parser.Ref('plus'), 1)],
+                    'expr',
+                ),
+                'plus': parser.Ref('+'),
+            },
+            lexer.Lexer(collections.OrderedDict({
+                '_ws': lexer.Class.whitespace(),
+                'int': lexer.OneOrMore(lexer.Class(string.digits)),
+                '+': lexer.Literal('+'),
+            })),
+        )
+        with mock.patch.object(
+                parser.Parser, 'apply_rule_name_to_state', autospec=True,
+                side_effect=parser.Parser.apply_rule_name_to_state) as apply, \
+            mock.patch.object(
+                parser.Parser, 'match_rule_name_to_state', autospec=True,
+                side_effect=parser.Parser.match_rule_name_to_state) as match:
+            parser_.apply('1 + 2 + 3')
+        self.assertEqual(
+            [call.args[1] for call in apply.call_args_list + match.call_args_list],
+            ['expr', 'plus', 'plus', 'plus'])
+
+
+class BudgetTest(unittest.TestCase):
+    '''tests for parsing with a processor.Budget'''
+
+    @property
+    def backtracking_parser(self) -> parser.Parser:
+        '''a parser that backtracks exponentially on runs of a'''
+        return loader.load_parser(r'''
+            _ws = "\w+";
+            x => (y "b") | (y "a") | y;
+            y => ("a" x) | "a";
+        ''')
+
+    def test_max_applications(self):
+        '''the parse stops after the allowed rule applications'''
+        parser_ = self.backtracking_parser
+        with self.assertRaises(processor.BudgetExceeded) as context:
+            parser_.apply(' '.join(['a'] * 20), processor.Budget(max_applications=100))
+        self.assertEqual(context.exception.applications, 101)
+        self.assertEqual(context.exception.msg, 'rule application budget exceeded')
+        self.assertIsInstance(context.exception.furthest, lexer.TokenStream)
+
+    def test_timeout(self):
+        '''the parse stops once it runs out of time'''
+        parser_ = self.backtracking_parser
+        with self.assertRaises(processor.BudgetExceeded) as context:
+            parser_.apply(' '.join(['a'] * 20), processor.Budget(timeout=0.01))
+        self.assertEqual(context.exception.msg, 'time budget exceeded')
+        self.assertGreaterEqual(context.exception.elapsed, 0.01)
+
+    def test_cancel(self):
+        '''the parse stops soon after it's cancelled, in every mode'''
+        parser_ = self.backtracking_parser
+        cancel = threading.Event()
+        cancel.set()
+        input_str = ' '.join(['a'] * 20)
+        for name, parse in list[Tuple[str, Callable[[processor.Budget], object]]]([
+            ('apply', lambda budget: parser_.apply(input_str, budget)),
+            ('recognize', lambda budget: parser_.recognize(input_str, budget)),
+            ('apply_events',
+             lambda budget: parser_.apply_events(input_str, _RecordingHandler(), budget)),
+        ]):
+            with self.subTest(name=name):
+                with self.assertRaises(processor.BudgetExceeded) as context:
+                    parse(processor.Budget(cancel=cancel))
+                self.assertEqual(context.exception.msg, 'cancelled')
+                self.assertEqual(context.exception.applications,
+                                 processor.Budget.CHECK_INTERVAL)
+
+    def test_within_budget(self):
+        '''a parse within its budget gives the same result'''
+        parser_ = self.backtracking_parser
+        self.assertEqual(
+            parser_.apply('a a b', processor.Budget(
+                max_applications=1000, timeout=60, cancel=threading.Event())),
+            parser_.apply('a a b'))
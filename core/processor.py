@@ -1,7 +1,16 @@
-'''generic rule-based processor'''
+'''generic rule-based processor'''  # pylint: disable=too-many-lines
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from dataclasses import (
+    FrozenInstanceError,
+    dataclass,
+    field,
+    fields as dataclass_fields,
+    is_dataclass,
+    replace,
+)
+import threading
+import time
 from typing import (
     Any,
     Callable,
@@ -10,9 +19,11 @@ from typing import (
     Iterable,
     Iterator,
     Mapping,
+    MutableMapping,
     MutableSequence,
     Optional,
     Sequence,
+    Set,
     Sized,
     Tuple,
     Type,
@@ -29,6 +40,27 @@ def _repr(class_name: str, **fields: Any) -> str:
 
 _ResultValue = TypeVar('_ResultValue')
 _StateValue = TypeVar('_StateValue')
+_T = TypeVar('_T')
+
+
+def _frozen_slots(cls: Type[_T]) -> Type[_T]:
+    '''make assigning or deleting attributes of a frozen slotted dataclass raise FrozenInstanceError
+
+    The methods dataclass generates refer to the class it replaces when adding
+    slots, so for generic classes they raise TypeError when a generic alias
+    like Result[int]() tries to set __orig_class__, which typing only ignores
+    if it's an AttributeError.
+    '''
+
+    def __setattr__(self: Any, name: str, _: Any) -> None:
+        raise FrozenInstanceError(f'cannot assign to field {name!r}')
+
+    def __delattr__(self: Any, name: str) -> None:
+        raise FrozenInstanceError(f'cannot delete field {name!r}')
+
+    setattr(cls, '__setattr__', __setattr__)
+    setattr(cls, '__delattr__', __delattr__)
+    return cls
 
 
 class AbstractError(Exception, ABC):
@@ -135,14 +167,31 @@ class RuleError(StateError[_ResultValue, _StateValue]):
 
 
 @final
-@dataclass(frozen=True, repr=False)
+@_frozen_slots
+@dataclass(frozen=True, repr=False, slots=True, init=False)
 class Result(Generic[_ResultValue], Iterable['Result[_ResultValue]'], Sized):
     '''a container for nested processor results'''
 
     value: Optional[_ResultValue] = field(default=None, kw_only=True)
     rule_name: Optional[str] = field(kw_only=True, default=None)
-    children: Sequence['Result[_ResultValue]'] = field(
-        kw_only=True, default_factory=lambda: list[Result[_ResultValue]]())  # pylint: disable=unnecessary-lambda
+    children: Sequence['Result[_ResultValue]'] = field(kw_only=True, default_factory=list)
+    lookahead: Optional[Sequence[int]] = field(default=None, kw_only=True, compare=False)
+    '''if known, for each item of the repetition a parser's root reaches, the number of
+    input items up to the furthest one examined while parsing it or any item before it.
+    parser.Parser.reparse uses it to tell which items an edit might change.'''
+
+    def __init__(
+        self,
+        *,
+        value: Optional[_ResultValue] = None,
+        rule_name: Optional[str] = None,
+        children: Optional[Sequence['Result[_ResultValue]']] = None,
+        lookahead: Optional[Sequence[int]] = None,
+    ) -> None:
+        _set_result_value(self, value)
+        _set_result_rule_name(self, rule_name)
+        _set_result_children(self, [] if children is None else children)
+        _set_result_lookahead(self, lookahead)
 
     def __repr__(self) -> str:
         return _repr(
@@ -168,11 +217,11 @@ class Result(Generic[_ResultValue], Iterable['Result[_ResultValue]'], Sized):
 
     def with_rule_name(self, rule_name: str) -> 'Result[_ResultValue]':
         '''annotate this Result with a rule_name'''
-        return Result[_ResultValue](value=self.value, rule_name=rule_name, children=self.children)
+        return Result(value=self.value, rule_name=rule_name, children=self.children)
 
     def as_child_result(self) -> 'Result[_ResultValue]':
         '''nest this result in another result, allowing it to be annotated'''
-        return Result[_ResultValue](children=[self])
+        return Result(children=[self])
 
     def empty(self) -> bool:
         '''is this a trivial result'''
@@ -184,7 +233,7 @@ class Result(Generic[_ResultValue], Iterable['Result[_ResultValue]'], Sized):
         '''remove trivial results from this result'''
         if self.value is None and self.rule_name is None and len(self.children) == 1:
             return self.children[0]
-        return Result[_ResultValue](
+        return Result(
             value=self.value,
             rule_name=self.rule_name,
             children=[child.simplify() for child in self.children if not child.empty()])
@@ -195,7 +244,7 @@ class Result(Generic[_ResultValue], Iterable['Result[_ResultValue]'], Sized):
         child_results: MutableSequence[Result[_ResultValue]] = []
         for result in results:
             child_results.extend(result.children)
-        return Result[_ResultValue](children=child_results)
+        return Result(children=child_results)
 
     def where(self, cond: Callable[['Result[_ResultValue]'], bool]) -> 'Result[_ResultValue]':
         '''return the set of results in this result that match cond'''
@@ -260,7 +309,7 @@ class Result(Generic[_ResultValue], Iterable['Result[_ResultValue]'], Sized):
 
     def skip(self) -> 'Result[_ResultValue]':
         '''skip the current result and only consider its children'''
-        return Result[_ResultValue](children=self.children)
+        return Result(children=self.children)
 
     def __iter__(self) -> Iterator['Result[_ResultValue]']:
         return iter(self.children)
@@ -280,8 +329,136 @@ class Result(Generic[_ResultValue], Iterable['Result[_ResultValue]'], Sized):
         return len(self[rule_name]) > 0
 
 
+# Results, states and their pairs are made for every rule applied, so they set
+# their slots through the slots' descriptors rather than the frozen dataclass's
+# object.__setattr__ calls, which cost more than the rest of construction.
+_set_result_value = vars(Result)['value'].__set__
+_set_result_rule_name = vars(Result)['rule_name'].__set__
+_set_result_children = vars(Result)['children'].__set__
+_set_result_lookahead = vars(Result)['lookahead'].__set__
+
+
+@dataclass(frozen=True)
+class Budget:
+    '''limits on the work one parse may do
+
+    Rule applications are counted as each named rule is applied. The clock and
+    cancel are only checked every CHECK_INTERVAL applications, so a parse may
+    run slightly past its timeout or cancellation.
+    '''
+
+    CHECK_INTERVAL = 256
+
+    max_applications: Optional[int] = None
+    '''the most named rule applications the parse may make'''
+
+    timeout: Optional[float] = None
+    '''the most seconds the parse may run for'''
+
+    cancel: Optional[threading.Event] = None
+    '''stops the parse once set, from any thread'''
+
+
+@dataclass(frozen=True, kw_only=True)
+class BudgetExceeded(AbstractError):
+    '''a parse ran out of its budget or was cancelled
+
+    This isn't an Error, so rules that backtrack on errors don't catch it and
+    the parse stops as soon as it's raised.
+    '''
+
+    msg: str
+    applications: int
+    '''the named rule applications made'''
+
+    elapsed: float
+    '''the seconds the parse ran for'''
+
+    furthest: Any
+    '''the furthest state value any rule was applied at'''
+
+    def __str__(self) -> str:
+        return (f'{self.msg} after {self.applications} rule applications '
+                f'in {self.elapsed:.3f}s, furthest at {self.furthest}')
+
+    def with_rule_name(self, rule_name: str) -> 'BudgetExceeded':
+        return self
+
+    @property
+    def empty(self) -> bool:
+        return False
+
+
+class _Spend:  # pylint: disable=too-few-public-methods
+    '''the work done so far against a budget'''
+
+    def __init__(self, budget: Budget) -> None:
+        self.budget = budget
+        self.applications = 0
+        self.started = time.monotonic()
+        self.deadline = None if budget.timeout is None else self.started + budget.timeout
+        self.furthest: Any = None
+        self.furthest_position: Any = None
+
+    def charge(self, state_value: Any, position: Any) -> None:
+        '''count a rule application at state_value, raising if the budget is spent'''
+        self.applications += 1
+        if self.furthest_position is None or position > self.furthest_position:
+            self.furthest = state_value
+            self.furthest_position = position
+        budget = self.budget
+        if budget.max_applications is not None and self.applications > budget.max_applications:
+            self._exceeded('rule application budget exceeded')
+        if self.applications % Budget.CHECK_INTERVAL == 0:
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                self._exceeded('time budget exceeded')
+            if budget.cancel is not None and budget.cancel.is_set():
+                self._exceeded('cancelled')
+
+    def _exceeded(self, msg: str) -> None:
+        raise BudgetExceeded(
+            msg=msg,
+            applications=self.applications,
+            elapsed=time.monotonic() - self.started,
+            furthest=self.furthest,
+        )
+
+
+class _LeftRecursion:  # pylint: disable=too-few-public-methods
+    '''the rules being applied during one parse, keyed by rule name and position
+
+    A rule that is applied again at the same position before it returns is left
+    recursive. The inner application gets the seed, the best result so far,
+    and the rule is reapplied while that lets it consume more input.
+
+    If results is set the parse is memoized: each rule's result or error at a
+    position is kept and reused, unless it depended on a seed that was still
+    growing. If spend is set every rule application is charged to it.
+    '''
+
+    def __init__(self, memoize: bool = False, budget: Optional[Budget] = None) -> None:
+        self.seeds: MutableMapping[Tuple[str, Any], Any] = {}
+        self.recursive: Set[Tuple[str, Any]] = set()
+        self.unsupported: Optional[str] = None
+        self.results: Optional[MutableMapping[Tuple[str, Any], Any]] = {} if memoize else None
+        self.spend = None if budget is None else _Spend(budget)
+
+
+def _position(state_value: Any) -> Any:
+    '''how far into its input state_value is
+
+    Streams get shorter as they're consumed, other state values are assumed to
+    grow.
+    '''
+    try:
+        return -len(state_value)
+    except TypeError:
+        return state_value
+
+
 @final
-@dataclass(frozen=True, repr=False)
+@_frozen_slots
+@dataclass(frozen=True, repr=False, slots=True, init=False)
 class State(Generic[_ResultValue, _StateValue]):
     '''state container for processor
 
@@ -291,6 +468,17 @@ class State(Generic[_ResultValue, _StateValue]):
 
     processor: 'Processor[_ResultValue,_StateValue]'
     value: _StateValue
+    left_recursion: Optional[_LeftRecursion] = field(default=None, compare=False)
+
+    def __init__(
+        self,
+        processor: 'Processor[_ResultValue,_StateValue]',
+        value: _StateValue,
+        left_recursion: Optional[_LeftRecursion] = None,
+    ) -> None:
+        _set_state_processor(self, processor)
+        _set_state_value(self, value)
+        _set_state_left_recursion(self, left_recursion)
 
     def __repr__(self) -> str:
         return _repr(self.__class__.__name__, value=self.value)
@@ -301,11 +489,23 @@ class State(Generic[_ResultValue, _StateValue]):
         This is useful for returning a changed state from a rule without having
         to explicitly copy the processor pointer.
         '''
-        return State[_ResultValue, _StateValue](self.processor, value)
+        return State(self.processor, value, self.left_recursion)
+
+    def with_left_recursion(self) -> 'State[_ResultValue,_StateValue]':
+        '''this state, tracking left recursion for a new parse if it isn't already'''
+        if self.left_recursion is not None:
+            return self
+        return State(self.processor, self.value, _LeftRecursion())
+
+
+_set_state_processor = vars(State)['processor'].__set__
+_set_state_value = vars(State)['value'].__set__
+_set_state_left_recursion = vars(State)['left_recursion'].__set__
 
 
 @final
-@dataclass(frozen=True)
+@_frozen_slots
+@dataclass(frozen=True, slots=True, init=False)
 class ResultAndState(Generic[_ResultValue, _StateValue]):
     '''container for returning a result and a new state from a rule
 
@@ -316,20 +516,117 @@ class ResultAndState(Generic[_ResultValue, _StateValue]):
     result: Result[_ResultValue]
     state: State[_ResultValue, _StateValue]
 
+    def __init__(
+        self,
+        result: Result[_ResultValue],
+        state: State[_ResultValue, _StateValue],
+    ) -> None:
+        _set_result_and_state_result(self, result)
+        _set_result_and_state_state(self, state)
+
     def with_rule_name(self, rule_name: str) -> 'ResultAndState[_ResultValue,_StateValue]':
         '''returns a copy of self with the result annotated with a rule_name'''
-        return ResultAndState[_ResultValue, _StateValue](
+        return ResultAndState(
             self.result.with_rule_name(rule_name),
             self.state
         )
 
     def as_child_result(self) -> 'ResultAndState[_ResultValue,_StateValue]':
         '''returns a copy of self with result nested'''
-        return ResultAndState[_ResultValue, _StateValue](self.result.as_child_result(), self.state)
+        return ResultAndState(self.result.as_child_result(), self.state)
 
     def simplify(self) -> 'ResultAndState[_ResultValue,_StateValue]':
         '''returns a copy of self with result simplified'''
-        return ResultAndState[_ResultValue, _StateValue](self.result.simplify(), self.state)
+        return ResultAndState(self.result.simplify(), self.state)
+
+
+_set_result_and_state_result = vars(ResultAndState)['result'].__set__
+_set_result_and_state_state = vars(ResultAndState)['state'].__set__
+
+
+class EventHandler(Generic[_ResultValue, _StateValue], ABC):
+    '''receives the matches of a processor run in events mode'''
+
+    @abstractmethod
+    def enter(self, rule_name: str, state_value: _StateValue) -> None:
+        '''a named rule starts matching at state_value'''
+
+    @abstractmethod
+    def value(self, value: _ResultValue) -> None:
+        '''a result value was matched'''
+
+    @abstractmethod
+    def exit(self, rule_name: str) -> None:
+        '''the named rule that was last entered matched'''
+
+
+class Events(Generic[_ResultValue, _StateValue]):
+    '''event sink used by rules in events mode
+
+    Rules that may backtrack open a choice before trying a child and then either
+    commit or roll back to it. Events raised while any choice is open are buffered
+    and only delivered to the handler once the outermost choice commits, so the
+    handler never sees events from a backtracked alternative and only the
+    uncommitted part of the parse is held in memory.
+    '''
+
+    def __init__(self, handler: EventHandler[_ResultValue, _StateValue]):
+        self._handler = handler
+        self._pending: MutableSequence[Tuple[Callable[..., None], Tuple[Any, ...]]] = [
+        ]
+        self._choices = 0
+
+    def _emit(self, method: Callable[..., None], *args: Any) -> None:
+        if self._choices:
+            self._pending.append((method, args))
+        else:
+            method(*args)
+
+    def enter(self, rule_name: str, state_value: _StateValue) -> None:
+        '''report a named rule starting'''
+        self._emit(self._handler.enter, rule_name, state_value)
+
+    def value(self, value: _ResultValue) -> None:
+        '''report a matched value'''
+        self._emit(self._handler.value, value)
+
+    def exit(self, rule_name: str) -> None:
+        '''report a named rule matching'''
+        self._emit(self._handler.exit, rule_name)
+
+    def result(self, result: Result[_ResultValue], state_value: _StateValue) -> None:
+        '''report all the events in an already built result'''
+        if result.rule_name is not None:
+            self.enter(result.rule_name, state_value)
+        if result.value is not None:
+            self.value(result.value)
+        for child in result.children:
+            self.result(child, state_value)
+        if result.rule_name is not None:
+            self.exit(result.rule_name)
+
+    def choice(self) -> int:
+        '''open a choice, returning the mark to commit or roll back to'''
+        self._choices += 1
+        return len(self._pending)
+
+    def commit(self, _mark: int) -> None:
+        '''keep the events since mark, delivering them if no choice is left open'''
+        self._choices -= 1
+        self._flush()
+
+    def rollback(self, mark: int) -> None:
+        '''drop the events since mark'''
+        del self._pending[mark:]
+        self._choices -= 1
+        self._flush()
+
+    def _flush(self) -> None:
+        if not self._choices and self._pending:
+            pending = self._pending
+            self._pending = []
+            for method, args in pending:
+                method(*args)
 
 
 class Rule(Generic[_ResultValue, _StateValue], ABC):  # pylint: disable=too-few-public-methods
@@ -344,6 +641,80 @@ class Rule(Generic[_ResultValue, _StateValue], ABC):  # pylint: disable=too-few-
         with optional value and children and a new state.
         '''
 
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        '''apply this rule, reporting matches to events instead of building a result
+
+        By default this replays the result of apply. Rules that build results
+        override it to report matches as they happen.
+        '''
+        result_and_state = self.apply(state)
+        events.result(result_and_state.result, state.value)
+        return result_and_state.state
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        '''apply this rule only to check if it matches
+
+        Returns the state after the match, or None if the rule doesn't match. By
+        default this falls back to apply; rules override it to match without
+        allocating results or errors.
+        '''
+        try:
+            return self.apply(state).state
+        except Error:
+            return None
+
+
+_Rule = TypeVar('_Rule', bound=Rule)
+_interned_rules: MutableMapping[Tuple[Any, ...], Rule] = {}
+
+
+def intern(rule: _Rule) -> _Rule:
+    '''the canonical instance of rule, shared by all structurally equal rules
+
+    Children are interned first, so each rule is looked up by its type, its own
+    fields and the identities of its children rather than by rehashing its
+    whole subtree. Canonical rules live for the life of the process.
+    '''
+    rule, key = _interned_fields(rule)
+    return _interned_rules.setdefault(key, rule)  # type: ignore
+
+
+def _interned(value: Any) -> Tuple[Any, Any]:
+    '''value with any rules in it interned, and a key for it that holds those
+    rules' identities'''
+    if isinstance(value, Rule):
+        child = intern(value)
+        return child, id(child)
+    if isinstance(value, tuple):
+        items = [_interned(item) for item in value]
+        if any(item is not old for (item, _), old in zip(items, value)):
+            value = tuple(item for item, _ in items)
+        return value, tuple(key for _, key in items)
+    if is_dataclass(value) and not isinstance(value, type):
+        # such as a Precedence.Operator
+        return _interned_fields(value)
+    return value, value
+
+
+def _interned_fields(value: Any) -> Tuple[Any, Tuple[Any, ...]]:
+    '''a dataclass with the rules in its fields interned, and its key'''
+    key: MutableSequence[Any] = [type(value)]
+    changes: MutableMapping[str, Any] = {}
+    for field_ in dataclass_fields(value):
+        old = getattr(value, field_.name)
+        new, field_key = _interned(old)
+        key.append(field_key)
+        if new is not old:
+            changes[field_.name] = new
+    if changes:
+        value = replace(value, **changes)
+    return value, tuple(key)
+
 
 @dataclass(frozen=True)
 class Processor(Generic[_ResultValue, _StateValue]):
@@ -357,25 +728,201 @@ class Processor(Generic[_ResultValue, _StateValue]):
         '''the type of error returned by this processor'''
         return Error
 
-    def apply_rule_name_to_state(
+    def new_state(
         self,
+        state_value: _StateValue,
+        budget: Optional[Budget] = None,
+    ) -> State[_ResultValue, _StateValue]:
+        '''a state to start a parse of state_value from, spending budget if given'''
+        return State(self, state_value, _LeftRecursion(budget=budget))
+
+    def apply_rule_name_to_state(  # pylint: disable=too-many-branches
+        self,
+        rule_name: str,
+        state: State[_ResultValue, _StateValue],
+    ) -> ResultAndState[_ResultValue, _StateValue]:
+        '''applies the rule with the given name to the given state
+
+        Left recursive rules are grown from a failed seed until they stop
+        consuming more input.
+        '''
+        try:
+            if rule_name not in self.rules:
+                raise StateError(msg=f'unknown rule {rule_name}', state=state)
+            rule = self.rules[rule_name]
+            left_recursion = state.left_recursion
+            if left_recursion is None:
+                state = state.with_left_recursion()
+                left_recursion = state.left_recursion
+                assert left_recursion is not None
+            key = (rule_name, _position(state.value))
+            if left_recursion.spend is not None:
+                left_recursion.spend.charge(state.value, key[1])
+            results = left_recursion.results
+            if results is not None and key in results:
+                memoized = results[key]
+                if isinstance(memoized, Error):
+                    raise memoized
+                return memoized
+            if key in left_recursion.seeds:
+                left_recursion.recursive.add(key)
+                seed = left_recursion.seeds[key]
+                if seed is None:
+                    raise StateError(msg=f'left recursion in {rule_name}', state=state)
+                return seed
+            left_recursion.seeds[key] = None
+            try:
+                try:
+                    result_and_state = self._apply_rule(rule_name, rule, state)
+                    while key in left_recursion.recursive:
+                        left_recursion.seeds[key] = result_and_state
+                        try:
+                            grown = self._apply_rule(rule_name, rule, state)
+                        except Error:
+                            break
+                        if _position(grown.state.value) <= _position(
+                                result_and_state.state.value):
+                            break
+                        result_and_state = grown
+                finally:
+                    del left_recursion.seeds[key]
+                    left_recursion.recursive.discard(key)
+            except Error as error:
+                if results is not None and not left_recursion.recursive:
+                    results[key] = error
+                raise
+            if results is not None and not left_recursion.recursive:
+                results[key] = result_and_state
+            return result_and_state
+        except Error as error:
+            error_type = self.error_type()
+            if isinstance(error, error_type):
+                raise
+            raise error_type(children=[error]) from error
+
+    @staticmethod
+    def _apply_rule(
         rule_name: str,
+        rule: Rule[_ResultValue, _StateValue],
         state: State[_ResultValue, _StateValue],
     ) -> ResultAndState[_ResultValue, _StateValue]:
-        '''applies the rule with the given name to the given state'''
+        try:
+            return rule.apply(state).with_rule_name(rule_name).simplify()
+        except Error as error:
+            raise error.with_rule_name(rule_name)
+
+    def match_rule_name_to_state(
+        self,
+        rule_name: str,
+        state: State[_ResultValue, _StateValue],
+    ) -> Optional[State[_ResultValue, _StateValue]]:
+        '''matches the rule with the given name against the given state'''
+        rule = self.rules.get(rule_name)
+        if rule is None:
+            raise self.error_type()(children=[
+                StateError(msg=f'unknown rule {rule_name}', state=state)])
+        state = state.with_left_recursion()
+        left_recursion = state.left_recursion
+        assert left_recursion is not None
+        key = (rule_name, _position(state.value))
+        if left_recursion.spend is not None:
+            left_recursion.spend.charge(state.value, key[1])
+        if key in left_recursion.seeds:
+            left_recursion.recursive.add(key)
+            return left_recursion.seeds[key]
+        left_recursion.seeds[key] = None
+        try:
+            end = rule.match(state)
+            while end is not None and key in left_recursion.recursive:
+                left_recursion.seeds[key] = end
+                grown = rule.match(state)
+                if grown is None or _position(grown.value) <= _position(end.value):
+                    break
+                end = grown
+        finally:
+            del left_recursion.seeds[key]
+            left_recursion.recursive.discard(key)
+        return end
+
+    def match_prefix(
+        self,
+        state_value: _StateValue,
+        budget: Optional[Budget] = None,
+    ) -> Optional[_StateValue]:
+        '''match the root rule against state_value without building results
+
+        Returns the state value after the root rule, or None if it didn't match.
+        '''
+        state = self.match_rule_name_to_state(
+            self.root_rule_name, self.new_state(state_value, budget))
+        return None if state is None else state.value
+
+    def matches(self, state_value: _StateValue, budget: Optional[Budget] = None) -> bool:
+        '''whether the root rule matches state_value'''
+        return self.match_prefix(state_value, budget) is not None
+
+    def apply_rule_name_to_state_events(
+        self,
+        rule_name: str,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        '''applies the rule with the given name to the given state in events mode
+
+        Events are reported as rules match, so left recursive rules can't be
+        regrown. Their recursive application fails, and the parse raises an
+        error once it finishes.
+        '''
         try:
             if rule_name not in self.rules:
                 raise StateError(msg=f'unknown rule {rule_name}', state=state)
+            state = state.with_left_recursion()
+            left_recursion = state.left_recursion
+            assert left_recursion is not None
+            key = (rule_name, _position(state.value))
+            if left_recursion.spend is not None:
+                left_recursion.spend.charge(state.value, key[1])
+            if key in left_recursion.seeds:
+                left_recursion.unsupported = rule_name
+                raise StateError(msg=f'left recursion in {rule_name}', state=state)
+            left_recursion.seeds[key] = None
+            events.enter(rule_name, state.value)
             try:
-                return self.rules[rule_name].apply(state).with_rule_name(rule_name).simplify()
+                state = self.rules[rule_name].apply_events(state, events)
             except Error as error:
                 raise error.with_rule_name(rule_name)
+            finally:
+                del left_recursion.seeds[key]
+            events.exit(rule_name)
+            return state
         except Error as error:
             error_type = self.error_type()
             if isinstance(error, error_type):
                 raise
             raise error_type(children=[error]) from error
 
+    def apply_root_to_state_value_events(
+        self,
+        state_value: _StateValue,
+        handler: EventHandler[_ResultValue, _StateValue],
+        budget: Optional[Budget] = None,
+    ) -> _StateValue:
+        '''applies the root rule to state_value, reporting matches to handler
+
+        No result tree is built. Returns the state value after the root rule.
+        Left recursive grammars are an error in this mode.
+        '''
+        state = self.new_state(state_value, budget)
+        assert state.left_recursion is not None
+        try:
+            return self.apply_rule_name_to_state_events(
+                self.root_rule_name, state, Events[_ResultValue, _StateValue](handler)).value
+        finally:
+            if state.left_recursion.unsupported is not None:
+                raise self.error_type()(
+                    msg=f'left recursion in {state.left_recursion.unsupported} '
+                    'is not supported in events mode')
+
     def apply_root_to_state(
         self,
         state: State[_ResultValue, _StateValue],
@@ -383,10 +930,30 @@ class Processor(Generic[_ResultValue, _StateValue]):
         '''applies the root rule to the given state'''
         return self.apply_rule_name_to_state(self.root_rule_name, state)
 
-    def apply_root_to_state_value(self, state_value: _StateValue) -> Result[_ResultValue]:
-        '''builds a state with the given value and applies the root rule'''
-        return self.apply_root_to_state(
-            State[_ResultValue, _StateValue](self, state_value)).result
+    def apply_root_to_state_value(
+        self,
+        state_value: _StateValue,
+        budget: Optional[Budget] = None,
+    ) -> Result[_ResultValue]:
+        '''builds a state with the given value and applies the root rule
+
+        If a budget is given BudgetExceeded is raised once it's spent.
+        '''
+        return self.apply_root_to_state(self.new_state(state_value, budget)).result
+
+    def apply_root_to_state_value_memoized(
+        self,
+        state_value: _StateValue,
+        budget: Optional[Budget] = None,
+    ) -> Result[_ResultValue]:
+        '''applies the root rule to state_value, applying each rule at most once per position
+
+        This gives the same result as apply_root_to_state_value in time linear in
+        the length of state_value for grammars that backtrack through named rules,
+        at the cost of keeping every rule's result for the whole parse.
+        '''
+        return self.apply_root_to_state(State(
+            self, state_value, _LeftRecursion(memoize=True, budget=budget))).result
 
 
 @dataclass(frozen=True)
@@ -406,6 +973,17 @@ class Ref(Rule[_ResultValue, _StateValue]):
         '''lookup the referrant and apply it to state'''
         return state.processor.apply_rule_name_to_state(self.value, state).as_child_result()
 
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        return state.processor.apply_rule_name_to_state_events(self.value, state, events)
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        return state.processor.match_rule_name_to_state(self.value, state)
+
 
 @dataclass(frozen=True)
 class NaryRule(Rule[_ResultValue, _StateValue]):
@@ -413,6 +991,9 @@ class NaryRule(Rule[_ResultValue, _StateValue]):
 
     children: Sequence[Rule[_ResultValue, _StateValue]]
 
+    def __post_init__(self):
+        object.__setattr__(self, 'children', tuple(self.children))
+
 
 @dataclass(frozen=True)
 class And(NaryRule[_ResultValue, _StateValue]):
@@ -437,11 +1018,37 @@ class And(NaryRule[_ResultValue, _StateValue]):
                     state=state,
                     children=[error],
                 ) from error
-        return ResultAndState[_ResultValue, _StateValue](
-            Result[_ResultValue](children=child_results),
+        return ResultAndState(
+            Result(children=child_results),
             child_state
         )
 
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        child_state = state
+        for child in self.children:
+            try:
+                child_state = child.apply_events(child_state, events)
+            except Error as error:
+                raise RuleError(
+                    rule=self,
+                    state=state,
+                    children=[error],
+                ) from error
+        return child_state
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        for child in self.children:
+            child_state = child.match(state)
+            if child_state is None:
+                return None
+            state = child_state
+        return state
+
 
 @dataclass(frozen=True)
 class Or(NaryRule[_ResultValue, _StateValue]):
@@ -465,6 +1072,36 @@ class Or(NaryRule[_ResultValue, _StateValue]):
             children=child_errors,
         )
 
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        child_errors: MutableSequence[Error] = []
+        for child in self.children:
+            mark = events.choice()
+            try:
+                child_state = child.apply_events(state, events)
+            except Error as error:
+                events.rollback(mark)
+                child_errors.append(error)
+            else:
+                events.commit(mark)
+                return child_state
+        raise RuleError(
+            rule=self,
+            state=state,
+            children=child_errors,
+        )
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        for child in self.children:
+            child_state = child.match(state)
+            if child_state is not None:
+                return child_state
+        return None
+
 
 @dataclass(frozen=True)
 class UnaryRule(Rule[_ResultValue, _StateValue]):
@@ -473,6 +1110,48 @@ class UnaryRule(Rule[_ResultValue, _StateValue]):
     child: Rule[_ResultValue, _StateValue]
 
 
+def _repeat_events(
+    child: Rule[_ResultValue, _StateValue],
+    state: State[_ResultValue, _StateValue],
+    events: Events[_ResultValue, _StateValue],
+) -> State[_ResultValue, _StateValue]:
+    '''apply child in events mode until it fails, rolling back the failed try'''
+    while True:
+        mark = events.choice()
+        try:
+            state = child.apply_events(state, events)
+        except Error:
+            events.rollback(mark)
+            return state
+        events.commit(mark)
+
+
+def _repeat_match(
+    child: Rule[_ResultValue, _StateValue],
+    state: State[_ResultValue, _StateValue],
+) -> State[_ResultValue, _StateValue]:
+    '''match child until it fails'''
+    while True:
+        child_state = child.match(state)
+        if child_state is None:
+            return state
+        state = child_state
+
+
+def match_while(
+    child: Rule[_ResultValue, _StateValue],
+    cond: Callable[[_StateValue], bool],
+    state: State[_ResultValue, _StateValue],
+) -> Optional[State[_ResultValue, _StateValue]]:
+    '''match child while cond holds for the state value, or None if child fails'''
+    while cond(state.value):
+        child_state = child.match(state)
+        if child_state is None:
+            return None
+        state = child_state
+    return state
+
+
 @dataclass(frozen=True)
 class ZeroOrMore(UnaryRule[_ResultValue, _StateValue]):
     '''applies a rule zero or more times'''
@@ -490,8 +1169,19 @@ class ZeroOrMore(UnaryRule[_ResultValue, _StateValue]):
                 child_results.append(child_result_and_state.result)
                 state = child_result_and_state.state
             except Error:
-                return ResultAndState[_ResultValue, _StateValue](
-                    Result[_ResultValue](children=child_results), state)
+                return ResultAndState(
+                    Result(children=child_results), state)
+
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        return _repeat_events(self.child, state, events)
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        return _repeat_match(self.child, state)
 
 
 @dataclass(frozen=True)
@@ -524,6 +1214,28 @@ class OneOrMore(UnaryRule[_ResultValue, _StateValue]):
                 break
         return ResultAndState(Result(children=child_results), state)
 
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        try:
+            child_state = self.child.apply_events(state, events)
+        except Error as error:
+            raise RuleError(
+                rule=self,
+                state=state,
+                children=[error],
+            ) from error
+        return _repeat_events(self.child, child_state, events)
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        child_state = self.child.match(state)
+        if child_state is None:
+            return None
+        return _repeat_match(self.child, child_state)
+
 
 @dataclass(frozen=True)
 class ZeroOrOne(UnaryRule[_ResultValue, _StateValue]):
@@ -538,7 +1250,26 @@ class ZeroOrOne(UnaryRule[_ResultValue, _StateValue]):
         try:
             return self.child.apply(state).as_child_result()
         except Error:
-            return ResultAndState[_ResultValue, _StateValue](Result[_ResultValue](), state)
+            return ResultAndState(Result(), state)
+
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        mark = events.choice()
+        try:
+            child_state = self.child.apply_events(state, events)
+        except Error:
+            events.rollback(mark)
+            return state
+        events.commit(mark)
+        return child_state
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        child_state = self.child.match(state)
+        return state if child_state is None else child_state
 
 
 @dataclass(frozen=True)
@@ -564,5 +1295,142 @@ class While(UnaryRule[_ResultValue, _StateValue], ABC):
                 ) from error
             child_results.append(child_result_and_state.result)
             state = child_result_and_state.state
-        return ResultAndState[_ResultValue, _StateValue](
-            Result[_ResultValue](children=child_results), state)
+        return ResultAndState(
+            Result(children=child_results), state)
+
+    def apply_events(
+        self,
+        state: State[_ResultValue, _StateValue],
+        events: Events[_ResultValue, _StateValue],
+    ) -> State[_ResultValue, _StateValue]:
+        while self.cond(state.value):
+            try:
+                state = self.child.apply_events(state, events)
+            except Error as error:
+                raise RuleError(
+                    rule=self,
+                    state=state,
+                    children=[error],
+                ) from error
+        return state
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        return match_while(self.child, self.cond, state)
+
+
+@dataclass(frozen=True)
+class Precedence(Rule[_ResultValue, _StateValue]):
+    '''applies operands separated by binary operators using precedence climbing
+
+    Each operation's result is named rule_name and has the lhs, operator and rhs
+    results as children. A lone operand's result is returned unnamed.
+    '''
+
+    @dataclass(frozen=True)
+    class Operator(Generic[_ResultValue, _StateValue]):
+        '''a binary operator, binding tighter the higher its precedence'''
+
+        rule: Rule[_ResultValue, _StateValue]
+        precedence: int
+        right: bool = field(default=False, kw_only=True)
+
+        def __str__(self) -> str:
+            return f'{"right " if self.right else ""}{self.rule}@{self.precedence}'
+
+    operand: Rule[_ResultValue, _StateValue]
+    operators: Sequence[Operator[_ResultValue, _StateValue]]
+    rule_name: str
+
+    def __post_init__(self):
+        object.__setattr__(self, 'operators', tuple(self.operators))
+
+    def __str__(self) -> str:
+        return f'({self.operand} % {" ".join(str(operator) for operator in self.operators)})'
+
+    def _operator(
+        self,
+        state: State[_ResultValue, _StateValue],
+        min_precedence: int,
+    ) -> Optional[Tuple[Operator[_ResultValue, _StateValue], State[_ResultValue, _StateValue]]]:
+        '''the first operator binding at least as tight as min_precedence at state'''
+        for operator in self.operators:
+            if operator.precedence >= min_precedence:
+                operator_state = operator.rule.match(state)
+                if operator_state is not None:
+                    return operator, operator_state
+        return None
+
+    def _apply_operator(
+        self,
+        state: State[_ResultValue, _StateValue],
+        min_precedence: int,
+    ) -> Optional[Tuple[Operator[_ResultValue, _StateValue],
+                        ResultAndState[_ResultValue, _StateValue]]]:
+        '''the first operator binding at least as tight as min_precedence that applies
+        at state, and its result'''
+        for operator in self.operators:
+            if operator.precedence >= min_precedence:
+                try:
+                    return operator, operator.rule.apply(state)
+                except Error:
+                    pass
+        return None
+
+    def _climb(
+        self,
+        state: State[_ResultValue, _StateValue],
+        min_precedence: int,
+    ) -> ResultAndState[_ResultValue, _StateValue]:
+        lhs_and_state = self.operand.apply(state)
+        lhs = lhs_and_state.result
+        state = lhs_and_state.state
+        while True:
+            operator_and_result = self._apply_operator(state, min_precedence)
+            if operator_and_result is None:
+                return ResultAndState(lhs, state)
+            operator, operator_result_and_state = operator_and_result
+            try:
+                rhs_and_state = self._climb(
+                    operator_result_and_state.state,
+                    operator.precedence if operator.right else operator.precedence + 1)
+            except Error:
+                return ResultAndState(lhs, state)
+            lhs = Result(rule_name=self.rule_name, children=[
+                lhs, operator_result_and_state.result, rhs_and_state.result])
+            state = rhs_and_state.state
+
+    def apply(self, state: State[_ResultValue, _StateValue]
+              ) -> ResultAndState[_ResultValue, _StateValue]:
+        try:
+            result_and_state = self._climb(state, 0)
+        except Error as error:
+            raise RuleError(rule=self, state=state, children=[error]) from error
+        if result_and_state.result.rule_name == self.rule_name:
+            return result_and_state
+        return result_and_state.as_child_result()
+
+    def _match(
+        self,
+        state: State[_ResultValue, _StateValue],
+        min_precedence: int,
+    ) -> Optional[State[_ResultValue, _StateValue]]:
+        lhs_state = self.operand.match(state)
+        if lhs_state is None:
+            return None
+        state = lhs_state
+        while True:
+            operator_and_state = self._operator(state, min_precedence)
+            if operator_and_state is None:
+                return state
+            operator, operator_state = operator_and_state
+            rhs_state = self._match(
+                operator_state,
+                operator.precedence if operator.right else operator.precedence + 1)
+            if rhs_state is None:
+                return state
+            state = rhs_state
+
+    def match(self, state: State[_ResultValue, _StateValue]
+              ) -> Optional[State[_ResultValue, _StateValue]]:
+        return self._match(state, 0)
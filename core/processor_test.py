@@ -1,9 +1,12 @@
 # pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring,too-many-public-methods
 
+import copy
+import pickle
 import unittest
+from unittest import mock
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import FrozenInstanceError, dataclass, replace
 from typing import Generic, Tuple, TypeVar
 from core import processor
 
@@ -232,6 +235,20 @@ class ResultTest(unittest.TestCase):
         self.assertIn('a', result)
         self.assertNotIn('b', result)
 
+    def test_frozen(self):
+        '''results are slotted, frozen and copy, pickle and compare by value'''
+        result = _Result(rule_name='a', children=[_Result(value=1)])
+        self.assertFalse(hasattr(result, '__dict__'))
+        with self.assertRaises(FrozenInstanceError):
+            result.rule_name = 'b'  # type: ignore
+        copies = [copy.copy(result), copy.deepcopy(result), pickle.loads(pickle.dumps(result)),
+                  replace(result)]
+        for actual in copies:
+            with self.subTest(actual=actual):
+                self.assertEqual(actual, result)
+                self.assertNotEqual(actual, _Result(rule_name='a'))
+        self.assertEqual(replace(result, children=None), _Result(rule_name='a'))
+
 
 _ResultValue = TypeVar('_ResultValue')
 _StateValue = TypeVar('_StateValue')
@@ -284,6 +301,15 @@ class ResultAndStateTest(_ProcessorTestCase):
             _ResultAndState(_Result(value=1).as_child_result(), self.state(0))
         )
 
+    def test_frozen(self):
+        '''results and states are slotted and frozen'''
+        result_and_state = _ResultAndState(_Result(), self.state(0))
+        for value in [result_and_state, result_and_state.state]:
+            with self.subTest(value=value):
+                self.assertFalse(hasattr(value, '__dict__'))
+                with self.assertRaises(FrozenInstanceError):
+                    value.result = _Result()  # type: ignore
+
 
 @dataclass(frozen=True)
 class _Multiply(_Rule):
@@ -514,3 +540,164 @@ class ZeroOrOneTest(_ProcessorTestCase):
                          ]))
         self.assertEqual(self.processor.apply_root_to_state_value(
             10), _Result(rule_name='a'))
+
+
+class _RecordingHandler(processor.EventHandler[int, int]):
+    def __init__(self):
+        self.events: list[Tuple[str, object]] = []
+
+    def enter(self, rule_name: str, state_value: int) -> None:
+        self.events.append(('enter', rule_name))
+
+    def value(self, value: int) -> None:
+        self.events.append(('value', value))
+
+    def exit(self, rule_name: str) -> None:
+        self.events.append(('exit', rule_name))
+
+
+class EventsTest(unittest.TestCase):
+    '''tests for processor.Events'''
+
+    def test_choice(self):
+        '''events are held while a choice is open and dropped on rollback'''
+        handler = _RecordingHandler()
+        events = processor.Events[int, int](handler)
+        events.value(1)
+        outer = events.choice()
+        events.value(2)
+        inner = events.choice()
+        events.value(3)
+        events.rollback(inner)
+        self.assertEqual(handler.events, [('value', 1)])
+        events.commit(outer)
+        self.assertEqual(handler.events, [('value', 1), ('value', 2)])
+
+
+class ApplyEventsTest(_ProcessorTestCase):
+    '''tests for processor.Processor.apply_root_to_state_value_events'''
+
+    @property
+    def processor(self) -> _Processor:
+        return _Processor(
+            'a',
+            {
+                'a': _And([
+                    _Or([
+                        _And([_Ref('m'), _LessThan(0)]),
+                        _Ref('m'),
+                    ]),
+                    _ZeroOrMore(_And([_LessThan(3), _Increment(), _Ref('m')])),
+                    _ZeroOrOne(_Ref('n')),
+                ]),
+                'm': _Multiply(2),
+                'n': _And([_LessThan(0), _Ref('m')]),
+            }
+        )
+
+    def test_apply_events(self):
+        '''events match the result and exclude backtracked alternatives'''
+        handler = _RecordingHandler()
+        self.assertEqual(
+            self.processor.apply_root_to_state_value_events(1, handler), 3)
+        self.assertEqual(
+            handler.events,
+            [
+                ('enter', 'a'),
+                ('enter', 'm'), ('value', 2), ('exit', 'm'),
+                ('enter', 'm'), ('value', 4), ('exit', 'm'),
+                ('enter', 'm'), ('value', 6), ('exit', 'm'),
+                ('exit', 'a'),
+            ]
+        )
+        replayed = _RecordingHandler()
+        processor.Events[int, int](replayed).result(
+            self.processor.apply_root_to_state_value(1), 1)
+        self.assertEqual(handler.events, replayed.events)
+
+    def test_apply_events_fail(self):
+        '''events mode fails like apply'''
+        with self.assertRaises(processor.Error):
+            _Processor('a', {'a': _LessThan(0)}).apply_root_to_state_value_events(
+                1, _RecordingHandler())
+
+
+class MatchTest(_ProcessorTestCase):
+    '''tests for processor.Processor.matches and match_prefix'''
+
+    @property
+    def processor(self) -> _Processor:
+        return _Processor(
+            'a',
+            {
+                'a': _And([
+                    _Or([
+                        _And([_LessThan(0), _Increment()]),
+                        _Ref('b'),
+                    ]),
+                    _ZeroOrOne(_Ref('c')),
+                    _OneOrMore(_And([_LessThan(5), _Increment()])),
+                ]),
+                'b': _ZeroOrMore(_And([_LessThan(2), _Increment()])),
+                'c': _And([_LessThan(3), _Increment(), _Increment()]),
+            }
+        )
+
+    def test_match_prefix(self):
+        '''match_prefix returns the state value after the root rule'''
+        for state_value, expected in list[Tuple[int, int | None]]([
+            (0, 5),
+            (2, 5),
+            (4, 5),
+            (5, None),
+        ]):
+            with self.subTest(state_value=state_value, expected=expected):
+                self.assertEqual(
+                    self.processor.match_prefix(state_value), expected)
+                self.assertEqual(
+                    self.processor.matches(state_value), expected is not None)
+                if expected is not None:
+                    self.assertEqual(
+                        self.processor.apply_root_to_state(
+                            self.state(state_value)).state.value,
+                        expected
+                    )
+
+    def test_match_unknown_rule(self):
+        '''matching an unknown rule is a grammar error'''
+        with self.assertRaises(processor.Error):
+            _Processor('a', {'a': _Ref('b')}).matches(0)
+
+
+class InternTest(unittest.TestCase):
+
+    def test_hashable(self):
+        self.assertEqual(hash(_And([_Ref('a'), _Ref('b')])),
+                         hash(_And((_Ref('a'), _Ref('b')))))
+
+    def test_intern(self):
+        rule = processor.intern(_Or([_And([_Ref('a'), _Ref('b')]), _ZeroOrMore(_Ref('a'))]))
+        self.assertEqual(rule, _Or([_And([_Ref('a'), _Ref('b')]), _ZeroOrMore(_Ref('a'))]))
+        self.assertIs(rule, processor.intern(
+            _Or([_And([_Ref('a'), _Ref('b')]), _ZeroOrMore(_Ref('a'))])))
+        assert isinstance(rule, processor.NaryRule)
+        and_, zero_or_more = rule.children
+        assert isinstance(and_, processor.NaryRule)
+        assert isinstance(zero_or_more, processor.UnaryRule)
+        self.assertIs(and_.children[0], zero_or_more.child)
+        self.assertIs(processor.intern(_And([_Ref('a'), _Ref('b')])), and_)
+
+    def test_intern_precedence(self):
+        def precedence() -> processor.Precedence[int, int]:
+            return processor.Precedence[int, int](_Ref('a'), [
+                processor.Precedence.Operator(_And([_Ref('b'), _Ref('c')]), 1),
+            ], 'e')
+        with mock.patch.object(processor.And, '__hash__', side_effect=AssertionError):
+            rule = processor.intern(precedence())
+            self.assertIs(rule, processor.intern(precedence()))
+            self.assertIs(rule.operators[0].rule, processor.intern(_And([_Ref('b'), _Ref('c')])))
+        self.assertEqual(rule, precedence())
+
+    def test_intern_distinct(self):
+        self.assertIsNot(processor.intern(_And([_Ref('a')])), processor.intern(_Or([_Ref('a')])))
+        self.assertIsNot(processor.intern(_Ref('a')), processor.intern(_Ref('b')))
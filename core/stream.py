@@ -2,7 +2,7 @@
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Iterable, Iterator, MutableSequence, Sequence, TypeVar
+from typing import Iterable, Iterator, MutableSequence, Optional, Sequence, TypeVar
 from core import processor
 
 
@@ -53,7 +53,7 @@ class Stream(AbstractStream, Iterable[_Item_co]):
         '''all but the first value in the stream'''
         if self.empty:
             raise Error(msg=f'getting tail from empty state {self}')
-        return Stream[_Item_co](self._items[1:])
+        return Stream(self._items[1:])
 
     @property
     def items(self) -> 'Sequence[_Item_co]':
@@ -63,7 +63,7 @@ class Stream(AbstractStream, Iterable[_Item_co]):
     @staticmethod
     def from_result(result: processor.Result[_Item_co]) -> 'Stream[_Item_co]':
         '''convert all results in the given result to a stream'''
-        return Stream[_Item_co](result.all_values())
+        return Stream(result.all_values())
 
 
 _ResultValue = TypeVar('_ResultValue')
@@ -92,3 +92,62 @@ class UntilEmpty(processor.UnaryRule[_ResultValue, _StateValue]):
             child_results.append(child_result_and_state.result)
             child_state = child_result_and_state.state
         return processor.ResultAndState(processor.Result(children=child_results), child_state)
+
+    def apply_events(
+        self,
+        state: processor.State[_ResultValue, _StateValue],
+        events: processor.Events[_ResultValue, _StateValue],
+    ) -> processor.State[_ResultValue, _StateValue]:
+        child_state = state
+        while not child_state.value.empty:
+            try:
+                child_state = self.child.apply_events(child_state, events)
+            except Error as error:
+                raise processor.RuleError(rule=self, state=state,
+                                          children=[error]) from error
+        return child_state
+
+    def match(
+        self,
+        state: processor.State[_ResultValue, _StateValue],
+    ) -> Optional[processor.State[_ResultValue, _StateValue]]:
+        return processor.match_while(self.child, _not_empty, state)
+
+
+def _not_empty(state_value: AbstractStream) -> bool:
+    return not state_value.empty
+
+
+@dataclass(frozen=True)
+class Any(processor.Rule[_ResultValue, _StateValue]):
+    '''rule matching any one item of the stream'''
+
+    def __str__(self) -> str:
+        return '.'
+
+    def apply(
+        self,
+        state: processor.State[_ResultValue, _StateValue],
+    ) -> processor.ResultAndState[_ResultValue, _StateValue]:
+        if state.value.empty:
+            raise processor.RuleError(rule=self, state=state, msg='empty stream')
+        return processor.ResultAndState(
+            processor.Result(value=state.value.head), state.with_value(state.value.tail))
+
+    def apply_events(
+        self,
+        state: processor.State[_ResultValue, _StateValue],
+        events: processor.Events[_ResultValue, _StateValue],
+    ) -> processor.State[_ResultValue, _StateValue]:
+        if state.value.empty:
+            raise processor.RuleError(rule=self, state=state, msg='empty stream')
+        events.value(state.value.head)
+        return state.with_value(state.value.tail)
+
+    def match(
+        self,
+        state: processor.State[_ResultValue, _StateValue],
+    ) -> Optional[processor.State[_ResultValue, _StateValue]]:
+        if state.value.empty:
+            return None
+        return state.with_value(state.value.tail)
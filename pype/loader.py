@@ -1,9 +1,106 @@
 '''loader'''
 
-from typing import Optional
-from core import loader, parser
+import functools
+import os
+import sys
+import threading
+from typing import MutableSequence, Optional
+from core import cache, loader, optimizer, parser
 from pype import builtins_, exprs, func, params, statements, vals
 
+GRAMMAR = r'''
+_ws = "\w+";
+id = "[_a-zA-Z][_a-zA-Z0-9]*";
+str = "'((^')*)'";
+float = "[0-9]+\.[0-9]+";
+int = "[1-9][0-9]*";
+
+root => block;
+block => statement+;
+statement => class_decl | func_decl | return_statement | assignment | expr_statement;
+expr_statement => expr ";";
+expr => binary_operation;
+operand => path | ref | literal;
+path => path_root path_part+;
+path_root => ref | literal;
+path_part => path_part_member | path_part_call;
+path_part_member => "." path_part_member_name;
+path_part_member_name => id;
+path_part_call => "(" (expr ("," expr)*)? ")";
+ref => id;
+assignment => assignment_name "=" assignment_value ";";
+assignment_name => id;
+assignment_value => expr;
+literal => int_literal | float_literal | str_literal;
+int_literal => int;
+float_literal => float;
+str_literal => str;
+func_decl => "def" func_name func_params "{" func_body "}";
+func_name => id;
+func_params => params;
+func_body => block;
+params => "(" (param ("," param)*)? ")";
+param => id;
+return_statement => "return" return_value? ";";
+return_value => expr;
+binary_operation => operand % "or" | "and" | "+" "-" | "*" "/";
+class_decl => "class" class_name "{" class_body "}";
+class_name => id;
+class_body => block;
+'''
+
+WARMUP_ENV = 'PYPE_WARMUP'
+_ARTIFACT_PATH = os.path.join(os.path.dirname(__file__), 'parser.cache')
+_parser_lock = threading.Lock()
+_parser: MutableSequence[parser.Parser] = []
+
+
+def _build_pype_parser() -> parser.Parser:
+    return optimizer.optimize_parser(loader.load_parser(GRAMMAR))
+
+
+def _load_pype_parser() -> parser.Parser:
+    cached = cache.read(_ARTIFACT_PATH, GRAMMAR)
+    if isinstance(cached, parser.Parser):
+        return cached
+    return _build_pype_parser()
+
+
+def pype_parser() -> parser.Parser:
+    '''the pype parser, built once per process and shared across threads
+
+    The parser is read from the pre-generated artifact next to this module if
+    it matches GRAMMAR and the engine version, and compiled otherwise. The
+    artifact is checked in: regenerate it with python -m pype.loader
+    --build-artifact whenever GRAMMAR or cache.ENGINE_VERSION changes.
+    Only the first call takes the lock.
+    '''
+    if not _parser:
+        with _parser_lock:
+            if not _parser:
+                _parser.append(_load_pype_parser())
+    return _parser[0]
+
+
+def warmup() -> None:
+    '''build the pype parser and its compiled lexer now rather than on first use'''
+    pype_parser().lexer.recognize('')
+
+
+def build_artifact(path: str = _ARTIFACT_PATH) -> None:
+    '''write the pre-generated parser artifact'''
+    cache.write(path, GRAMMAR, _build_pype_parser())
+
+
+@functools.lru_cache(maxsize=None)
+def result_cache() -> cache.ResultCache:
+    '''the cache of parse results load shares, on disk too if $PYSH_CACHE_DIR is set
+
+    Only parse results are cached: loaded blocks hold literal vals, which are
+    mutable, so each load builds its own.
+    '''
+    return cache.default_result_cache()
+
 
 def default_scope() -> vals.Scope:
     return vals.Scope({
@@ -54,12 +151,15 @@ def load(input_str: str) -> statements.Block:
                     'str_literal': load_str_literal,
                 })(result))
 
-            def load_binary_operation(result: parser.Result) -> exprs.BinaryOperation:
-                operator = exprs.BinaryOperation.Operator(
-                    loader.get_token_value(result['binary_operator', 1]))
-                lhs, rhs = [load_expr(operand)
-                            for operand in result['operand', 2]]
-                return exprs.BinaryOperation(operator, lhs, rhs)
+            def load_binary_operation(result: parser.Result) -> exprs.Expr:
+                if len(result.children) == 1:
+                    return load_expr(result)
+                lhs, operator, rhs = result.children
+                return exprs.BinaryOperation(
+                    exprs.BinaryOperation.Operator(loader.get_token_value(operator)),
+                    load_expr(lhs.as_child_result()),
+                    load_expr(rhs.as_child_result()),
+                )
 
             return loader.factory({
                 'ref': load_ref,
@@ -108,47 +208,7 @@ def load(input_str: str) -> statements.Block:
     def load_block(result: parser.Result) -> statements.Block:
         return statements.Block([load_statement(statement) for statement in result['statement']])
 
-    return load_block(loader.load_parser(r'''
-        _ws = "\w+";
-        id = "[_a-zA-Z][_a-zA-Z0-9]*";
-        str = "'((^')*)'";
-        float = "[0-9]+\.[0-9]+";
-        int = "[1-9][0-9]*";
-
-        root => block;
-        block => statement+;
-        statement => class_decl | func_decl | return_statement | assignment | expr_statement;
-        expr_statement => expr ";";
-        expr => binary_operation | operand;
-        operand => path | ref | literal;
-        path => path_root path_part+;
-        path_root => ref | literal;
-        path_part => path_part_member | path_part_call;
-        path_part_member => "." path_part_member_name;
-        path_part_member_name => id;
-        path_part_call => "(" (expr ("," expr)*)? ")";
-        ref => id;
-        assignment => assignment_name "=" assignment_value ";";
-        assignment_name => id;
-        assignment_value => expr;
-        literal => int_literal | float_literal | str_literal;
-        int_literal => int;
-        float_literal => float;
-        str_literal => str;
-        func_decl => "def" func_name func_params "{" func_body "}";
-        func_name => id;
-        func_params => params;
-        func_body => block;
-        params => "(" (param ("," param)*)? ")";
-        param => id;
-        return_statement => "return" return_value? ";";
-        return_value => expr;
-        binary_operation => operand binary_operator operand;
-        binary_operator => "+" | "-" | "*" | "/" | "and" | "or";
-        class_decl => "class" class_name "{" class_body "}";
-        class_name => id;
-        class_body => block;
-    ''').apply(input_str))
+    return load_block(result_cache().parse(pype_parser(), input_str, GRAMMAR))
 
 
 def eval_(input_str: str, scope: Optional[vals.Scope] = None) -> vals.Val:
@@ -164,7 +224,14 @@ def eval_(input_str: str, scope: Optional[vals.Scope] = None) -> vals.Val:
     return builtins_.none
 
 
+if os.environ.get(WARMUP_ENV):
+    warmup()
+
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['--build-artifact']:
+        build_artifact()
+        sys.exit()
     scope = default_scope()
     while True:
         try:
@@ -1,7 +1,10 @@
 # pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring,duplicate-code
 
+import os
+import tempfile
 from typing import Tuple
 import unittest
+from core import cache, lalr
 from pype import builtins_, exprs, func, loader, params, statements, vals
 
 if 'unittest.util' in __import__('sys').modules:
@@ -237,6 +240,9 @@ class TestLoader(unittest.TestCase):
             ('1 - 2;', builtins_.int_(-1)),
             ('1 * 2;', builtins_.int_(2)),
             ('10 / 5;', builtins_.int_(2)),
+            ('1 + 2 * 3;', builtins_.int_(7)),
+            ('10 - 2 - 3;', builtins_.int_(5)),
+            ('a = 2; 8 / a / 2 + a * 3;', builtins_.int_(8)),
             (
                 'def f(a,b) { return a + b; } f(1,2);',
                 builtins_.int_(3)
@@ -268,3 +274,35 @@ class TestLoader(unittest.TestCase):
         ]):
             with self.subTest(input_str=input_str, expected_result=expected_result):
                 self.assertEqual(loader.eval_(input_str), expected_result)
+
+    def test_pype_parser(self):
+        self.assertIs(loader.pype_parser(), loader.pype_parser())
+
+    def test_lalr(self):
+        lalr_parser = lalr.Parser(loader.pype_parser())
+        self.assertEqual(lalr_parser.conflicts, [])
+        input_str = 'def f(a, b) { return a + b * 2; } f(1, 2);'
+        self.assertEqual(lalr_parser.apply(input_str), loader.pype_parser().apply(input_str))
+
+    def test_load_cached(self):
+        input_str = 'class c { a = 1; } c.a;'
+        first = loader.load(input_str)
+        self.assertIn(cache.key('result', loader.GRAMMAR, input_str),
+                      loader.result_cache().memory._entries)  # pylint: disable=protected-access
+        second = loader.load(input_str)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+    def test_build_artifact(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'parser.cache')
+            loader.build_artifact(path)
+            self.assertEqual(cache.read(path, loader.GRAMMAR), loader.pype_parser())
+            self.assertIsNone(cache.read(path, loader.GRAMMAR + ' '))
+
+    def test_artifact_current(self):
+        self.assertEqual(
+            cache.read(loader._ARTIFACT_PATH, loader.GRAMMAR),  # pylint: disable=protected-access
+            loader._build_pype_parser(),  # pylint: disable=protected-access
+            'pype/parser.cache is stale: run python -m pype.loader --build-artifact',
+        )